@@ -3,6 +3,8 @@ export LINTER = flake8
 export PYLINTFLAGS = --exclude=__main__.py
 
 # export CLOUD_MONGO = 0
+# Lets tests run without a JOURNAL_TOKEN_SECRET.
+export JOURNAL_ENV = test
 
 PYTHONFILES = $(shell ls *.py)
 PYTESTFLAGS = -vv --verbose --cov-branch --cov-report term-missing --tb=short -W ignore::FutureWarning
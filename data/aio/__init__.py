@@ -0,0 +1,5 @@
+"""
+Async versions of the data module read functions, used by the ASGI
+serving mode (server/asgi.py). They reuse the constants and pure helpers
+of the sync modules and return exactly the same records.
+"""
@@ -0,0 +1,27 @@
+"""
+Async versions of the data.comment read functions.
+"""
+import data.comment as cmt
+import data.db_connect_async as adbc
+
+
+async def read_all() -> list:
+    return await adbc.read(cmt.COMMENTS_COLLECTION, no_id=False)
+
+
+async def read_one_json(comment_id) -> str:
+    obj_id = cmt.to_object_id(comment_id)
+    if not obj_id:
+        return None
+    return await adbc.read_one_json(cmt.COMMENTS_COLLECTION,
+                                    {cmt.COMMENT_ID: obj_id})
+
+
+async def read_by_manuscript(manuscript_id) -> list:
+    return await adbc.find(cmt.COMMENTS_COLLECTION,
+                           {cmt.MANUSCRIPT_ID: manuscript_id}, no_id=False)
+
+
+async def read_by_editor(editor_id) -> list:
+    return await adbc.find(cmt.COMMENTS_COLLECTION,
+                           {cmt.EDITOR_ID: editor_id}, no_id=False)
@@ -0,0 +1,50 @@
+"""
+Async versions of the data.manuscript read functions.
+"""
+import data.db_connect_async as adbc
+import data.manuscript as ms
+import data.manuscript_revisions as mrev
+
+
+async def read() -> dict:
+    """
+    Return a dictionary of all manuscripts keyed by their title.
+    """
+    return {manu[ms.TITLE]: manu
+            for manu in await adbc.find(ms.MANUSCRIPTS_COLLECT, no_id=False,
+                                        projection=ms.PUBLIC_PROJECTION)}
+
+
+async def read_text(manu_id: str) -> str:
+    record = await adbc.read_one(mrev.REVISIONS_COLLECT,
+                                 {mrev.MANU_ID: manu_id},
+                                 sort=mrev.LATEST_SORT)
+    if record:
+        docs = await adbc.find(mrev.CHUNKS_COLLECT,
+                               mrev.chunks_filter(set(record[mrev.CHUNKS])),
+                               no_id=False)
+        return mrev.join_text(record, mrev.decode_chunks(docs))
+    doc = await adbc.read_one(ms.BODIES_COLLECT,
+                              {ms.MANU_ID: ms.to_object_id(manu_id)})
+    return ms.decompress_text(doc[ms.BODY]) if doc else None
+
+
+async def read_one_json(manu_id: str) -> str:
+    manu_json = await adbc.read_one_json(
+        ms.MANUSCRIPTS_COLLECT, {ms.MANU_ID: ms.to_object_id(manu_id)},
+        projection=ms.PUBLIC_PROJECTION)
+    if manu_json is None or f'"{ms.TEXT}":' in manu_json:
+        return manu_json
+    return ms.add_text_json(manu_json, await read_text(manu_id) or '')
+
+
+async def search_by_title(title: str) -> dict:
+    manuscripts = {}
+    if not title.strip():
+        return manuscripts
+    all_manuscripts = await adbc.find(ms.MANUSCRIPTS_COLLECT, no_id=False,
+                                      projection=ms.PUBLIC_PROJECTION)
+    for manuscript in all_manuscripts:
+        if title.lower() in manuscript[ms.TITLE].lower():
+            manuscripts[manuscript[ms.TITLE]] = manuscript
+    return manuscripts
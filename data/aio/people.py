@@ -0,0 +1,46 @@
+"""
+Async versions of the data.people read functions.
+"""
+import data.db_connect_async as adbc
+import data.people as ppl
+import data.roles as rls
+
+
+async def read() -> dict:
+    """
+    Return all users keyed by UUID.
+    """
+    return ppl.key_people(await adbc.read(ppl.PEOPLE_COLLECT))
+
+
+async def read_by_roles(codes) -> dict:
+    """
+    Return the users with any of the given roles, keyed by UUID.
+    """
+    return ppl.key_people(await adbc.find(ppl.PEOPLE_COLLECT,
+                                          ppl.roles_filter(codes)))
+
+
+async def read_one(identifier: str) -> dict:
+    """
+    Lookup a user by UUID or email, sharing the sync module's cache.
+    Returns full record or None.
+    """
+    rec = ppl.cache_get(identifier)
+    if rec is not None:
+        return rec
+    rec = await adbc.read_one(ppl.PEOPLE_COLLECT,
+                              ppl.identifier_filter(identifier))
+    if rec:
+        ppl.cache_put(rec)
+    return rec
+
+
+async def get_all_people() -> list:
+    people = await read()
+    return [f"{p[ppl.NAME]} ({p[ppl.EMAIL]})" for p in people.values()]
+
+
+async def get_masthead() -> dict:
+    people = await read_by_roles(rls.MH_ROLES)
+    return ppl.build_masthead(people.values())
@@ -0,0 +1,14 @@
+"""
+Async versions of the data.text read functions.
+"""
+import data.db_connect_async as adbc
+import data.text as txt
+
+
+async def read() -> dict:
+    return await adbc.read_dict(txt.TEXT_COLLECT, txt.PAGE_NUMBER)
+
+
+async def read_one(page_number: str) -> dict:
+    return await adbc.read_one(txt.TEXT_COLLECT,
+                               {txt.PAGE_NUMBER: page_number})
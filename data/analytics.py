@@ -0,0 +1,146 @@
+"""
+Turnaround times: how long manuscripts spend in each state.
+
+Rather than scan histories on demand, we keep running aggregates that
+each state transition updates in place: a count, a sum, min and max,
+and a histogram of durations in log-scale buckets from which
+percentiles are estimated. There is one aggregate per (from, to) pair
+of states and one per from-state whatever comes next, so reading them
+all costs the same however many manuscripts there are.
+"""
+import math
+
+from pymongo import UpdateOne
+
+import data.db_connect as dbc
+import data.manuscript_events as mev
+
+TURNAROUND_COLLECT = 'turnaround'
+
+# aggregate fields
+FROM_STATE = 'from'
+TO_STATE = 'to'  # ANY_STATE for the from-state's overall aggregate
+COUNT = 'count'
+TOTAL = 'total'  # seconds
+MIN = 'min'
+MAX = 'max'
+HIST = 'hist'  # {bucket: count}
+# report fields
+MEAN = 'mean'
+PERCENTILES = (50, 90, 99)
+
+ANY_STATE = '*'
+
+# Buckets per doubling of the duration: with 4, a percentile estimate
+# is within about 9% of a duration in its bucket.
+BUCKETS_PER_DOUBLING = 4
+
+
+def bucket_of(seconds: float) -> int:
+    """
+    The histogram bucket of a duration; under a second goes in 0.
+    """
+    if seconds < 1:
+        return 0
+    return int(math.log2(seconds) * BUCKETS_PER_DOUBLING)
+
+
+def bucket_value(bucket: int) -> float:
+    """
+    A representative duration for a bucket: its geometric middle.
+    """
+    return 2 ** ((bucket + 0.5) / BUCKETS_PER_DOUBLING)
+
+
+def _agg_id(from_state: str, to_state: str) -> str:
+    return f'{from_state}>{to_state}'
+
+
+def _updates(from_state: str, to_state: str, seconds: float) -> list:
+    seconds = max(0.0, seconds)
+    change = {
+        '$inc': {COUNT: 1, TOTAL: seconds,
+                 f'{HIST}.{bucket_of(seconds)}': 1},
+        '$min': {MIN: seconds},
+        '$max': {MAX: seconds},
+    }
+    return [UpdateOne({dbc.MONGO_ID: _agg_id(from_state, to),
+                       FROM_STATE: from_state, TO_STATE: to},
+                      change, upsert=True)
+            for to in (to_state, ANY_STATE)]
+
+
+def record(from_state: str, to_state: str, seconds: float):
+    """
+    Add one transition that left from_state after `seconds` in it.
+    """
+    record_many([(from_state, to_state, seconds)])
+
+
+def record_many(transitions: list):
+    """
+    Add (from_state, to_state, seconds) transitions in one batch.
+    """
+    updates = [update for trans in transitions for update in _updates(*trans)]
+    if updates:
+        dbc.bulk_write(TURNAROUND_COLLECT, updates, ordered=True)
+
+
+def percentile(hist: dict, count: int, pct: float) -> float:
+    rank = math.ceil(count * pct / 100)
+    seen = 0
+    for bucket in sorted(hist, key=int):
+        seen += hist[bucket]
+        if seen >= rank:
+            return bucket_value(int(bucket))
+    return None
+
+
+def summarize(agg: dict) -> dict:
+    count = agg[COUNT]
+    summary = {
+        FROM_STATE: agg[FROM_STATE],
+        TO_STATE: agg[TO_STATE],
+        COUNT: count,
+        MEAN: agg[TOTAL] / count,
+        MIN: agg[MIN],
+        MAX: agg[MAX],
+    }
+    for pct in PERCENTILES:
+        # Clamped, as a bucket's middle may lie past the extremes.
+        estimate = percentile(agg[HIST], count, pct)
+        summary[f'p{pct}'] = min(max(estimate, agg[MIN]), agg[MAX])
+    return summary
+
+
+def turnaround() -> list:
+    """
+    Turnaround stats per (from, to) pair of states, and per from-state
+    whatever followed (to is ANY_STATE). Times are in seconds.
+    """
+    return [summarize(agg)
+            for agg in dbc.find(TURNAROUND_COLLECT,
+                                sort=[(FROM_STATE, 1), (TO_STATE, 1)])]
+
+
+def rebuild() -> int:
+    """
+    Recompute the aggregates from the manuscript event log.
+    Returns the number of transitions counted.
+    """
+    dbc.delete_many(TURNAROUND_COLLECT, {})
+    updates = []
+    prev = None
+    events = dbc.find(mev.EVENTS_COLLECT,
+                      projection=[mev.MANU_ID, mev.FROM_STATE,
+                                  mev.TO_STATE, mev.AT],
+                      sort=[(mev.MANU_ID, 1), (mev.AT, 1),
+                            (dbc.MONGO_ID, 1)])
+    for event in events:
+        if prev and prev[mev.MANU_ID] == event[mev.MANU_ID]:
+            updates += _updates(event[mev.FROM_STATE], event[mev.TO_STATE],
+                                event[mev.AT] - prev[mev.AT])
+        prev = event
+    if updates:
+        dbc.bulk_write(TURNAROUND_COLLECT, updates, ordered=True)
+    return len(updates) // 2
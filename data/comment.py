@@ -1,3 +1,15 @@
+"""
+Comments on manuscripts, threaded.
+
+Each comment stores its thread (the root comment's id) and a
+materialized path: the ids of its ancestors and itself, joined by
+PATH_SEP. Ids are fixed-width hex ObjectIds, which grow with creation
+time, so sorting a thread by path puts every reply right after its
+parent, siblings oldest first. With an index on (thread, path) a whole
+thread, or a page of it, comes back in one query already in order.
+"""
+import re
+
 import data.db_connect as dbc
 import data.manuscript as msc
 import data.people as ppl
@@ -13,6 +25,26 @@ MANUSCRIPT_ID = "manuscript_id"
 EDITOR_ID = "editor_id"
 TEXT = "text"
 TIMESTAMP = 'timestamp'
+PARENT_ID = 'parent_id'  # None for a thread's root
+THREAD_ID = 'thread_id'  # the root comment's id
+PATH = 'path'
+DEPTH = 'depth'  # 0 for a root
+
+# page fields
+COMMENTS = 'comments'
+NEXT = 'next'  # cursor for the next page, or None on the last one
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+PATH_SEP = '/'
+PATH_RE = re.compile(r'[0-9a-f]{24}(?:/[0-9a-f]{24})*')
+# Keeps paths, and so index keys, well under MongoDB's size limits.
+MAX_DEPTH = 32
+
+
+def ensure_indexes():
+    dbc.ensure_index(COMMENTS_COLLECTION, [(THREAD_ID, 1), (PATH, 1)])
 
 
 def to_object_id(id_str):
@@ -25,16 +57,68 @@ def to_object_id(id_str):
         return None
 
 
-def is_valid_comment(manuscript_id, editor_id, text):
-    """Validate comment data."""
+# The person fields comment validation needs.
+EDITOR_FIELDS = [ppl.ID, ppl.EMAIL, ppl.ROLES, ppl.ROLE_MASK]
+MANU_FOUND = 'manu_found'
+
+
+def lookup_editor_and_manuscript(editor_id, manuscript_id):
+    """
+    Fetch the editor's EDITOR_FIELDS and whether the manuscript exists,
+    in one query. Return (editor or None, whether the manuscript exists,
+    or None if the editor wasn't found and we can't tell).
+    """
+    docs = dbc.aggregate(ppl.PEOPLE_COLLECT, [
+        {'$match': ppl.identifier_filter(editor_id)},
+        {'$limit': 1},
+        {'$addFields': {'_manu_id': {
+            '$literal': msc.to_object_id(manuscript_id)}}},
+        {'$lookup': {'from': msc.MANUSCRIPTS_COLLECT,
+                     'localField': '_manu_id', 'foreignField': msc.MANU_ID,
+                     'as': '_manus'}},
+        {'$project': {**{field: 1 for field in EDITOR_FIELDS},
+                      dbc.MONGO_ID: 0,
+                      MANU_FOUND: {'$size': '$_manus'}}},
+    ])
+    if not docs:
+        return None, None
+    editor = docs[0]
+    return editor, editor.pop(MANU_FOUND) > 0
+
+
+def _is_editor_record(editor, editor_id) -> bool:
+    return bool(editor) and editor_id in (editor.get(ppl.ID),
+                                          editor.get(ppl.EMAIL))
+
+
+def is_valid_comment(manuscript_id, editor_id, text, editor=None):
+    """
+    Validate comment data, with at most one DB read.
+    editor is the commenter's person record if the caller already has
+    it (e.g. from the permission check); it's used only if it matches
+    editor_id. Manuscripts known to exist are cached briefly.
+    """
     if not text:
         raise ValueError("Comment text cannot be empty")
 
-    manuscript = msc.read_one(manuscript_id)
-    if not manuscript:
+    if not _is_editor_record(editor, editor_id):
+        editor = ppl.cache_get(editor_id)
+    manu_known = msc.exists_cached(manuscript_id) if editor \
+        else manuscript_id in msc.known_manuscripts
+    if not editor:
+        if manu_known:
+            editor = ppl.read_one(editor_id)
+        else:
+            editor, manu_known = lookup_editor_and_manuscript(
+                editor_id, manuscript_id)
+            if manu_known:
+                msc.known_manuscripts.add(manuscript_id)
+            elif manu_known is None:
+                # No editor either; say which is missing, as before.
+                manu_known = msc.exists(manuscript_id)
+
+    if not manu_known:
         raise ValueError(f"Manuscript {manuscript_id} not found")
-
-    editor = ppl.read_one(editor_id)
     if not editor:
         raise ValueError(f"Editor {editor_id} not found")
 
@@ -46,22 +130,100 @@ def is_valid_comment(manuscript_id, editor_id, text):
     return True
 
 
-def create(manuscript_id, editor_id, text):
-    """Create a new comment."""
-    if not is_valid_comment(manuscript_id, editor_id, text):
-        raise ValueError("Invalid comment data")
+def thread_fields(obj_id, parent=None) -> dict:
+    """
+    The threading fields of comment obj_id, replying to parent
+    (a comment as read_one() returns it) or starting a thread.
+    """
+    if parent is None:
+        return {PARENT_ID: None, THREAD_ID: str(obj_id),
+                PATH: str(obj_id), DEPTH: 0}
+    return {
+        PARENT_ID: parent[COMMENT_ID],
+        THREAD_ID: parent[THREAD_ID],
+        PATH: f'{parent[PATH]}{PATH_SEP}{obj_id}',
+        DEPTH: parent[DEPTH] + 1,
+    }
+
 
-    current_time = datetime.now().isoformat()
+def _insert(manuscript_id, editor_id, text, parent=None):
+    # The id is made here as the path needs it before the insert.
+    obj_id = ObjectId()
     comment = {
+        COMMENT_ID: obj_id,
         MANUSCRIPT_ID: manuscript_id,
         EDITOR_ID: editor_id,
         TEXT: text,
-        TIMESTAMP: current_time
+        TIMESTAMP: datetime.now().isoformat(),
+        **thread_fields(obj_id, parent),
     }
-
+    ensure_indexes()
     print(f"Creating comment: {comment}")
-    result = dbc.create(COMMENTS_COLLECTION, comment)
-    return str(result.inserted_id)
+    dbc.create(COMMENTS_COLLECTION, comment)
+    return str(obj_id)
+
+
+def create(manuscript_id, editor_id, text, editor=None):
+    """
+    Create a new comment, starting a thread.
+    editor: see is_valid_comment().
+    """
+    if not is_valid_comment(manuscript_id, editor_id, text, editor):
+        raise ValueError("Invalid comment data")
+    return _insert(manuscript_id, editor_id, text)
+
+
+def reply(parent_id, editor_id, text, editor=None):
+    """
+    Reply to a comment, on the same manuscript.
+    editor: see is_valid_comment().
+    """
+    parent = read_one(parent_id)
+    if not parent:
+        raise ValueError(f"Comment {parent_id} not found")
+    if parent.get(DEPTH, 0) >= MAX_DEPTH:
+        raise ValueError(f"Replies can nest at most {MAX_DEPTH} deep")
+    manuscript_id = parent[MANUSCRIPT_ID]
+    if not is_valid_comment(manuscript_id, editor_id, text, editor):
+        raise ValueError("Invalid comment data")
+    if PATH not in parent:
+        # Comments from before threading become the root of a thread.
+        fields = thread_fields(to_object_id(parent_id))
+        dbc.update(COMMENTS_COLLECTION,
+                   {COMMENT_ID: to_object_id(parent_id)}, fields)
+        parent.update(fields)
+    return _insert(manuscript_id, editor_id, text, parent)
+
+
+def parse_cursor(cursor: str) -> dict:
+    """
+    The filter for comments after the one a cursor (its path) names.
+    Raise ValueError if the cursor is malformed.
+    """
+    if not isinstance(cursor, str) or not PATH_RE.fullmatch(cursor):
+        raise ValueError(f'Bad cursor: {cursor}')
+    return {PATH: {'$gt': cursor}}
+
+
+def read_thread(thread_id, limit: int = PAGE_SIZE, cursor=None) -> dict:
+    """
+    A page of a thread in reading order, each reply right after its
+    parent: {comments, next}. Each comment has its depth for indenting.
+    """
+    ensure_indexes()
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    filt = {THREAD_ID: thread_id}
+    if cursor:
+        filt.update(parse_cursor(cursor))
+    # One extra to learn whether there is a next page.
+    comments = dbc.find(COMMENTS_COLLECTION, filt, no_id=False,
+                        sort=[(PATH, 1)], limit=limit + 1)
+    more = len(comments) > limit
+    comments = comments[:limit]
+    return {
+        COMMENTS: comments,
+        NEXT: comments[-1][PATH] if more else None,
+    }
 
 
 def read_one(comment_id):
@@ -72,6 +234,14 @@ def read_one(comment_id):
     return dbc.read_one(COMMENTS_COLLECTION, {COMMENT_ID: obj_id})
 
 
+def read_one_json(comment_id):
+    """Read a single comment by ID, already encoded as JSON."""
+    obj_id = to_object_id(comment_id)
+    if not obj_id:
+        return None
+    return dbc.read_one_json(COMMENTS_COLLECTION, {COMMENT_ID: obj_id})
+
+
 def read_by_manuscript(manuscript_id):
     """Read all comments for a manuscript."""
     comments = dbc.read(COMMENTS_COLLECTION, no_id=False)
@@ -0,0 +1,89 @@
+"""
+Async counterparts of the db_connect functions, on PyMongo's
+AsyncMongoClient. Used by the async data functions in data.aio.
+"""
+import pymongo as pm
+
+import data.db_connect as dbc
+
+JOURNAL_DB = dbc.JOURNAL_DB
+MONGO_ID = dbc.MONGO_ID
+
+client = None
+
+
+def connect_db():
+    """
+    Same as db_connect.connect_db(), but returns an AsyncMongoClient.
+    Creating the client does no I/O; it connects on first use.
+    """
+    global client
+    if client is None:
+        if dbc.is_cloud():
+            client = pm.AsyncMongoClient(
+                dbc.cloud_uri(), server_api=pm.server_api.ServerApi('1'))
+        else:
+            client = pm.AsyncMongoClient()
+    return client
+
+
+async def close_db():
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+
+async def read_one(collection, filt, db=JOURNAL_DB, projection=None,
+                   sort=None, hint=None, max_time_ms=None):
+    doc = await client[db][collection].find_one(
+        filt, **dbc.find_opts(projection, sort, hint, max_time_ms))
+    if doc is not None:
+        dbc.convert_mongo_id(doc)
+    return doc
+
+
+async def exists(collection, filt, db=JOURNAL_DB) -> bool:
+    doc = await client[db][collection].find_one(filt, {MONGO_ID: 1})
+    return doc is not None
+
+
+async def read_one_json(collection, filt, db=JOURNAL_DB, projection=None):
+    raw_coll = client[db].get_collection(collection,
+                                         codec_options=dbc.RAW_CODEC)
+    raw_doc = await raw_coll.find_one(filt, **dbc.find_opts(projection))
+    if raw_doc is None:
+        return None
+    return dbc.raw_to_json(raw_doc)
+
+
+async def find(collection, filt=None, db=JOURNAL_DB, no_id=True,
+               projection=None, sort=None) -> list:
+    """
+    Return the docs matching filt, with `_id` dropped or stringified.
+    """
+    ret = []
+    cursor = client[db][collection].find(
+        filt or {}, **dbc.find_opts(projection, sort))
+    async for doc in cursor:
+        if no_id:
+            doc.pop(MONGO_ID, None)
+        else:
+            dbc.convert_mongo_id(doc)
+        ret.append(doc)
+    return ret
+
+
+async def read(collection, db=JOURNAL_DB, no_id=True) -> list:
+    return await find(collection, db=db, no_id=no_id)
+
+
+async def read_dict(collection, key, db=JOURNAL_DB, no_id=True) -> dict:
+    recs = await read(collection, db=db, no_id=no_id)
+    return {rec[key]: rec for rec in recs}
+
+
+async def count(collection, filt=None, db=JOURNAL_DB) -> int:
+    if filt is None:
+        return await client[db][collection].estimated_document_count()
+    return await client[db][collection].count_documents(filt)
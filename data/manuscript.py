@@ -1,8 +1,29 @@
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+import data.analytics as anl
 import data.db_connect as dbc
+import data.manuscript_events as mev
+import data.manuscript_revisions as mrev
 import data.people as ppl
+import data.roles as rls
+import data.validation as val
 from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 MANUSCRIPTS_COLLECT = 'manuscripts'
+# Texts live outside MANUSCRIPTS_COLLECT, which keeps that collection
+# small enough to stay in RAM, so listings and state changes never load
+# a text. The current text is the latest revision's (see
+# manuscript_revisions). BODIES_COLLECT holds zlib-compressed texts
+# from before revisions, under the manuscript's own _id, until
+# move_texts() turns them into revisions.
+BODIES_COLLECT = 'manuscript_bodies'
 client = dbc.connect_db()
 
 # Fields
@@ -16,6 +37,20 @@ TEXT = 'text'
 ABSTRACT = 'abstract'
 HISTORY = 'history'
 EDITOR_EMAIL = 'editor_email'
+TEXT_SIZE = 'text_size'  # length of TEXT, kept on the manuscript
+STATE_SINCE = 'state_since'  # when it entered STATE (epoch seconds)
+# Normalized TITLE and AUTHOR_EMAIL, unique together (see ensure_indexes)
+TITLE_KEY = 'title_key'
+AUTHOR_EMAIL_KEY = 'author_email_key'
+# Tags the manuscripts one bulk_update_state() call moved.
+BULK_TOKEN = 'bulk_token'
+# Bookkeeping fields the API doesn't show.
+INTERNAL_FIELDS = (TEXT_SIZE, STATE_SINCE, TITLE_KEY, AUTHOR_EMAIL_KEY,
+                   BULK_TOKEN)
+PUBLIC_PROJECTION = {field: 0 for field in INTERNAL_FIELDS}
+
+# Body fields
+BODY = 'body'
 
 
 # States
@@ -96,8 +131,17 @@ def to_object_id(manu_id):
         return None
 
 
+def _read_fields(manu_id: str, fields: list) -> dict:
+    """
+    Read only the given fields of a manuscript, or None if not found.
+    """
+    return dbc.read_one(MANUSCRIPTS_COLLECT,
+                        {MANU_ID: to_object_id(manu_id)},
+                        projection=fields)
+
+
 def assign_ref(manu_id: str, ref: str, extra=None) -> str:
-    manuscript = read_one(manu_id)
+    manuscript = _read_fields(manu_id, [TITLE, REFEREES])
     if not manuscript:
         raise ValueError(f"Manuscript with _id '{manu_id}' not found")
     if not ref.strip():
@@ -118,7 +162,7 @@ def assign_ref(manu_id: str, ref: str, extra=None) -> str:
 
 
 def delete_ref(manu_id: str, ref: str) -> str:
-    manuscript = read_one(manu_id)
+    manuscript = _read_fields(manu_id, [REFEREES])
     if not manuscript:
         raise ValueError(f"Manuscript with _id '{manu_id}' not found")
     if not ref.strip():
@@ -135,75 +179,81 @@ def delete_ref(manu_id: str, ref: str) -> str:
         return SUBMITTED
 
 
-FUNC = 'f'
+FUNC = 'f'  # computes the new state, for actions with more than one
+NEXT = 'next'  # the states an action can lead to
 
 COMMON_ACTIONS = {
     WITHDRAW: {
-        FUNC: lambda **kwargs: WITHDRAWN,
+        NEXT: [WITHDRAWN],
     },
 }
 
 
 # STATE_TABLE: A dictionary mapping current_state ->
-# {action: function(manu, ref, **kwargs) -> new_state}
+# {action: {NEXT: [possible new states],
+#           FUNC (optional): function(manu_id, ref, **kwargs) -> new_state}}
+# An action without a FUNC always leads to its one NEXT state.
 STATE_TABLE = {
     SUBMITTED: {
         ASSIGN_REF: {
             FUNC: assign_ref,
+            NEXT: [IN_REF_REV],
         },
         REJECT: {
-            FUNC: lambda **kwargs: REJECTED,
+            NEXT: [REJECTED],
         },
         **COMMON_ACTIONS,
     },
     IN_REF_REV: {
         ASSIGN_REF: {
             FUNC: assign_ref,
+            NEXT: [IN_REF_REV],
         },
         DELETE_REF: {
             FUNC: delete_ref,
+            NEXT: [IN_REF_REV, SUBMITTED],
         },
         ACCEPT: {
-            FUNC: lambda **kwargs: COPY_EDIT,
+            NEXT: [COPY_EDIT],
         },
         REJECT: {
-            FUNC: lambda **kwargs: REJECTED,
+            NEXT: [REJECTED],
         },
         ACCEPT_WITH_REVISIONS: {
-            FUNC: lambda **kwargs: AUTHOR_REVISION,
+            NEXT: [AUTHOR_REVISION],
         },
         SUBMIT_REVIEW: {
-            FUNC: lambda **kwargs: IN_REF_REV,
+            NEXT: [IN_REF_REV],
         },
         **COMMON_ACTIONS,
     },
     COPY_EDIT: {
         DONE: {
-            FUNC: lambda **kwargs: AUTHOR_REV,
+            NEXT: [AUTHOR_REV],
         },
         **COMMON_ACTIONS,
     },
     AUTHOR_REV: {
         DONE: {
-            FUNC: lambda **kwargs: FORMATTING,
+            NEXT: [FORMATTING],
         },
         **COMMON_ACTIONS,
     },
     AUTHOR_REVISION: {
         DONE: {
-            FUNC: lambda **kwargs: EDITOR_REV,
+            NEXT: [EDITOR_REV],
         },
         **COMMON_ACTIONS,
     },
     EDITOR_REV: {
         ACCEPT: {
-            FUNC: lambda **kwargs: COPY_EDIT,
+            NEXT: [COPY_EDIT],
         },
         **COMMON_ACTIONS,
     },
     FORMATTING: {
         DONE: {
-            FUNC: lambda **kwargs: PUBLISHED,
+            NEXT: [PUBLISHED],
         },
         **COMMON_ACTIONS,
     },
@@ -216,76 +266,340 @@ STATE_TABLE = {
     WITHDRAWN: {},
 }
 
+# The states in which each role acts on a manuscript.
+ROLE_STATES = {
+    rls.ED_CODE: (SUBMITTED, EDITOR_REV),
+    rls.REFREE_CODE: (IN_REF_REV,),
+}
+
+Transition = namedtuple('Transition', ['func', 'next_states'])
+
+
+def _reachable(start: str, successors: dict) -> frozenset:
+    seen = set()
+    todo = list(successors[start])
+    while todo:
+        state = todo.pop()
+        if state not in seen:
+            seen.add(state)
+            todo.extend(successors[state])
+    return frozenset(seen)
+
+
+def compile_state_table(table: dict, role_states: dict) -> dict:
+    """
+    Check a state table and build the read-only indexes used at run
+    time. Raise ValueError if the table names an unknown state or action,
+    leaves a state out, or has states that can't be reached from
+    SUBMITTED.
+    """
+    if set(table) != set(VALID_STATES):
+        raise ValueError('STATE_TABLE must have exactly the valid states; '
+                         f'differs by {set(table) ^ set(VALID_STATES)}')
+    transitions = {}
+    successors = {}
+    predecessors = {state: set() for state in table}
+    for state, actions in table.items():
+        transitions[state] = {}
+        for action, entry in actions.items():
+            if action not in VALID_ACTIONS:
+                raise ValueError(f'Bad action {action} in state {state}')
+            next_states = tuple(entry[NEXT])
+            bad = [nxt for nxt in next_states if nxt not in table]
+            if bad or not next_states:
+                raise ValueError(f'Bad next states for {state}/{action}: '
+                                 f'{next_states}')
+            if FUNC not in entry and len(next_states) != 1:
+                raise ValueError(f'{state}/{action} needs a {FUNC} to '
+                                 'choose among its next states')
+            transitions[state][action] = Transition(entry.get(FUNC),
+                                                    next_states)
+            for nxt in next_states:
+                predecessors[nxt].add(state)
+        successors[state] = {nxt for trans in transitions[state].values()
+                             for nxt in trans.next_states}
+    reachable = {state: _reachable(state, successors) for state in table}
+    stranded = set(table) - reachable[SUBMITTED] - {SUBMITTED}
+    if stranded:
+        raise ValueError(f'States unreachable from {SUBMITTED}: {stranded}')
+    role_actions = {}
+    for role, states in role_states.items():
+        if not set(states) <= set(table):
+            raise ValueError(f'Bad states for role {role}: {states}')
+        role_actions[role] = frozenset(action for state in states
+                                       for action in table[state])
+    return {
+        'transitions': MappingProxyType(
+            {state: MappingProxyType(by_action)
+             for state, by_action in transitions.items()}),
+        'actions': MappingProxyType(
+            {state: frozenset(by_action)
+             for state, by_action in transitions.items()}),
+        'predecessors': MappingProxyType(
+            {state: frozenset(prev) for state, prev in predecessors.items()}),
+        'reachable': MappingProxyType(reachable),
+        'role_actions': MappingProxyType(role_actions),
+    }
+
+
+# Compiled once, at import, so a bad table fails at startup.
+_compiled = compile_state_table(STATE_TABLE, ROLE_STATES)
+# state -> {action: Transition}
+TRANSITIONS = _compiled['transitions']
+# state -> frozenset of the actions available in it
+STATE_ACTIONS = _compiled['actions']
+# state -> frozenset of the states one action away from reaching it
+PREDECESSORS = _compiled['predecessors']
+# state -> frozenset of the states it can eventually lead to
+REACHABLE = _compiled['reachable']
+# role code -> frozenset of the actions it can take
+ROLE_ACTIONS = _compiled['role_actions']
+
 
 def get_valid_actions_by_state(state: str):
-    valid_actions = STATE_TABLE[state].keys()
-    print(f'{valid_actions=}')
-    return valid_actions
+    # In table order, like the table itself; STATE_ACTIONS for membership.
+    return TRANSITIONS[state].keys()
+
+
+def get_next_states(state: str, action: str) -> tuple:
+    return TRANSITIONS[state][action].next_states
+
+
+def can_reach(from_state: str, to_state: str) -> bool:
+    return to_state in REACHABLE[from_state]
 
 
 def handle_action(manu_id, curr_state, action, **kwargs) -> str:
     kwargs['manu_id'] = manu_id
-    if curr_state not in STATE_TABLE:
+    if curr_state not in TRANSITIONS:
         raise ValueError(f'Bad state: {curr_state}')
-    if action not in STATE_TABLE[curr_state]:
+    if action not in TRANSITIONS[curr_state]:
         raise ValueError(f'{action} not available in {curr_state}')
-    return STATE_TABLE[curr_state][action][FUNC](**kwargs)
+    transition = TRANSITIONS[curr_state][action]
+    if transition.func is None:
+        return transition.next_states[0]
+    new_state = transition.func(**kwargs)
+    if new_state not in transition.next_states:
+        raise ValueError(f'{action} in {curr_state} led to {new_state}, '
+                         f'not one of {transition.next_states}')
+    return new_state
 
 
 def read() -> dict:
     """
-    Return a dictionary of all manuscripts keyed by their title.
+    Return a dictionary of all manuscripts keyed by their title,
+    without their INTERNAL_FIELDS.
     """
-    manuscripts = dbc.read_dict(MANUSCRIPTS_COLLECT, TITLE, no_id=False)
-    return manuscripts
+    return {manu[TITLE]: manu
+            for manu in dbc.find(MANUSCRIPTS_COLLECT, no_id=False,
+                                 projection=PUBLIC_PROJECTION)}
+
+
+def decompress_text(body: bytes) -> str:
+    return zlib.decompress(body).decode()
+
+
+def read_text(manu_id: str) -> str:
+    """
+    The manuscript's text, or None if it has none stored.
+    """
+    text = mrev.latest_text(manu_id)
+    if text is None:
+        # Not yet moved by move_texts().
+        doc = dbc.read_one(BODIES_COLLECT, {MANU_ID: to_object_id(manu_id)})
+        text = decompress_text(doc[BODY]) if doc else None
+    return text
 
 
-def read_one(manu_id: str) -> dict:
+def read_one(manu_id: str, with_text: bool = True) -> dict:
     """
     Return a single manuscript record as a dict, or None if not found.
+    The text is only fetched and decompressed if with_text is True.
+    """
+    manuscript = dbc.read_one(MANUSCRIPTS_COLLECT,
+                              {MANU_ID: to_object_id(manu_id)})
+    # Manuscripts not yet moved by move_texts() still have it inline.
+    if manuscript and with_text and TEXT not in manuscript:
+        manuscript[TEXT] = read_text(manu_id) or ''
+    return manuscript
+
+
+def add_text_json(manu_json: str, text: str) -> str:
+    """
+    Add a TEXT field to a manuscript already encoded as a JSON object.
+    """
+    return f'{manu_json[:-1]}, {json.dumps(TEXT)}: {json.dumps(text)}}}'
+
+
+def read_one_json(manu_id: str) -> str:
+    """
+    Return a single manuscript record encoded as JSON, or None if not found.
+    For endpoints that just forward the record, so without INTERNAL_FIELDS.
     """
-    return dbc.read_one(MANUSCRIPTS_COLLECT, {MANU_ID: to_object_id(manu_id)})
+    manu_json = dbc.read_one_json(MANUSCRIPTS_COLLECT,
+                                  {MANU_ID: to_object_id(manu_id)},
+                                  projection=PUBLIC_PROJECTION)
+    if manu_json is None or f'"{TEXT}":' in manu_json:
+        return manu_json
+    return add_text_json(manu_json, read_text(manu_id) or '')
+
+
+EXISTS_CACHE_MAX_SIZE = 4096
+# Long enough to save a read per comment in a busy review thread, short
+# enough that a manuscript deleted by another worker is soon noticed.
+EXISTS_CACHE_TTL = 30  # seconds
+
+
+class ExistsCache:
+    """
+    A bounded, thread-safe LRU set of manuscript ids known to exist,
+    each remembered for a TTL. Only hits are cached: an id that didn't
+    exist may have been created since.
+    """
+    def __init__(self, max_size: int = EXISTS_CACHE_MAX_SIZE,
+                 ttl: float = EXISTS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # manu_id -> expires_at
+        self._lock = threading.Lock()
+
+    def __contains__(self, manu_id: str) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(manu_id)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[manu_id]
+                return False
+            self._entries.move_to_end(manu_id)
+            return True
+
+    def add(self, manu_id: str):
+        with self._lock:
+            self._entries[manu_id] = time.monotonic() + self.ttl
+            self._entries.move_to_end(manu_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, manu_id: str):
+        with self._lock:
+            self._entries.pop(manu_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+known_manuscripts = ExistsCache()
 
 
 def exists(manu_id: str) -> bool:
     """
     Check if a manuscript with the given manu_id exists in the database.
     """
-    return read_one(manu_id) is not None
+    return dbc.exists(MANUSCRIPTS_COLLECT, {MANU_ID: to_object_id(manu_id)})
+
+
+def exists_cached(manu_id: str) -> bool:
+    """
+    Like exists(), but answered from known_manuscripts when possible.
+    A manuscript deleted by another worker may still be reported for up
+    to EXISTS_CACHE_TTL seconds.
+    """
+    if manu_id in known_manuscripts:
+        return True
+    if exists(manu_id):
+        known_manuscripts.add(manu_id)
+        return True
+    return False
+
+
+def dedup_keys(title: str, author_email: str) -> dict:
+    return {
+        TITLE_KEY: val.normalize_title(title),
+        AUTHOR_EMAIL_KEY: val.normalize_email(author_email),
+    }
+
+
+def ensure_indexes():
+    # One manuscript per title and author. Partial, so manuscripts that
+    # backfill_dedup_keys() couldn't key (duplicates) don't collide.
+    dbc.ensure_index(MANUSCRIPTS_COLLECT,
+                     [(TITLE_KEY, 1), (AUTHOR_EMAIL_KEY, 1)], unique=True,
+                     partialFilterExpression={TITLE_KEY: {'$exists': True}})
+
+
+def duplicate_error(title: str, author_email: str) -> ValueError:
+    return ValueError(f"A manuscript with title '{title}' and "
+                      f"author email '{author_email}' already exists.")
+
+
+def manuscript_errors(title: str, author: str, author_email_ok: bool,
+                      author_email: str, text: str, abstract: str,
+                      editor_email_ok: bool, editor_email: str) -> list:
+    """
+    What's wrong with a manuscript's fields, given whether its emails
+    are valid (so batches can check each distinct email once).
+    """
+    errors = []
+    if not author_email_ok:
+        errors.append(f'Author email invalid: {author_email}')
+    if not editor_email_ok:
+        errors.append(f'Editor email invalid: {editor_email}')
+    for name, value in (('Title', title), ('Author', author),
+                        ('Text', text), ('Abstract', abstract)):
+        if val.is_blank(value):
+            errors.append(f'{name} cannot be blank')
+    return errors
 
 
 def is_valid_manuscript(title: str, author: str,
                         author_email: str, text: str,
-                        abstract: str, editor_email: str,
-                        manu_id: str = None) -> bool:
-    if not ppl.is_valid_email(author_email):
-        raise ValueError(f'Author email invalid: {author_email}')
-    if not ppl.is_valid_email(editor_email):
-        raise ValueError(f'Editor email invalid: {editor_email}')
-    if not title.strip():
-        raise ValueError("Title cannot be blank")
-    if not author.strip():
-        raise ValueError("Author cannot be blank")
-    if not text.strip():
-        raise ValueError("Text cannot be blank")
-    if not abstract.strip():
-        raise ValueError("Abstract cannot be blank")
-
-    # Check for duplicate, but exclude the manuscript being updated
-    query = {TITLE: title, AUTHOR_EMAIL: author_email}
-    existing_manuscript = dbc.read_one(MANUSCRIPTS_COLLECT, query)
-
-    if existing_manuscript:
-        # If we're updating (manu_id is provided)
-        # and the existing manuscript is the same one,
-        # then it's not a duplicate
-        if manu_id and str(existing_manuscript[MANU_ID]) == manu_id:
-            return True
-        raise ValueError(f"A manuscript with title '{title}' and "
-                         f"author email '{author_email}' already exists.")
+                        abstract: str, editor_email: str) -> bool:
+    """
+    Check the fields. Duplicates are caught by the unique index when
+    the manuscript is written.
+    """
+    errors = manuscript_errors(
+        title, author, val.is_valid_email(author_email), author_email,
+        text, abstract, val.is_valid_email(editor_email), editor_email)
+    if errors:
+        raise ValueError(errors[0])
     return True
 
 
+def validate_manuscripts(records: list) -> dict:
+    """
+    Check a batch of manuscript records, e.g. before a bulk import.
+    Return {row index: [errors]} for the rows with problems, including
+    title and author pairs repeated within the batch; empty if all are
+    fine. Doesn't check the DB for manuscripts that already exist.
+    """
+    ok_emails = val.valid_emails(
+        [rec.get(AUTHOR_EMAIL) for rec in records]
+        + [rec.get(EDITOR_EMAIL) for rec in records])
+    errors = {}
+    keys = []
+    for i, rec in enumerate(records):
+        # Most rows are fine, so check them inline and only build
+        # messages for the rest.
+        if (rec.get(AUTHOR_EMAIL) in ok_emails
+                and rec.get(EDITOR_EMAIL) in ok_emails
+                and not any(val.is_blank(rec.get(field)) for field in
+                            (TITLE, AUTHOR, TEXT, ABSTRACT))):
+            keys.append(tuple(dedup_keys(rec[TITLE],
+                                         rec[AUTHOR_EMAIL]).values()))
+            continue
+        keys.append(None)
+        errors[i] = manuscript_errors(
+            rec.get(TITLE), rec.get(AUTHOR),
+            rec.get(AUTHOR_EMAIL) in ok_emails, rec.get(AUTHOR_EMAIL),
+            rec.get(TEXT), rec.get(ABSTRACT),
+            rec.get(EDITOR_EMAIL) in ok_emails, rec.get(EDITOR_EMAIL))
+    val.mark_duplicates(errors, keys, 'Duplicate title and author in batch.')
+    return errors
+
+
 def create(title: str, author: str, author_email: str,
            text: str, abstract: str, editor_email: str):
     if is_valid_manuscript(title, author, author_email, text,
@@ -296,13 +610,23 @@ def create(title: str, author: str, author_email: str,
             AUTHOR_EMAIL: author_email,
             STATE: SUBMITTED,
             REFEREES: [],
-            TEXT: text,
+            TEXT_SIZE: len(text),
             ABSTRACT: abstract,
             HISTORY: [SUBMITTED],
             EDITOR_EMAIL: editor_email,
+            STATE_SINCE: time.time(),
+            **dedup_keys(title, author_email),
         }
-        result = dbc.create(MANUSCRIPTS_COLLECT, manuscript)
-        return str(result.inserted_id)
+        ensure_indexes()
+        try:
+            manu_id = str(dbc.create(MANUSCRIPTS_COLLECT, manuscript)
+                          .inserted_id)
+        except DuplicateKeyError:
+            raise duplicate_error(title, author_email)
+        mrev.save(manu_id, title, abstract, text)
+        mev.record(manu_id, None, SUBMITTED, mev.CREATE,
+                   at=manuscript[STATE_SINCE])
+        return manu_id
 
 
 def delete(manu_id: str):
@@ -311,6 +635,10 @@ def delete(manu_id: str):
     Returns the manu_id if deletion succeeded, else None.
     """
     del_num = dbc.delete(MANUSCRIPTS_COLLECT, {MANU_ID: to_object_id(manu_id)})
+    known_manuscripts.discard(manu_id)
+    if del_num == 1:
+        dbc.delete(BODIES_COLLECT, {MANU_ID: to_object_id(manu_id)})
+        mrev.delete(manu_id)
     return manu_id if del_num == 1 else None
 
 
@@ -319,44 +647,68 @@ def update(manu_id: str, title: str, author: str, author_email: str,
     if not exists(manu_id):
         raise ValueError(f'Updating non-existent manuscript: {manu_id=}')
     if is_valid_manuscript(title, author, author_email, text,
-                           abstract, editor_email, manu_id):
+                           abstract, editor_email):
+        if not mrev.latest(manu_id):
+            # From before revisions: keep what it was as revision 1.
+            old = read_one(manu_id)
+            mrev.save(manu_id, old[TITLE], old[ABSTRACT], old[TEXT])
+        # The revision goes first: if another update beat us to its
+        # number, save() raises before the manuscript has changed.
+        number = mrev.save(manu_id, title, abstract, text)
         updated_fields = {
             TITLE: title,
             AUTHOR: author,
             AUTHOR_EMAIL: author_email,
-            TEXT: text,
+            TEXT_SIZE: len(text),
             ABSTRACT: abstract,
             EDITOR_EMAIL: editor_email,
+            **dedup_keys(title, author_email),
         }
-        dbc.update(MANUSCRIPTS_COLLECT,
-                   {MANU_ID: to_object_id(manu_id)},
-                   updated_fields)
+        ensure_indexes()
+        try:
+            dbc.update_doc(MANUSCRIPTS_COLLECT,
+                           {MANU_ID: to_object_id(manu_id)},
+                           {'$set': updated_fields, '$unset': {TEXT: ''}})
+        except DuplicateKeyError:
+            mrev.discard(manu_id, number)
+            raise duplicate_error(title, author_email)
+        dbc.delete(BODIES_COLLECT, {MANU_ID: to_object_id(manu_id)})
         return manu_id
 
 
-def update_state(manu_id: str, action: str, **kwargs):
+def update_state(manu_id: str, action: str, actor: str = None, **kwargs):
     """
-    Updates the state of a manuscript based on the given action.
+    Updates the state of a manuscript based on the given action,
+    and records the transition in the event log.
     :param manu_id: The _id of the manuscript to update.
     :param action: The action to perform (e.g., ACCEPT, REJECT, ASSIGN_REF).
+    :param actor: Who is performing it, for the event log.
     :param kwargs: Additional arguments required by specific actions.
     :return: The updated state of the manuscript.
+    Raise ValueError if its state changed since it was read.
     """
-    manuscript = read_one(manu_id)
+    manuscript = _read_fields(manu_id, [STATE, STATE_SINCE])
     current_state = manuscript[STATE]
     # Determine the new state using handle_action
     new_state = handle_action(
         manu_id, current_state, action, **kwargs
     )
-    # Update the manuscript state and history in the database
-    dbc.update(
+    now = time.time()
+    # Append to the history rather than rewrite it. Only move on from the
+    # state read above, so a racing action can't log a transition twice.
+    ret = dbc.update_doc(
         MANUSCRIPTS_COLLECT,
-        {MANU_ID: to_object_id(manu_id)},
-        {
-            STATE: new_state,
-            HISTORY: manuscript[HISTORY] + [new_state],
-        },
+        {MANU_ID: to_object_id(manu_id), STATE: current_state},
+        {'$set': {STATE: new_state, STATE_SINCE: now},
+         '$push': {HISTORY: new_state}},
     )
+    if ret.modified_count != 1:
+        raise ValueError(f'Manuscript {manu_id} was changed concurrently; '
+                         'reload it and try again.')
+    mev.record(manu_id, current_state, new_state, action, actor, at=now)
+    # Manuscripts from before STATE_SINCE can't say how long they took.
+    if STATE_SINCE in manuscript:
+        anl.record(current_state, new_state, now - manuscript[STATE_SINCE])
     if action == ASSIGN_REF and kwargs.get('ref'):
         try:
             ppl.add_role(kwargs['ref'], 'RE')
@@ -365,21 +717,188 @@ def update_state(manu_id: str, action: str, **kwargs):
     return manu_id
 
 
+MAX_BULK = 10_000  # manuscripts per bulk_update_state() call
+
+# bulk result fields
+OK = 'ok'
+ERROR = 'error'
+
+
+def bulk_update_state(manu_ids: list, action: str, actor: str = None) -> dict:
+    """
+    Apply one action to many manuscripts at once, e.g. rejecting or
+    withdrawing a batch. Only actions with a fixed outcome can be bulk
+    applied; raise ValueError for others, for ids that aren't strings,
+    or for too many manuscripts.
+    Returns {manu_id: {ok: True, state: new state}} for each manuscript
+    moved and {manu_id: {ok: False, error: why}} for each one that wasn't.
+    Ids naming the same manuscript (e.g. in another case) share a result.
+
+    Transitions are checked against the compiled state table in memory,
+    then written as one conditional update per current state, so a
+    manuscript whose state changed meanwhile is left alone and reported.
+    """
+    if not is_valid_action(action):
+        raise ValueError(f'Bad action: {action}')
+    if any(by_action[action].func for by_action in TRANSITIONS.values()
+           if action in by_action):
+        raise ValueError(f'{action} needs per-manuscript details; '
+                         'it cannot be bulk applied.')
+    if not all(isinstance(manu_id, str) for manu_id in manu_ids):
+        raise ValueError('Manuscript ids must be strings.')
+    if len(manu_ids) > MAX_BULK:
+        raise ValueError(f'At most {MAX_BULK} manuscripts at a time.')
+    results = {}
+    oids = {}  # ObjectId -> the ids the caller gave for it
+    for manu_id in manu_ids:
+        oid = to_object_id(manu_id)
+        if oid is None:
+            results[manu_id] = {OK: False, ERROR: 'Bad manuscript id.'}
+        else:
+            oids.setdefault(oid, []).append(manu_id)
+    found = dbc.find(MANUSCRIPTS_COLLECT, {MANU_ID: {'$in': list(oids)}},
+                     no_id=False, projection=[STATE, STATE_SINCE])
+    # Keyed by the canonical id, as the caller's may differ, e.g. in case.
+    current = {manu[MANU_ID]: manu for manu in found}
+    by_state = {}
+    for oid, given_ids in oids.items():
+        manu = current.get(str(oid))
+        if not manu:
+            result = {OK: False, ERROR: 'No such manuscript.'}
+        elif action not in TRANSITIONS.get(manu[STATE], {}):
+            result = {
+                OK: False, ERROR: f'{action} not available in {manu[STATE]}'}
+        else:
+            by_state.setdefault(manu[STATE], []).append(oid)
+            continue
+        for manu_id in given_ids:
+            results[manu_id] = result
+    if not by_state:
+        return results
+
+    now = time.time()
+    token = ObjectId()
+    updates = []
+    for state, state_oids in by_state.items():
+        new_state = TRANSITIONS[state][action].next_states[0]
+        updates.append(UpdateMany(
+            {MANU_ID: {'$in': state_oids}, STATE: state},
+            {'$set': {STATE: new_state, STATE_SINCE: now, BULK_TOKEN: token},
+             '$push': {HISTORY: new_state}}))
+    expected = sum(len(state_oids) for state_oids in by_state.values())
+    moved = {str(oid) for oid in oids}
+    if dbc.bulk_write(MANUSCRIPTS_COLLECT, updates).modified_count < expected:
+        # Some changed state under us: this write tagged only the rest.
+        moved = {manu[MANU_ID] for manu in dbc.find(
+            MANUSCRIPTS_COLLECT,
+            {MANU_ID: {'$in': list(oids)}, BULK_TOKEN: token},
+            no_id=False, projection=[MANU_ID])}
+
+    events = []
+    timings = []
+    for state, state_oids in by_state.items():
+        new_state = TRANSITIONS[state][action].next_states[0]
+        for oid in state_oids:
+            if str(oid) not in moved:
+                for manu_id in oids[oid]:
+                    results[manu_id] = {
+                        OK: False, ERROR: 'State changed; try again.'}
+                continue
+            for manu_id in oids[oid]:
+                results[manu_id] = {OK: True, STATE: new_state}
+            events.append(mev.make_event(str(oid), state, new_state, action,
+                                         actor, now))
+            since = current[str(oid)].get(STATE_SINCE)
+            if since is not None:
+                timings.append((state, new_state, now - since))
+    mev.record_many(events)
+    anl.record_many(timings)
+    return results
+
+
 def search_by_title(title: str) -> dict:
     """
     Search for manuscripts by title (case-insensitive partial match).
-    Returns a dictionary of matching manuscripts keyed by their title.
+    Returns a dictionary of matching manuscripts keyed by their title,
+    without their INTERNAL_FIELDS.
     """
     manuscripts = {}
     if not title.strip():
         return manuscripts
-    all_manuscripts = dbc.read(MANUSCRIPTS_COLLECT, no_id=False)
+    all_manuscripts = dbc.find(MANUSCRIPTS_COLLECT, no_id=False,
+                               projection=PUBLIC_PROJECTION)
     for manuscript in all_manuscripts:
         if title.lower() in manuscript[TITLE].lower():
             manuscripts[manuscript[TITLE]] = manuscript
     return manuscripts
 
 
+def move_texts() -> int:
+    """
+    Migration: turn texts from before revisions, inline in the
+    manuscript or in BODIES_COLLECT, into each manuscript's first
+    revision. A manuscript that already has revisions keeps them, as
+    they are newer. Safe to rerun. Returns the number of texts moved.
+    """
+    moved = 0
+    updates = []
+    for manuscript in dbc.find(MANUSCRIPTS_COLLECT, {TEXT: {'$exists': True}},
+                               no_id=False,
+                               projection=[TITLE, ABSTRACT, TEXT]):
+        manu_id = manuscript[MANU_ID]
+        if not mrev.latest(manu_id):
+            mrev.save(manu_id, manuscript[TITLE], manuscript[ABSTRACT],
+                      manuscript[TEXT])
+        updates.append(UpdateOne(
+            {MANU_ID: to_object_id(manu_id)},
+            {'$set': {TEXT_SIZE: len(manuscript[TEXT])},
+             '$unset': {TEXT: ''}}))
+        moved += 1
+    if updates:
+        dbc.bulk_write(MANUSCRIPTS_COLLECT, updates)
+    for body in dbc.find(BODIES_COLLECT, no_id=False):
+        manu_id = body[MANU_ID]
+        manuscript = _read_fields(manu_id, [TITLE, ABSTRACT])
+        if manuscript and not mrev.latest(manu_id):
+            mrev.save(manu_id, manuscript[TITLE], manuscript[ABSTRACT],
+                      decompress_text(body[BODY]))
+            moved += 1
+        dbc.delete(BODIES_COLLECT, {MANU_ID: to_object_id(manu_id)})
+    return moved
+
+
+def backfill_dedup_keys() -> list:
+    """
+    Migration: give every manuscript its normalized title and email keys,
+    then create the unique index on them. Safe to rerun.
+    A manuscript that duplicates an earlier one is left without keys;
+    returns their _ids, for an editor to merge or rename.
+    """
+    taken = {}
+    for manu in dbc.find(MANUSCRIPTS_COLLECT, {TITLE_KEY: {'$exists': True}},
+                         no_id=False, projection=[TITLE_KEY,
+                                                  AUTHOR_EMAIL_KEY]):
+        taken[(manu[TITLE_KEY], manu[AUTHOR_EMAIL_KEY])] = manu[MANU_ID]
+    updates = []
+    duplicates = []
+    for manu in dbc.find(MANUSCRIPTS_COLLECT,
+                         {TITLE_KEY: {'$exists': False}}, no_id=False,
+                         projection=[TITLE, AUTHOR_EMAIL],
+                         sort=[(MANU_ID, 1)]):
+        keys = dedup_keys(manu[TITLE], manu[AUTHOR_EMAIL])
+        pair = (keys[TITLE_KEY], keys[AUTHOR_EMAIL_KEY])
+        if pair in taken:
+            duplicates.append(manu[MANU_ID])
+            continue
+        taken[pair] = manu[MANU_ID]
+        updates.append(UpdateOne({MANU_ID: to_object_id(manu[MANU_ID])},
+                                 {'$set': keys}))
+    if updates:
+        dbc.bulk_write(MANUSCRIPTS_COLLECT, updates)
+    ensure_indexes()
+    return duplicates
+
+
 def main():
     pass
 
@@ -0,0 +1,147 @@
+"""
+An append-only log of manuscript state transitions.
+
+Each transition is one event: which manuscript, the state it left and
+the one it entered, the action, who did it and when. Events are only
+ever inserted, never updated, and they outlive the manuscript, so the
+log stays a complete record of what happened.
+
+Pages of events are ordered by (time, _id) and continue from a cursor
+naming the last event seen, so each page is one index range scan
+however deep into the log it starts.
+"""
+import time
+
+from bson import ObjectId
+
+import data.db_connect as dbc
+
+EVENTS_COLLECT = 'manuscript_events'
+
+# event fields
+MANU_ID = 'manu_id'
+FROM_STATE = 'from'
+TO_STATE = 'to'
+ACTION = 'action'
+ACTOR = 'actor'
+AT = 'at'
+
+# page fields
+EVENTS = 'events'
+NEXT = 'next'  # cursor for the next page, or None on the last one
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+CREATE = 'create'  # the action of a manuscript's first event
+
+
+def ensure_indexes():
+    # "events for manuscript X", in order
+    dbc.ensure_index(EVENTS_COLLECT,
+                     [(MANU_ID, 1), (AT, 1), (dbc.MONGO_ID, 1)])
+    # "all transitions in a time range"
+    dbc.ensure_index(EVENTS_COLLECT, [(AT, 1), (dbc.MONGO_ID, 1)])
+
+
+def make_event(manu_id: str, from_state: str, to_state: str, action: str,
+               actor: str = None, at: float = None) -> dict:
+    return {
+        MANU_ID: manu_id,
+        FROM_STATE: from_state,
+        TO_STATE: to_state,
+        ACTION: action,
+        ACTOR: actor,
+        AT: time.time() if at is None else at,
+    }
+
+
+def record(manu_id: str, from_state: str, to_state: str, action: str,
+           actor: str = None, at: float = None):
+    ensure_indexes()
+    dbc.create(EVENTS_COLLECT, make_event(manu_id, from_state, to_state,
+                                          action, actor, at))
+
+
+def record_many(events: list):
+    """
+    Insert events made with make_event() in one batch.
+    """
+    if events:
+        ensure_indexes()
+        dbc.create_many(EVENTS_COLLECT, events)
+
+
+def make_cursor(event: dict) -> str:
+    return f'{event[AT]!r}:{event[dbc.MONGO_ID]}'
+
+
+def parse_cursor(cursor: str) -> dict:
+    """
+    The filter for events after the one a cursor names.
+    Raise ValueError if the cursor is malformed.
+    """
+    try:
+        at, event_id = cursor.rsplit(':', 1)
+        at, event_id = float(at), ObjectId(event_id)
+    except Exception:
+        raise ValueError(f'Bad cursor: {cursor}')
+    return {'$or': [{AT: {'$gt': at}},
+                    {AT: at, dbc.MONGO_ID: {'$gt': event_id}}]}
+
+
+def _page(filt: dict, limit: int, cursor: str) -> dict:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        filt = {'$and': [filt, parse_cursor(cursor)]}
+    # One extra to learn whether there is a next page.
+    events = dbc.find(EVENTS_COLLECT, filt, no_id=False,
+                      sort=[(AT, 1), (dbc.MONGO_ID, 1)], limit=limit + 1)
+    more = len(events) > limit
+    events = events[:limit]
+    return {
+        EVENTS: events,
+        NEXT: make_cursor(events[-1]) if more else None,
+    }
+
+
+def for_manuscript(manu_id: str, limit: int = PAGE_SIZE,
+                   cursor: str = None) -> dict:
+    """
+    A page of a manuscript's events, oldest first: {events, next}.
+    """
+    ensure_indexes()
+    return _page({MANU_ID: manu_id}, limit, cursor)
+
+
+def in_range(start: float = None, end: float = None,
+             limit: int = PAGE_SIZE, cursor: str = None) -> dict:
+    """
+    A page of all events with start <= time < end, oldest first.
+    Either bound may be left off.
+    """
+    ensure_indexes()
+    bounds = {}
+    if start is not None:
+        bounds['$gte'] = start
+    if end is not None:
+        bounds['$lt'] = end
+    return _page({AT: bounds} if bounds else {}, limit, cursor)
+
+
+def time_in_states(manu_id: str, now: float = None) -> dict:
+    """
+    Seconds the manuscript has spent in each state, per its events,
+    counting the current state up to now. Empty if it has no events.
+    """
+    ensure_indexes()
+    events = dbc.find(EVENTS_COLLECT, {MANU_ID: manu_id},
+                      projection=[TO_STATE, AT],
+                      sort=[(AT, 1), (dbc.MONGO_ID, 1)])
+    now = time.time() if now is None else now
+    totals = {}
+    ends = [event[AT] for event in events[1:]] + [now]
+    for event, end in zip(events, ends):
+        state = event[TO_STATE]
+        totals[state] = totals.get(state, 0) + end - event[AT]
+    return totals
@@ -0,0 +1,232 @@
+"""
+Every submitted version of a manuscript, deduplicated by content.
+
+A revision's text is split into paragraphs and each paragraph is stored
+once, zlib-compressed, in CHUNKS_COLLECT under the sha256 of its
+content. A revision in REVISIONS_COLLECT lists its paragraphs' hashes,
+so paragraphs that don't change between revisions cost one hash each.
+Diffs compare hash lists first and only fetch paragraphs that changed.
+"""
+import difflib
+import hashlib
+import re
+import time
+import zlib
+
+from bson import Binary
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import data.db_connect as dbc
+
+REVISIONS_COLLECT = 'manuscript_revisions'
+CHUNKS_COLLECT = 'manuscript_chunks'
+
+# revision fields
+MANU_ID = 'manu_id'
+REVISION = 'revision'
+TITLE = 'title'
+ABSTRACT = 'abstract'
+TEXT = 'text'  # only in what read() returns; stored as CHUNKS
+CHUNKS = 'chunks'  # paragraph hashes, in order
+CREATED = 'created'
+# chunk fields
+BODY = 'body'
+
+# diff fields
+OP = 'op'
+EQUAL = 'equal'
+FROM = 'from'
+TO = 'to'
+COUNT = 'count'
+
+COMPRESS_LEVEL = 6
+
+# A paragraph runs up to and including the blank line(s) that end it,
+# so joining the paragraphs gives back the text exactly.
+PARAGRAPH_RE = re.compile(r'.*?(?:\n[ \t]*\n\s*|\Z)', re.DOTALL)
+
+
+def ensure_indexes():
+    dbc.ensure_index(REVISIONS_COLLECT, [(MANU_ID, 1), (REVISION, 1)],
+                     unique=True)
+
+
+def split_paragraphs(text: str) -> list:
+    return [para for para in PARAGRAPH_RE.findall(text) if para]
+
+
+def chunk_hash(para: str) -> str:
+    return hashlib.sha256(para.encode()).hexdigest()
+
+
+def store_chunks(paras: list) -> list:
+    """
+    Store the paragraphs that aren't stored yet; return all their hashes.
+    """
+    digests = [chunk_hash(para) for para in paras]
+    chunks = dict(zip(digests, paras))
+    known = {doc[dbc.MONGO_ID] for doc in dbc.find(
+        CHUNKS_COLLECT, {dbc.MONGO_ID: {'$in': list(chunks)}},
+        no_id=False, projection=[dbc.MONGO_ID])}
+    new = [UpdateOne({dbc.MONGO_ID: digest},
+                     {'$setOnInsert': {BODY: Binary(zlib.compress(
+                         para.encode(), COMPRESS_LEVEL))}},
+                     upsert=True)
+           for digest, para in chunks.items() if digest not in known]
+    if new:
+        dbc.bulk_write(CHUNKS_COLLECT, new)
+    return digests
+
+
+def chunks_filter(digests) -> dict:
+    return {dbc.MONGO_ID: {'$in': list(digests)}}
+
+
+def decode_chunks(docs) -> dict:
+    return {doc[dbc.MONGO_ID]: zlib.decompress(doc[BODY]).decode()
+            for doc in docs}
+
+
+def read_chunks(digests) -> dict:
+    """
+    Fetch paragraphs by hash, in one query: {hash: paragraph}.
+    """
+    return decode_chunks(dbc.find(CHUNKS_COLLECT, chunks_filter(digests),
+                                  no_id=False))
+
+
+def join_text(record: dict, paras: dict) -> str:
+    """
+    A revision's text, from its record and its paragraphs by hash.
+    """
+    return ''.join(paras[digest] for digest in record[CHUNKS])
+
+
+LATEST_SORT = [(REVISION, -1)]
+
+
+def latest(manu_id: str) -> dict:
+    """
+    The newest revision's record (hashes, not text), or None.
+    """
+    ensure_indexes()
+    return dbc.read_one(REVISIONS_COLLECT, {MANU_ID: manu_id},
+                        sort=LATEST_SORT)
+
+
+def latest_text(manu_id: str) -> str:
+    """
+    The newest revision's text, or None if there are no revisions.
+    This is the manuscript's current text.
+    """
+    record = latest(manu_id)
+    if not record:
+        return None
+    return join_text(record, read_chunks(set(record[CHUNKS])))
+
+
+def save(manu_id: str, title: str, abstract: str, text: str) -> int:
+    """
+    Record a new revision of a manuscript; return its number.
+    Raise ValueError if another revision was saved at the same time.
+    """
+    prev = latest(manu_id)
+    number = prev[REVISION] + 1 if prev else 1
+    revision = {
+        MANU_ID: manu_id,
+        REVISION: number,
+        TITLE: title,
+        ABSTRACT: abstract,
+        CHUNKS: store_chunks(split_paragraphs(text)),
+        CREATED: time.time(),
+    }
+    try:
+        dbc.create(REVISIONS_COLLECT, revision)
+    except DuplicateKeyError:
+        raise ValueError(f'Manuscript {manu_id} was changed concurrently; '
+                         'reload it and try again.')
+    return number
+
+
+def list_revisions(manu_id: str) -> list:
+    """
+    The manuscript's revisions, newest first: [{revision, title, created}].
+    """
+    ensure_indexes()
+    return dbc.find(REVISIONS_COLLECT, {MANU_ID: manu_id},
+                    projection={REVISION: 1, TITLE: 1, CREATED: 1},
+                    sort=[(REVISION, -1)])
+
+
+def _read_record(manu_id: str, number: int) -> dict:
+    return dbc.read_one(REVISIONS_COLLECT,
+                        {MANU_ID: manu_id, REVISION: number})
+
+
+def read(manu_id: str, number: int) -> dict:
+    """
+    One revision with its text, or None if there is no such revision.
+    """
+    record = _read_record(manu_id, number)
+    if not record:
+        return None
+    paras = read_chunks(set(record[CHUNKS]))
+    return {
+        MANU_ID: manu_id,
+        REVISION: number,
+        TITLE: record[TITLE],
+        ABSTRACT: record[ABSTRACT],
+        CREATED: record[CREATED],
+        TEXT: join_text(record, paras),
+    }
+
+
+def diff(manu_id: str, old_number: int, new_number: int) -> dict:
+    """
+    What changed between two revisions, paragraph by paragraph:
+    runs of unchanged paragraphs are only counted, and only changed
+    paragraphs are fetched. Return None if either revision is missing.
+    """
+    old = _read_record(manu_id, old_number)
+    new = _read_record(manu_id, new_number)
+    if not old or not new:
+        return None
+    matcher = difflib.SequenceMatcher(None, old[CHUNKS], new[CHUNKS],
+                                      autojunk=False)
+    opcodes = matcher.get_opcodes()
+    changed = set()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != EQUAL:
+            changed.update(old[CHUNKS][i1:i2], new[CHUNKS][j1:j2])
+    paras = read_chunks(changed) if changed else {}
+    changes = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == EQUAL:
+            changes.append({OP: EQUAL, COUNT: i2 - i1})
+        else:
+            changes.append({
+                OP: tag,
+                FROM: [paras[digest] for digest in old[CHUNKS][i1:i2]],
+                TO: [paras[digest] for digest in new[CHUNKS][j1:j2]],
+            })
+    result = {FROM: old_number, TO: new_number, TEXT: changes}
+    for field in (TITLE, ABSTRACT):
+        if old[field] != new[field]:
+            result[field] = {FROM: old[field], TO: new[field]}
+    return result
+
+
+def discard(manu_id: str, number: int):
+    """
+    Drop one revision, when the manuscript change it recorded failed.
+    """
+    dbc.delete(REVISIONS_COLLECT, {MANU_ID: manu_id, REVISION: number})
+
+
+def delete(manu_id: str) -> int:
+    """
+    Drop a manuscript's revisions. Their chunks stay, as other
+    revisions may share them.
+    """
+    return dbc.delete_many(REVISIONS_COLLECT, {MANU_ID: manu_id})
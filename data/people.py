@@ -1,7 +1,15 @@
 import re
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from copy import deepcopy
+
+from pymongo import UpdateOne
+
 import data.roles as rls
 import data.db_connect as dbc
+import data.validation as val
 
 MIN_USER_NAME_LEN = 2
 PEOPLE_COLLECT = 'people'
@@ -13,63 +21,274 @@ ROLES = 'roles'
 AFFILIATION = 'affiliation'
 EMAIL = 'email'
 BIO = 'bio'
+# Bumped on every role change; see security.tokens.
+TOKEN_VERSION = 'token_version'
+# ROLES as a bitmask (see roles.ROLE_BITS), kept in sync with ROLES.
+ROLE_MASK = 'role_mask'
 
 MH_FIELDS = [NAME, AFFILIATION, BIO]
 client = dbc.connect_db()
 
-CHAR_OR_DIGIT = '[A-Za-z0-9]'
+UUID_RE = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+    re.IGNORECASE,
+)
+
+# read_one() cache settings:
+CACHE_MAX_SIZE = 2048  # keys; a record takes one key for id, one for email
+CACHE_TTL = 30  # seconds
+
+
+class PeopleCache:
+    """
+    A bounded, thread-safe LRU cache of people records with a TTL.
+    Each record is indexed under both its id and its email, so either
+    identifier resolves without a DB round-trip.
+    Callers get copies, so they can't corrupt the cached record.
+    """
+    def __init__(self, max_size: int = CACHE_MAX_SIZE,
+                 ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, rec)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(rec: dict) -> list:
+        return [key for key in (rec.get(ID), rec.get(EMAIL)) if key]
+
+    def _drop(self, rec: dict):
+        for key in self._keys(rec):
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is rec:
+                del self._entries[key]
+
+    def get(self, identifier: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, rec = entry
+            if expires_at <= time.monotonic():
+                self._drop(rec)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(identifier)
+            self.hits += 1
+            return deepcopy(rec)
+
+    def put(self, rec: dict):
+        rec = deepcopy(rec)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in self._keys(rec):
+                old = self._entries.get(key)
+                if old is not None:
+                    self._drop(old[1])
+            for key in self._keys(rec):
+                self._entries[key] = (expires_at, rec)
+            while len(self._entries) > self.max_size:
+                _, (_, old_rec) = self._entries.popitem(last=False)
+                self._drop(old_rec)
+                self.evictions += 1
+
+    def invalidate(self, identifier: str):
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is not None:
+                self._drop(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
+
+
+_cache = PeopleCache()
+
+
+def cache_get(identifier: str) -> dict:
+    """
+    The cached record for a user (by UUID or email), or None.
+    """
+    return _cache.get(identifier)
+
+
+def cache_put(rec: dict):
+    _cache.put(rec)
+
+
+def invalidate(identifier: str):
+    """
+    Forget the cached record for a user (by UUID or email).
+    Must be called after any write to a people record.
+    """
+    _cache.invalidate(identifier)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
 
 
 def is_valid_email(email: str) -> bool:
-    pattern = (
-        rf"^(?!.*\.\.)"                    # no consecutive '.'
-        rf"{CHAR_OR_DIGIT}[A-Za-z0-9._%+-]*"
-        rf"@{CHAR_OR_DIGIT}[A-Za-z0-9.-]*"
-        r"\.[A-Za-z]{2,10}$"
-    )
-    return bool(re.match(pattern, email))
+    return val.is_valid_email(email)
+
+
+def key_people(recs: list) -> dict:
+    return {rec.get(ID) or rec.get(EMAIL): rec for rec in recs}
 
 
 def read() -> dict:
     """
     Return all users keyed by UUID.
     """
-    recs = dbc.read(PEOPLE_COLLECT)
-    out = {}
-    for rec in recs:
-        key = rec.get(ID) or rec.get(EMAIL)
-        out[key] = rec
-    return out
+    return key_people(dbc.read(PEOPLE_COLLECT))
+
+
+def roles_filter(codes) -> dict:
+    return {ROLES: {'$in': list(codes)}}
+
+
+def read_by_roles(codes) -> dict:
+    """
+    Return the users with any of the given roles, keyed by UUID.
+    """
+    return key_people(dbc.find(PEOPLE_COLLECT, roles_filter(codes)))
+
+
+def ensure_indexes():
+    """
+    Build the indexes the reads below rely on.
+    Called once at startup (see server.endpoints), not per read.
+    """
+    dbc.ensure_index(PEOPLE_COLLECT, ID)
+    dbc.ensure_index(PEOPLE_COLLECT, EMAIL)
+    # Multikey: serves "any of these roles" queries (read_by_roles()).
+    dbc.ensure_index(PEOPLE_COLLECT, ROLES)
+
+
+# Matches no document, without a scan.
+NO_MATCH = {dbc.MONGO_ID: {'$in': []}}
+
+
+def identifier_filter(identifier: str) -> dict:
+    """
+    Build the filter for a UUID-or-email identifier, so that a lookup
+    is always a single query.
+    Emails always contain an '@' and our UUIDs never do; anything else
+    (e.g. legacy ids) is matched against both fields with an indexed $or.
+    A non-string (e.g. a missing None) matches no one.
+    """
+    if not isinstance(identifier, str):
+        return NO_MATCH
+    if '@' in identifier:
+        return {EMAIL: identifier}
+    if UUID_RE.match(identifier):
+        return {ID: identifier}
+    return {'$or': [{ID: identifier}, {EMAIL: identifier}]}
 
 
 def read_one(identifier: str) -> dict:
     """
     Lookup a user by UUID or email.
     Returns full record or None.
+    Records are served from the cache when possible.
     """
-    rec = dbc.read_one(PEOPLE_COLLECT, {ID: identifier})
-    if rec:
+    rec = cache_get(identifier)
+    if rec is not None:
         return rec
-    return dbc.read_one(PEOPLE_COLLECT, {EMAIL: identifier})
+    rec = dbc.read_one(PEOPLE_COLLECT, identifier_filter(identifier))
+    if rec:
+        cache_put(rec)
+    return rec
 
 
 def exists(identifier: str) -> bool:
-    return read_one(identifier) is not None
+    return dbc.exists(PEOPLE_COLLECT, identifier_filter(identifier))
+
+
+def count() -> int:
+    """
+    Approximate number of people, from collection metadata.
+    """
+    return dbc.count(PEOPLE_COLLECT)
+
+
+def is_empty() -> bool:
+    return dbc.is_empty(PEOPLE_COLLECT)
+
+
+def person_errors(name: str, affiliation: str, email_ok: bool, email: str,
+                  roles: list) -> list:
+    """
+    What's wrong with a person's fields, given whether the email is
+    valid (so batches can check each distinct email once).
+    """
+    errors = []
+    if not email_ok:
+        errors.append(f'Invalid email: {email}')
+    if val.is_blank(name) or val.is_blank(affiliation):
+        errors.append("Name and affiliation can't be blank.")
+    errors += [f'Invalid role: {r}' for r in roles if not rls.is_valid(r)]
+    return errors
 
 
 def is_valid_person(name: str, affiliation: str, email: str,
                     role: str = None, roles: list = None,
                     bio: str = None) -> bool:
-    if not is_valid_email(email):
-        raise ValueError(f'Invalid email: {email}')
-    if not name.strip() or not affiliation.strip():
-        raise ValueError("Name and affiliation can't be blank.")
-    for r in ([role] if role else roles or []):
-        if not rls.is_valid(r):
-            raise ValueError(f'Invalid role: {r}')
+    errors = person_errors(name, affiliation, is_valid_email(email), email,
+                           [role] if role else roles or [])
+    if errors:
+        raise ValueError(errors[0])
     return True
 
 
+def validate_people(records: list) -> dict:
+    """
+    Check a batch of person records, e.g. before a bulk import.
+    Return {row index: [errors]} for the rows with problems, including
+    emails repeated within the batch; empty if all are fine.
+    Doesn't check the DB for people who already exist.
+    """
+    ok_emails = val.valid_emails(rec.get(EMAIL) for rec in records)
+    role_codes = rls.ROLES.keys()
+    errors = {}
+    keys = []
+    for i, rec in enumerate(records):
+        email = rec.get(EMAIL)
+        roles = rec.get(ROLES, [])
+        # Most rows are fine, so check them inline and only build
+        # messages for the rest.
+        if not (email in ok_emails
+                and not val.is_blank(rec.get(NAME))
+                and not val.is_blank(rec.get(AFFILIATION))
+                and role_codes >= set(roles)):
+            errors[i] = person_errors(rec.get(NAME), rec.get(AFFILIATION),
+                                      email in ok_emails, email, roles)
+        keys.append(email if email in ok_emails else None)
+    normal = {email: val.normalize_email(email) for email in ok_emails}
+    val.mark_duplicates(errors, [normal.get(key) for key in keys],
+                        'Duplicate email in batch.')
+    return errors
+
+
 def create(name: str, affiliation: str,
            email: str, role: str, bio: str = "") -> str:
     """
@@ -87,9 +306,11 @@ def create(name: str, affiliation: str,
             AFFILIATION: affiliation,
             EMAIL:       email,
             ROLES:       [role] if role else [],
+            ROLE_MASK:   rls.mask_of([role] if role else []),
             BIO:         bio or ""
         }
         dbc.create(PEOPLE_COLLECT, person)
+        invalidate(email)
         return new_id
 
 
@@ -107,6 +328,7 @@ def update(identifier: str, name: str,
         if bio is not None:
             fields_to_set[BIO] = bio
         dbc.update(PEOPLE_COLLECT, {ID: rec[ID]}, fields_to_set)
+        invalidate(rec[ID])
         return rec[ID]
 
 
@@ -118,6 +340,7 @@ def delete(identifier: str) -> str:
     if not rec:
         return None
     count = dbc.delete(PEOPLE_COLLECT, {ID: rec[ID]})
+    invalidate(rec[ID])
     return rec[ID] if count == 1 else None
 
 
@@ -133,7 +356,12 @@ def add_role(identifier: str, role: str) -> str:
     if role in rec[ROLES]:
         raise ValueError("Duplicate role.")
     updated = rec[ROLES] + [role]
-    dbc.update(PEOPLE_COLLECT, {ID: rec[ID]}, {ROLES: updated})
+    dbc.update(PEOPLE_COLLECT, {ID: rec[ID]}, {
+        ROLES: updated,
+        ROLE_MASK: rls.mask_of(updated),
+        TOKEN_VERSION: rec.get(TOKEN_VERSION, 0) + 1,
+    })
+    invalidate(rec[ID])
     return rec[ID]
 
 
@@ -147,7 +375,12 @@ def delete_role(identifier: str, role: str) -> str:
     if role not in rec[ROLES]:
         raise ValueError("Role not found.")
     updated = [r for r in rec[ROLES] if r != role]
-    dbc.update(PEOPLE_COLLECT, {ID: rec[ID]}, {ROLES: updated})
+    dbc.update(PEOPLE_COLLECT, {ID: rec[ID]}, {
+        ROLES: updated,
+        ROLE_MASK: rls.mask_of(updated),
+        TOKEN_VERSION: rec.get(TOKEN_VERSION, 0) + 1,
+    })
+    invalidate(rec[ID])
     return rec[ID]
 
 
@@ -173,27 +406,66 @@ def create_mh_rec(person: dict) -> dict:
     return {field: person.get(field, '') for field in MH_FIELDS}
 
 
+def role_mask(person: dict) -> int:
+    """
+    The person's roles as a bitmask (see roles.ROLE_BITS):
+    the stored ROLE_MASK, or computed for records that predate it.
+    """
+    mask = person.get(ROLE_MASK)
+    if mask is None:
+        mask = rls.mask_of(person.get(ROLES, []))
+    return mask
+
+
 def has_role(person: dict, role: str) -> bool:
     """
     Check if the user has the specified role.
     """
-    return role in person.get(ROLES, [])
+    mask = person.get(ROLE_MASK)
+    if mask is None:
+        return role in person.get(ROLES, [])
+    return rls.has_any(mask, rls.ROLE_BITS.get(role, 0))
 
 
-def get_masthead() -> dict:
-    masthead = {}
+def build_masthead(people) -> dict:
+    """
+    Group masthead records by masthead role, in one pass over people.
+    """
     mh_roles = rls.get_masthead_roles()
-    for mh_role, text in mh_roles.items():
-        people_w_role = []
-        people = read()
-        for _id, person in people.items():
-            if has_role(person, mh_role):
-                rec = create_mh_rec(person)
-                people_w_role.append(rec)
-        masthead[text] = people_w_role
+    masthead = {text: [] for text in mh_roles.values()}
+    for person in people:
+        mask = role_mask(person)
+        if not rls.has_any(mask, rls.MH_MASK):
+            continue
+        rec = create_mh_rec(person)
+        for mh_role, text in mh_roles.items():
+            if mask & rls.ROLE_BITS[mh_role]:
+                masthead[text].append(rec)
     return masthead
 
 
+def get_masthead() -> dict:
+    return build_masthead(read_by_roles(rls.MH_ROLES).values())
+
+
+def backfill_role_masks() -> int:
+    """
+    Migration: give every person a ROLE_MASK matching their ROLES.
+    Safe to rerun. Returns the number of records updated.
+    """
+    updates = []
+    for rec in dbc.find(PEOPLE_COLLECT,
+                        projection=[ID, EMAIL, ROLES, ROLE_MASK]):
+        mask = rls.mask_of(rec.get(ROLES, []))
+        if rec.get(ROLE_MASK) != mask:
+            filt = {ID: rec[ID]} if rec.get(ID) else {EMAIL: rec[EMAIL]}
+            updates.append(UpdateOne(filt, {'$set': {ROLE_MASK: mask}}))
+    if updates:
+        dbc.bulk_write(PEOPLE_COLLECT, updates)
+    clear_cache()
+    return len(updates)
+
+
 def main():
     print(get_masthead())
 
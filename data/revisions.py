@@ -0,0 +1,30 @@
+"""
+Line deltas between versions of a text, for revision histories.
+
+A delta turns an old text into a new one. It is a list of ops, each
+either [start, end], meaning copy old lines start:end, or a string,
+meaning insert these characters. Unchanged runs of lines cost two ints,
+so an edit stores little more than what changed.
+"""
+import difflib
+
+
+def make_delta(old: str, new: str) -> list:
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines,
+                                      autojunk=False)
+    delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j1 < j2:  # 'replace' or 'insert'; 'delete' adds nothing
+            delta.append(''.join(new_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(old: str, delta: list) -> str:
+    old_lines = old.splitlines(keepends=True)
+    return ''.join(''.join(old_lines[op[0]:op[1]])
+                   if isinstance(op, list) else op
+                   for op in delta)
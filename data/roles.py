@@ -2,7 +2,7 @@
 """
 This module manages person roles for a journal.
 """
-from copy import deepcopy
+from types import MappingProxyType
 
 ED_CODE = 'ED'
 ME_CODE = 'ME'
@@ -15,7 +15,9 @@ REFREE_CODE = 'RE'
 
 TEST_CODE = AUTHOR_CODE
 
-ROLES = {
+# The tables below are read-only and built once, at import;
+# callers get them as is, without copying.
+ROLES = MappingProxyType({
     ED_CODE: 'Editor',
     ME_CODE: 'Managing Editor',
     CE_CODE: 'Consulting Editor',
@@ -24,36 +26,63 @@ ROLES = {
     MANAGING_CODE: 'Managing',
     COPY_CODE: "Copy",
     TYPESETTERS_CODE: "Typesetters"
-}
+})
 
-MH_ROLES = [ED_CODE, ME_CODE, CE_CODE]
+MH_ROLES = frozenset([ED_CODE, ME_CODE, CE_CODE])
+
+# ROLES restricted to the masthead roles, in ROLES order.
+MH_ROLE_TABLE = MappingProxyType({code: text for code, text in ROLES.items()
+                                  if code in MH_ROLES})
+
+ROLE_CODES = tuple(ROLES)
+
+# One bit per role, so a set of roles is an int and role checks are
+# bit operations: see mask_of() and has_any().
+_role_bits = {code: 1 << i for i, code in enumerate(ROLE_CODES)}
+ROLE_BITS = MappingProxyType(_role_bits)
+
+
+def mask_of(codes) -> int:
+    """
+    The bitmask of some role codes. Unknown codes are ignored.
+    """
+    mask = 0
+    for code in codes:
+        mask |= _role_bits.get(code, 0)
+    return mask
+
+
+def has_any(mask: int, required: int) -> bool:
+    """
+    True if the roles in mask include any of those in required.
+    """
+    return bool(mask & required)
+
+
+MH_MASK = mask_of(MH_ROLES)
 
 
 def read() -> dict:
-    return deepcopy(ROLES)
+    """
+    The roles as a plain dict, e.g. for JSON encoding.
+    """
+    return dict(ROLES)
 
 
-def get_roles() -> dict:
-    return read()
+def get_roles() -> MappingProxyType:
+    return ROLES
 
 
 def is_valid(code: str) -> bool:
     return code in ROLES
 
 
-def get_masthead_roles() -> dict:
-    mh_roles = get_roles()
-    del_mh_roles = []
-    for role in mh_roles:
-        if role not in MH_ROLES:
-            del_mh_roles.append(role)
-    for del_role in del_mh_roles:
-        del mh_roles[del_role]
-    return mh_roles
+def get_masthead_roles() -> MappingProxyType:
+    return MH_ROLE_TABLE
 
 
 def get_role_codes() -> list:
-    return list(ROLES.keys())
+    return list(ROLE_CODES)
 
 
 def main():
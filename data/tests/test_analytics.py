@@ -0,0 +1,52 @@
+import pytest
+
+import data.analytics as anl
+import data.db_connect as dbc
+import data.manuscript_events as mev
+
+
+@pytest.fixture(scope='function')
+def clean_turnaround():
+    dbc.delete_many(anl.TURNAROUND_COLLECT, {})
+    yield
+    dbc.delete_many(anl.TURNAROUND_COLLECT, {})
+
+
+def by_pair(rows: list) -> dict:
+    return {(row[anl.FROM_STATE], row[anl.TO_STATE]): row for row in rows}
+
+
+def test_bucket_value_in_bucket():
+    for seconds in (1, 7, 3600, 86400 * 30):
+        assert anl.bucket_of(anl.bucket_value(anl.bucket_of(seconds))) \
+            == anl.bucket_of(seconds)
+    assert anl.bucket_of(0.2) == 0
+
+
+def test_record(clean_turnaround):
+    for seconds in (10, 20, 30, 1000):
+        anl.record('SUB', 'REV', seconds)
+    anl.record('SUB', 'REJ', 5)
+    rows = by_pair(anl.turnaround())
+    pair = rows[('SUB', 'REV')]
+    assert pair[anl.COUNT] == 4
+    assert pair[anl.MEAN] == 265
+    assert pair[anl.MIN] == 10
+    assert pair[anl.MAX] == 1000
+    assert 18 <= pair['p50'] <= 22
+    assert 900 <= pair['p99'] <= 1000
+    assert rows[('SUB', anl.ANY_STATE)][anl.COUNT] == 5
+
+
+def test_rebuild(clean_turnaround):
+    manu_id = 'analytics-test-manuscript'
+    mev.record(manu_id, None, 'SUB', mev.CREATE, at=100.0)
+    mev.record(manu_id, 'SUB', 'REV', 'ARF', at=160.0)
+    mev.record(manu_id, 'REV', 'CED', 'ACC', at=400.0)
+    try:
+        assert anl.rebuild() >= 2
+        rows = by_pair(anl.turnaround())
+        assert rows[('SUB', 'REV')][anl.MAX] >= 60
+        assert rows[('REV', 'CED')][anl.MIN] <= 240
+    finally:
+        dbc.delete_many(mev.EVENTS_COLLECT, {mev.MANU_ID: manu_id})
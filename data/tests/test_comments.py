@@ -1,4 +1,8 @@
+import json
 import pytest
+from unittest.mock import patch
+
+import data.db_connect as dbc
 import data.comment as cmt
 import data.manuscript as msc
 import data.people as ppl
@@ -106,6 +110,15 @@ def test_read_one_not_found():
     comment = cmt.read_one("non_existent_id")
     assert comment is None
 
+def test_read_one_json(temp_comment):
+    """Test reading a comment straight to JSON."""
+    comment = json.loads(cmt.read_one_json(temp_comment))
+    assert comment == cmt.read_one(temp_comment)
+
+def test_read_one_json_not_found():
+    """Test reading a non-existent comment straight to JSON."""
+    assert cmt.read_one_json("non_existent_id") is None
+
 def test_read_by_manuscript(temp_comment, temp_manuscript):
     """Test reading comments by manuscript ID."""
     comments = cmt.read_by_manuscript(temp_manuscript)
@@ -175,4 +188,147 @@ def test_is_valid_comment_invalid_manuscript(temp_editor):
 def test_is_valid_comment_invalid_editor(temp_manuscript):
     """Test validation with invalid editor ID."""
     with pytest.raises(ValueError):
-        cmt.is_valid_comment(temp_manuscript, "invalid_editor_id", TEST_COMMENT_TEXT) 
\ No newline at end of file
+        cmt.is_valid_comment(temp_manuscript, "invalid_editor_id", TEST_COMMENT_TEXT) 
+
+
+def count_reads():
+    """
+    Patch the dbc read functions comment validation may use,
+    and return the patches so their calls can be counted.
+    """
+    return [patch.object(dbc, name, wraps=getattr(dbc, name))
+            for name in ('read_one', 'exists', 'aggregate', 'find')]
+
+
+def reads_during(fn) -> int:
+    patches = count_reads()
+    mocks = [p.start() for p in patches]
+    try:
+        fn()
+    finally:
+        for p in patches:
+            p.stop()
+    return sum(mock.call_count for mock in mocks)
+
+
+def test_is_valid_comment_one_read_cold(temp_manuscript, temp_editor):
+    ppl.clear_cache()
+    msc.known_manuscripts.clear()
+    assert reads_during(lambda: cmt.is_valid_comment(
+        temp_manuscript, temp_editor, TEST_COMMENT_TEXT)) == 1
+    # The manuscript is now known to exist.
+    assert reads_during(lambda: cmt.is_valid_comment(
+        temp_manuscript, temp_editor, TEST_COMMENT_TEXT)) <= 1
+
+
+def test_is_valid_comment_no_reads_warm(temp_manuscript, temp_editor):
+    editor = ppl.read_one(temp_editor)
+    msc.exists_cached(temp_manuscript)
+    assert reads_during(lambda: cmt.is_valid_comment(
+        temp_manuscript, temp_editor, TEST_COMMENT_TEXT, editor)) == 0
+
+
+def test_is_valid_comment_ignores_other_editor(temp_manuscript,
+                                               temp_editor):
+    someone_else = {ppl.ID: 'someone-else', ppl.ROLES: [ED_CODE]}
+    with pytest.raises(ValueError):
+        cmt.is_valid_comment(temp_manuscript, 'invalid_editor_id',
+                             TEST_COMMENT_TEXT, someone_else)
+
+
+def test_deleted_manuscript_forgotten(temp_manuscript, temp_editor):
+    msc.exists_cached(temp_manuscript)
+    msc.delete(temp_manuscript)
+    with pytest.raises(ValueError):
+        cmt.is_valid_comment(temp_manuscript, temp_editor,
+                             TEST_COMMENT_TEXT)
+
+
+@pytest.fixture(scope='function')
+def temp_thread(temp_comment, temp_editor):
+    """
+    A thread of:
+    root
+      a
+        a1
+      b
+    """
+    a = cmt.reply(temp_comment, temp_editor, 'a')
+    a1 = cmt.reply(a, temp_editor, 'a1')
+    b = cmt.reply(temp_comment, temp_editor, 'b')
+    yield [temp_comment, a, a1, b]
+    for comment_id in (a, a1, b):
+        cmt.delete(comment_id)
+
+
+def test_reply(temp_thread, temp_manuscript):
+    root, a, a1, b = temp_thread
+    reply = cmt.read_one(a1)
+    assert reply[cmt.MANUSCRIPT_ID] == temp_manuscript
+    assert reply[cmt.PARENT_ID] == a
+    assert reply[cmt.THREAD_ID] == root
+    assert reply[cmt.DEPTH] == 2
+    assert reply[cmt.PATH] == cmt.PATH_SEP.join([root, a, a1])
+
+
+def test_reply_not_found(temp_editor):
+    with pytest.raises(ValueError):
+        cmt.reply('non_existent_id', temp_editor, TEST_COMMENT_TEXT)
+
+
+def test_reply_empty_text(temp_comment, temp_editor):
+    with pytest.raises(ValueError):
+        cmt.reply(temp_comment, temp_editor, '')
+
+
+def test_reply_too_deep(temp_comment, temp_editor):
+    with patch.object(cmt, 'MAX_DEPTH', 0):
+        with pytest.raises(ValueError):
+            cmt.reply(temp_comment, temp_editor, TEST_COMMENT_TEXT)
+
+
+def test_reply_to_unthreaded_comment(temp_comment, temp_editor):
+    # As stored before comments were threaded.
+    dbc.update_doc(cmt.COMMENTS_COLLECTION,
+                   {cmt.COMMENT_ID: cmt.to_object_id(temp_comment)},
+                   {'$unset': {cmt.PARENT_ID: '', cmt.THREAD_ID: '',
+                               cmt.PATH: '', cmt.DEPTH: ''}})
+    reply_id = cmt.reply(temp_comment, temp_editor, TEST_COMMENT_TEXT)
+    comments = cmt.read_thread(temp_comment)[cmt.COMMENTS]
+    assert [c[cmt.COMMENT_ID] for c in comments] == [temp_comment, reply_id]
+    cmt.delete(reply_id)
+
+
+def test_read_thread_in_order(temp_thread):
+    page = cmt.read_thread(temp_thread[0])
+    comments = page[cmt.COMMENTS]
+    assert [c[cmt.COMMENT_ID] for c in comments] == temp_thread
+    assert [c[cmt.DEPTH] for c in comments] == [0, 1, 2, 1]
+    assert page[cmt.NEXT] is None
+
+
+def test_read_thread_one_query(temp_thread):
+    with patch.object(dbc, 'find', wraps=dbc.find) as mock_find:
+        cmt.read_thread(temp_thread[0])
+    assert mock_find.call_count == 1
+
+
+def test_read_thread_pages(temp_thread):
+    seen = []
+    cursor = None
+    while True:
+        page = cmt.read_thread(temp_thread[0], limit=3, cursor=cursor)
+        seen += [c[cmt.COMMENT_ID] for c in page[cmt.COMMENTS]]
+        cursor = page[cmt.NEXT]
+        if not cursor:
+            break
+    assert seen == temp_thread
+
+
+def test_read_thread_bad_cursor(temp_thread):
+    with pytest.raises(ValueError):
+        cmt.read_thread(temp_thread[0], cursor='not a path')
+
+
+def test_read_thread_not_found():
+    assert cmt.read_thread('non_existent_id')[cmt.COMMENTS] == []
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+
+import bson
+from bson import Binary, Decimal128, ObjectId
+from bson.raw_bson import RawBSONDocument
+
+import data.db_connect as dbc
+
+TEST_COLLECT = 'test_db_connect'
+
+dbc.connect_db()
+
+
+def to_raw(doc: dict) -> RawBSONDocument:
+    return RawBSONDocument(bson.encode(doc))
+
+
+def test_raw_to_json():
+    oid = ObjectId()
+    when = datetime(2024, 1, 2, 3, 4, 5)
+    doc = json.loads(dbc.raw_to_json(to_raw({
+        dbc.MONGO_ID: oid, 'when': when, 'nested': {'ids': [oid]}})))
+    assert doc == {dbc.MONGO_ID: str(oid), 'when': when.isoformat(),
+                   'nested': {'ids': [str(oid)]}}
+
+
+def test_raw_to_json_binary():
+    doc = json.loads(dbc.raw_to_json(to_raw({
+        'body': Binary(b'\x00\x01zip'), 'price': Decimal128('1.10')})))
+    assert bson.json_util.loads(json.dumps(doc['body'])) == b'\x00\x01zip'
+    assert doc['price'] == {'$numberDecimal': '1.10'}
+
+
+def test_read_one_json_binary():
+    oid = dbc.create(TEST_COLLECT, {'body': Binary(b'zip')}).inserted_id
+    try:
+        doc = json.loads(dbc.read_one_json(TEST_COLLECT,
+                                           {dbc.MONGO_ID: oid}))
+        assert doc[dbc.MONGO_ID] == str(oid)
+        assert 'body' in doc
+    finally:
+        dbc.delete(TEST_COLLECT, {dbc.MONGO_ID: oid})
@@ -0,0 +1,56 @@
+import pytest
+
+import data.db_connect as dbc
+import data.manuscript_events as mev
+
+TEST_MANU_ID = 'events-test-manuscript'
+T0 = 1_000_000.0
+
+
+@pytest.fixture(scope='function')
+def temp_events():
+    mev.record(TEST_MANU_ID, None, 'SUB', mev.CREATE, at=T0)
+    mev.record(TEST_MANU_ID, 'SUB', 'REV', 'ARF', 'editor', at=T0 + 10)
+    mev.record(TEST_MANU_ID, 'REV', 'REV', 'SBR', 'referee', at=T0 + 10)
+    mev.record(TEST_MANU_ID, 'REV', 'CED', 'ACC', 'editor', at=T0 + 40)
+    yield TEST_MANU_ID
+    dbc.delete_many(mev.EVENTS_COLLECT, {mev.MANU_ID: TEST_MANU_ID})
+
+
+def test_for_manuscript(temp_events):
+    page = mev.for_manuscript(temp_events)
+    assert [event[mev.ACTION] for event in page[mev.EVENTS]] == \
+        [mev.CREATE, 'ARF', 'SBR', 'ACC']
+    assert page[mev.NEXT] is None
+
+
+def test_pages_continue_through_ties(temp_events):
+    seen = []
+    cursor = None
+    while True:
+        page = mev.for_manuscript(temp_events, limit=1, cursor=cursor)
+        seen += [event[mev.ACTION] for event in page[mev.EVENTS]]
+        cursor = page[mev.NEXT]
+        if not cursor:
+            break
+    assert seen == [mev.CREATE, 'ARF', 'SBR', 'ACC']
+
+
+def test_bad_cursor():
+    with pytest.raises(ValueError):
+        mev.for_manuscript(TEST_MANU_ID, cursor='not a cursor')
+
+
+def test_in_range(temp_events):
+    page = mev.in_range(T0 + 5, T0 + 40)
+    assert [event[mev.ACTION] for event in page[mev.EVENTS]] == \
+        ['ARF', 'SBR']
+
+
+def test_time_in_states(temp_events):
+    totals = mev.time_in_states(temp_events, now=T0 + 100)
+    assert totals == {'SUB': 10, 'REV': 30, 'CED': 60}
+
+
+def test_time_in_states_no_events():
+    assert mev.time_in_states('no-such-manuscript') == {}
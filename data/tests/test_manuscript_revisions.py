@@ -0,0 +1,79 @@
+import pytest
+
+import data.db_connect as dbc
+import data.manuscript as ms
+import data.manuscript_revisions as mrev
+
+TEST_MANU_ID = 'rev-test-manuscript'
+PARA_1 = 'First paragraph.\n\n'
+PARA_2 = 'Second paragraph,\nover two lines.\n\n'
+PARA_3 = 'Third paragraph.'
+OLD_TEXT = PARA_1 + PARA_2 + PARA_3
+NEW_TEXT = PARA_1 + 'A rewritten second paragraph.\n\n' + PARA_3
+
+
+@pytest.fixture(scope='function')
+def temp_revisions():
+    mrev.save(TEST_MANU_ID, 'Title', 'Abstract', OLD_TEXT)
+    mrev.save(TEST_MANU_ID, 'Title', 'New abstract', NEW_TEXT)
+    yield TEST_MANU_ID
+    mrev.delete(TEST_MANU_ID)
+
+
+def test_split_paragraphs():
+    paras = mrev.split_paragraphs(OLD_TEXT)
+    assert paras == [PARA_1, PARA_2, PARA_3]
+    assert ''.join(mrev.split_paragraphs('a\n \n\n  b\n')) == 'a\n \n\n  b\n'
+    assert mrev.split_paragraphs('') == []
+
+
+def test_save_numbers_revisions(temp_revisions):
+    assert mrev.latest(temp_revisions)[mrev.REVISION] == 2
+    numbers = [rec[mrev.REVISION]
+               for rec in mrev.list_revisions(temp_revisions)]
+    assert numbers == [2, 1]
+
+
+def test_read(temp_revisions):
+    old = mrev.read(temp_revisions, 1)
+    assert old[mrev.TEXT] == OLD_TEXT
+    assert old[mrev.ABSTRACT] == 'Abstract'
+    assert mrev.read(temp_revisions, 2)[mrev.TEXT] == NEW_TEXT
+    assert mrev.read(temp_revisions, 3) is None
+
+
+def test_paragraphs_stored_once(temp_revisions):
+    digests = {mrev.chunk_hash(para) for para in (PARA_1, PARA_3)}
+    docs = dbc.find(mrev.CHUNKS_COLLECT,
+                    {dbc.MONGO_ID: {'$in': list(digests)}})
+    assert len(docs) == 2
+
+
+def test_diff(temp_revisions):
+    changes = mrev.diff(temp_revisions, 1, 2)
+    assert changes[mrev.TEXT] == [
+        {mrev.OP: mrev.EQUAL, mrev.COUNT: 1},
+        {mrev.OP: 'replace', mrev.FROM: [PARA_2],
+         mrev.TO: ['A rewritten second paragraph.\n\n']},
+        {mrev.OP: mrev.EQUAL, mrev.COUNT: 1},
+    ]
+    assert changes[mrev.ABSTRACT] == {mrev.FROM: 'Abstract',
+                                      mrev.TO: 'New abstract'}
+    assert mrev.TITLE not in changes
+
+
+def test_diff_missing(temp_revisions):
+    assert mrev.diff(temp_revisions, 1, 5) is None
+
+
+def test_manuscript_create_and_update():
+    manu_id = ms.create('Rev Title', 'Rev Author', 'revAuthor@gmail.com',
+                        OLD_TEXT, 'Rev Abstract', 'revEditor@gmail.com')
+    try:
+        ms.update(manu_id, 'Rev Title', 'Rev Author', 'revAuthor@gmail.com',
+                  NEW_TEXT, 'Rev Abstract', 'revEditor@gmail.com')
+        assert mrev.read(manu_id, 1)[mrev.TEXT] == OLD_TEXT
+        assert mrev.read(manu_id, 2)[mrev.TEXT] == NEW_TEXT
+    finally:
+        ms.delete(manu_id)
+    assert mrev.latest(manu_id) is None
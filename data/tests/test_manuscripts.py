@@ -1,6 +1,17 @@
+import json
 import pytest
 import random
+import zlib
+from unittest.mock import patch
+
+from bson import Binary
+import data.analytics as anl
+import data.db_connect as dbc
 import data.manuscript as ms
+import data.manuscript_events as mev
+import data.manuscript_revisions as mrev
+import data.roles as rls
+import data.validation as val
 
 
 TEST_TITLE = "Test Manuscript Title"
@@ -79,6 +90,30 @@ def test_handle_action_bad_action(temp_manuscript):
                            gen_random_not_valid_str())
 
 
+def test_state_table_compiled():
+    assert ms.get_valid_actions_by_state(ms.SUBMITTED) == \
+        frozenset(ms.STATE_TABLE[ms.SUBMITTED])
+    assert ms.get_next_states(ms.IN_REF_REV, ms.DELETE_REF) == \
+        (ms.IN_REF_REV, ms.SUBMITTED)
+    assert ms.PREDECESSORS[ms.COPY_EDIT] == {ms.IN_REF_REV, ms.EDITOR_REV}
+    assert ms.can_reach(ms.SUBMITTED, ms.PUBLISHED)
+    assert not ms.can_reach(ms.WITHDRAWN, ms.SUBMITTED)
+    assert ms.ACCEPT in ms.ROLE_ACTIONS[rls.REFREE_CODE]
+    with pytest.raises(TypeError):
+        ms.TRANSITIONS[ms.SUBMITTED] = {}
+
+
+def test_compile_bad_state_table():
+    bad = dict(ms.STATE_TABLE)
+    bad[ms.SUBMITTED] = {ms.REJECT: {ms.NEXT: ['NOT A STATE']}}
+    with pytest.raises(ValueError):
+        ms.compile_state_table(bad, ms.ROLE_STATES)
+    stranded = dict(ms.STATE_TABLE)
+    stranded[ms.SUBMITTED] = {}
+    with pytest.raises(ValueError):
+        ms.compile_state_table(stranded, ms.ROLE_STATES)
+
+
 def test_handle_action_valid_return(temp_manuscript):
     for state in ms.get_states():
         for action in ms.get_valid_actions_by_state(state):
@@ -139,6 +174,52 @@ def test_create_duplicate_manuscript(temp_manuscript):
                   "or text", "or abstract", GOOD_EMAIL)
 
 
+def test_create_duplicate_normalized(temp_manuscript):
+    with pytest.raises(ValueError):
+        ms.create(f'  {TEMP_TITLE.upper()} ', TEMP_AUTHOR,
+                  TEMP_AUTHOR_EMAIL.upper(), TEMP_TEXT, TEMP_ABSTRACT,
+                  TEMP_EDITOR_EMAIL)
+
+
+def test_update_to_duplicate(temp_manuscript):
+    other = ms.create(TEST_TITLE, TEST_AUTHOR, TEMP_AUTHOR_EMAIL,
+                      TEST_TEXT, TEST_ABSTRACT, TEST_EDITOR_EMAIL)
+    try:
+        with pytest.raises(ValueError):
+            ms.update(other, TEMP_TITLE, TEST_AUTHOR, TEMP_AUTHOR_EMAIL,
+                      'Lost text', TEST_ABSTRACT, TEST_EDITOR_EMAIL)
+        # The failed update left no revision behind.
+        assert mrev.latest(other)[mrev.REVISION] == 1
+        assert ms.read_one(other)[ms.TEXT] == TEST_TEXT
+        # Keeping its own title is fine.
+        assert ms.update(other, TEST_TITLE, TEST_AUTHOR, TEMP_AUTHOR_EMAIL,
+                         'New text', TEST_ABSTRACT, TEST_EDITOR_EMAIL) == other
+    finally:
+        ms.delete(other)
+
+
+def test_backfill_dedup_keys(temp_manuscript):
+    filt = {ms.MANU_ID: ms.to_object_id(temp_manuscript)}
+    dbc.update_doc(ms.MANUSCRIPTS_COLLECT, filt,
+                   {'$unset': {ms.TITLE_KEY: '', ms.AUTHOR_EMAIL_KEY: ''}})
+    assert ms.backfill_dedup_keys() == []
+    keyed = dbc.read_one(ms.MANUSCRIPTS_COLLECT, filt)
+    assert keyed[ms.TITLE_KEY] == val.normalize_title(TEMP_TITLE)
+
+
+def test_validate_manuscripts():
+    good = {ms.TITLE: TEST_TITLE, ms.AUTHOR: TEST_AUTHOR,
+            ms.AUTHOR_EMAIL: TEST_AUTHOR_EMAIL, ms.TEXT: TEST_TEXT,
+            ms.ABSTRACT: TEST_ABSTRACT, ms.EDITOR_EMAIL: TEST_EDITOR_EMAIL}
+    records = [good, {**good, ms.TITLE: f' {TEST_TITLE.lower()}'},
+               {**good, ms.TEXT: '', ms.EDITOR_EMAIL: BAD_EMAIL}]
+    errors = ms.validate_manuscripts(records)
+    assert 0 not in errors
+    assert errors[1] == ['Duplicate title and author in batch.']
+    assert errors[2] == [f'Editor email invalid: {BAD_EMAIL}',
+                         'Text cannot be blank']
+
+
 def test_exists(temp_manuscript):
     assert ms.exists(temp_manuscript)
 
@@ -159,20 +240,98 @@ def test_read(temp_manuscript):
         assert ms.AUTHOR_EMAIL in manuscript
         assert ms.STATE in manuscript
         assert ms.REFEREES in manuscript
-        assert ms.TEXT in manuscript
         assert ms.ABSTRACT in manuscript
         assert ms.HISTORY in manuscript
         assert ms.EDITOR_EMAIL in manuscript
+        assert not set(ms.INTERNAL_FIELDS) & set(manuscript)
 
 
 def test_read_one(temp_manuscript):
     assert ms.read_one(temp_manuscript) is not None
 
 
+def test_read_one_text(temp_manuscript):
+    assert ms.read_one(temp_manuscript)[ms.TEXT] == TEMP_TEXT
+    assert ms.TEXT not in ms.read_one(temp_manuscript, with_text=False)
+
+
+def test_text_stored_once(temp_manuscript):
+    filt = {ms.MANU_ID: ms.to_object_id(temp_manuscript)}
+    stored = dbc.read_one(ms.MANUSCRIPTS_COLLECT, filt)
+    assert ms.TEXT not in stored
+    assert stored[ms.TEXT_SIZE] == len(TEMP_TEXT)
+    assert dbc.read_one(ms.BODIES_COLLECT, filt) is None
+    assert mrev.latest_text(temp_manuscript) == TEMP_TEXT
+
+
+def test_update_concurrent_revision(temp_manuscript):
+    with patch.object(mrev, 'save', side_effect=ValueError('Concurrent')):
+        with pytest.raises(ValueError):
+            ms.update(temp_manuscript, TEST_TITLE, TEST_AUTHOR,
+                      TEST_AUTHOR_EMAIL, TEST_TEXT, TEST_ABSTRACT,
+                      TEST_EDITOR_EMAIL)
+    # The manuscript is as it was.
+    assert ms.read_one(temp_manuscript)[ms.TITLE] == TEMP_TITLE
+
+
+def test_inline_text_still_read(temp_manuscript):
+    dbc.update(ms.MANUSCRIPTS_COLLECT,
+               {ms.MANU_ID: ms.to_object_id(temp_manuscript)},
+               {ms.TEXT: 'Inline text'})
+    assert ms.read_one(temp_manuscript)[ms.TEXT] == 'Inline text'
+    manu = json.loads(ms.read_one_json(temp_manuscript))
+    assert manu[ms.TEXT] == 'Inline text'
+
+
+def test_move_texts(temp_manuscript):
+    mrev.delete(temp_manuscript)
+    dbc.update(ms.MANUSCRIPTS_COLLECT,
+               {ms.MANU_ID: ms.to_object_id(temp_manuscript)},
+               {ms.TEXT: 'Inline text'})
+    assert ms.move_texts() == 1
+    assert ms.move_texts() == 0
+    assert mrev.latest(temp_manuscript)[mrev.REVISION] == 1
+    assert ms.read_text(temp_manuscript) == 'Inline text'
+    assert ms.read_one(temp_manuscript)[ms.TEXT] == 'Inline text'
+
+
+def test_move_texts_from_bodies(temp_manuscript):
+    mrev.delete(temp_manuscript)
+    oid = ms.to_object_id(temp_manuscript)
+    dbc.create(ms.BODIES_COLLECT, {
+        ms.MANU_ID: oid,
+        ms.BODY: Binary(zlib.compress(b'Body text')),
+    })
+    assert ms.read_text(temp_manuscript) == 'Body text'
+    assert ms.move_texts() == 1
+    assert dbc.read_one(ms.BODIES_COLLECT, {ms.MANU_ID: oid}) is None
+    assert mrev.latest_text(temp_manuscript) == 'Body text'
+
+
+def test_delete_drops_text(temp_manuscript):
+    ms.delete(temp_manuscript)
+    assert ms.read_text(temp_manuscript) is None
+
+
 def test_read_one_not_there():
     assert ms.read_one("Not an existing _id!") is None
 
 
+def test_read_one_json(temp_manuscript):
+    # Tags it with a BULK_TOKEN, so that it has every internal field.
+    ms.bulk_update_state([temp_manuscript], ms.WITHDRAW)
+    manu = json.loads(ms.read_one_json(temp_manuscript))
+    full = ms.read_one(temp_manuscript)
+    assert set(ms.INTERNAL_FIELDS) <= set(full)
+    for field in ms.INTERNAL_FIELDS:
+        del full[field]
+    assert manu == full
+
+
+def test_read_one_json_not_there():
+    assert ms.read_one_json("Not an existing _id!") is None
+
+
 def test_delete(temp_manuscript):
     ms.delete(temp_manuscript)
     assert not ms.exists(temp_manuscript)
@@ -320,6 +479,140 @@ def test_update_state_history_tracking(temp_manuscript):
     assert len(updated_manuscript[ms.HISTORY]) == len(initial_history) + 1
 
 
+def test_update_state_records_event(temp_manuscript):
+    ms.update_state(temp_manuscript, ms.ASSIGN_REF, 'an editor',
+                    ref=TEST_REFEREE)
+    events = mev.for_manuscript(temp_manuscript)[mev.EVENTS]
+    assert events[0][mev.TO_STATE] == ms.SUBMITTED
+    assert events[-1][mev.FROM_STATE] == ms.SUBMITTED
+    assert events[-1][mev.TO_STATE] == ms.IN_REF_REV
+    assert events[-1][mev.ACTOR] == 'an editor'
+
+
+def test_update_state_changed_meanwhile(temp_manuscript):
+    real_handle_action = ms.handle_action
+    before = {(row[anl.FROM_STATE], row[anl.TO_STATE]): row[anl.COUNT]
+              for row in anl.turnaround()}
+
+    def race(*args, **kwargs):
+        # Someone else rejects it while we work out the new state.
+        new_state = real_handle_action(*args, **kwargs)
+        dbc.update(ms.MANUSCRIPTS_COLLECT,
+                   {ms.MANU_ID: ms.to_object_id(temp_manuscript)},
+                   {ms.STATE: ms.REJECTED})
+        return new_state
+
+    with patch('data.manuscript.handle_action', side_effect=race):
+        with pytest.raises(ValueError):
+            ms.update_state(temp_manuscript, ms.WITHDRAW)
+    assert ms.read_one(temp_manuscript)[ms.STATE] == ms.REJECTED
+    events = mev.for_manuscript(temp_manuscript)[mev.EVENTS]
+    assert [event[mev.TO_STATE] for event in events] == [ms.SUBMITTED]
+    after = {(row[anl.FROM_STATE], row[anl.TO_STATE]): row[anl.COUNT]
+             for row in anl.turnaround()}
+    assert after.get((ms.SUBMITTED, ms.WITHDRAWN)) \
+        == before.get((ms.SUBMITTED, ms.WITHDRAWN))
+
+
+def test_update_state_records_turnaround(temp_manuscript):
+    before = {(row[anl.FROM_STATE], row[anl.TO_STATE]): row[anl.COUNT]
+              for row in anl.turnaround()}
+    ms.update_state(temp_manuscript, ms.ASSIGN_REF, ref=TEST_REFEREE)
+    after = {(row[anl.FROM_STATE], row[anl.TO_STATE]): row[anl.COUNT]
+             for row in anl.turnaround()}
+    pair = (ms.SUBMITTED, ms.IN_REF_REV)
+    assert after[pair] == before.get(pair, 0) + 1
+    assert ms.read_one(temp_manuscript)[ms.STATE_SINCE] > 0
+
+
+def test_bulk_update_state(temp_manuscript):
+    other = ms.create('Bulk Title', TEMP_AUTHOR, TEMP_AUTHOR_EMAIL,
+                      TEMP_TEXT, TEMP_ABSTRACT, TEMP_EDITOR_EMAIL)
+    try:
+        ms.update_state(other, ms.REJECT)
+        missing = '0123456789abcdef01234567'
+        results = ms.bulk_update_state(
+            [temp_manuscript, other, missing, 'bad id'], ms.WITHDRAW, 'ed')
+        assert results[temp_manuscript] == {ms.OK: True,
+                                            ms.STATE: ms.WITHDRAWN}
+        assert results[other][ms.OK]
+        assert not results[missing][ms.OK]
+        assert not results['bad id'][ms.OK]
+        manuscript = ms.read_one(temp_manuscript)
+        assert manuscript[ms.STATE] == ms.WITHDRAWN
+        assert manuscript[ms.HISTORY][-1] == ms.WITHDRAWN
+        event = mev.for_manuscript(other)[mev.EVENTS][-1]
+        assert event[mev.FROM_STATE] == ms.REJECTED
+        assert event[mev.ACTOR] == 'ed'
+        # Now nothing can be withdrawn again.
+        results = ms.bulk_update_state([temp_manuscript], ms.WITHDRAW)
+        assert not results[temp_manuscript][ms.OK]
+    finally:
+        ms.delete(other)
+
+
+def test_bulk_update_state_non_canonical_id(temp_manuscript):
+    upper = temp_manuscript.upper()
+    results = ms.bulk_update_state([upper], ms.WITHDRAW)
+    assert results[upper] == {ms.OK: True, ms.STATE: ms.WITHDRAWN}
+    assert ms.read_one(temp_manuscript)[ms.STATE] == ms.WITHDRAWN
+    # Logged under the canonical id.
+    event = mev.for_manuscript(temp_manuscript)[mev.EVENTS][-1]
+    assert event[mev.TO_STATE] == ms.WITHDRAWN
+
+
+def test_bulk_update_state_same_manuscript_twice(temp_manuscript):
+    upper = temp_manuscript.upper()
+    results = ms.bulk_update_state([temp_manuscript, upper], ms.WITHDRAW)
+    assert results[temp_manuscript] == {ms.OK: True, ms.STATE: ms.WITHDRAWN}
+    assert results[upper] == results[temp_manuscript]
+    assert len(mev.for_manuscript(temp_manuscript)[mev.EVENTS]) == 2
+
+
+def test_bulk_update_state_ids_not_strings(temp_manuscript):
+    with pytest.raises(ValueError):
+        ms.bulk_update_state([temp_manuscript, ['a list']], ms.WITHDRAW)
+    with pytest.raises(ValueError):
+        ms.bulk_update_state([{'$ne': None}], ms.WITHDRAW)
+
+
+def test_bulk_update_state_unknown_state(temp_manuscript):
+    dbc.update(ms.MANUSCRIPTS_COLLECT,
+               {ms.MANU_ID: ms.to_object_id(temp_manuscript)},
+               {ms.STATE: 'NOT A STATE'})
+    results = ms.bulk_update_state([temp_manuscript], ms.WITHDRAW)
+    assert not results[temp_manuscript][ms.OK]
+
+
+def test_bulk_update_state_changed_meanwhile(temp_manuscript):
+    other = ms.create('Bulk Title', TEMP_AUTHOR, TEMP_AUTHOR_EMAIL,
+                      TEMP_TEXT, TEMP_ABSTRACT, TEMP_EDITOR_EMAIL)
+    real_bulk_write = dbc.bulk_write
+
+    def race(collection, updates, **kwargs):
+        # Someone else rejects other just before our write.
+        if collection == ms.MANUSCRIPTS_COLLECT:
+            ms.update_state(other, ms.REJECT)
+        return real_bulk_write(collection, updates, **kwargs)
+
+    try:
+        with patch('data.db_connect.bulk_write', side_effect=race):
+            results = ms.bulk_update_state([temp_manuscript, other],
+                                           ms.REJECT)
+        assert results[temp_manuscript][ms.OK]
+        assert not results[other][ms.OK]
+        assert ms.read_one(other)[ms.STATE] == ms.REJECTED
+    finally:
+        ms.delete(other)
+
+
+def test_bulk_update_state_needs_fixed_action(temp_manuscript):
+    with pytest.raises(ValueError):
+        ms.bulk_update_state([temp_manuscript], ms.ASSIGN_REF)
+    with pytest.raises(ValueError):
+        ms.bulk_update_state([temp_manuscript], 'NOT AN ACTION')
+
+
 def test_search_by_title_exact_match(temp_manuscript):
     """Test searching for a manuscript with exact title match."""
     manuscripts = ms.search_by_title(TEMP_TITLE)
@@ -327,6 +620,7 @@ def test_search_by_title_exact_match(temp_manuscript):
     assert len(manuscripts) == 1
     assert TEMP_TITLE in manuscripts
     assert manuscripts[TEMP_TITLE][ms.TITLE] == TEMP_TITLE
+    assert ms.TITLE_KEY not in manuscripts[TEMP_TITLE]
 
 
 def test_search_by_title_case_insensitive(temp_manuscript):
@@ -336,6 +630,7 @@ def test_search_by_title_case_insensitive(temp_manuscript):
     assert len(manuscripts) == 1
     assert TEMP_TITLE in manuscripts
     assert manuscripts[TEMP_TITLE][ms.TITLE] == TEMP_TITLE
+    assert ms.TITLE_KEY not in manuscripts[TEMP_TITLE]
 
 
 def test_search_by_title_partial_match(temp_manuscript):
@@ -345,6 +640,7 @@ def test_search_by_title_partial_match(temp_manuscript):
     assert len(manuscripts) == 1
     assert TEMP_TITLE in manuscripts
     assert manuscripts[TEMP_TITLE][ms.TITLE] == TEMP_TITLE
+    assert ms.TITLE_KEY not in manuscripts[TEMP_TITLE]
 
 
 def test_search_by_title_no_match():
@@ -1,6 +1,10 @@
+from unittest.mock import patch
+
 import pytest
 
+import data.db_connect as dbc
 import data.people as ppl
+import data.roles as rls
 from data.roles import TEST_CODE
 
 
@@ -132,6 +136,14 @@ def test_read_one_not_there():
     assert ppl.read_one('Not an existing email!') is None
 
 
+@patch('data.people.ensure_indexes', autospec=True)
+def test_read_one_skips_indexes(mock_ensure, temp_person):
+    ppl.clear_cache()
+    assert ppl.read_one(temp_person) is not None
+    assert ppl.exists(temp_person)
+    mock_ensure.assert_not_called()
+
+
 def test_get_mh_fields():
     flds = ppl.get_mh_fields()
     assert isinstance(flds, list)
@@ -151,6 +163,57 @@ def test_get_masthead():
     assert isinstance(mh, dict)
 
 
+def test_create_sets_role_mask(temp_person):
+    rec = ppl.read_one(temp_person)
+    assert rec[ppl.ROLE_MASK] == rls.mask_of(rec[ppl.ROLES])
+
+
+def test_role_change_updates_mask(temp_person):
+    ppl.add_role(temp_person, rls.ED_CODE)
+    rec = ppl.read_one(temp_person)
+    assert rec[ppl.ROLE_MASK] & rls.ROLE_BITS[rls.ED_CODE]
+    ppl.delete_role(temp_person, rls.ED_CODE)
+    rec = ppl.read_one(temp_person)
+    assert not rec[ppl.ROLE_MASK] & rls.ROLE_BITS[rls.ED_CODE]
+    assert rec[ppl.ROLE_MASK] == rls.mask_of(rec[ppl.ROLES])
+
+
+def test_read_by_roles(temp_person):
+    rec = ppl.read_one(temp_person)
+    assert rec[ppl.ID] in ppl.read_by_roles([TEST_CODE, rls.ED_CODE])
+    assert rec[ppl.ID] not in ppl.read_by_roles([rls.TYPESETTERS_CODE])
+
+
+def test_has_role_with_mask():
+    person = {ppl.ROLES: [rls.CE_CODE],
+              ppl.ROLE_MASK: rls.mask_of([rls.CE_CODE])}
+    assert ppl.has_role(person, rls.CE_CODE)
+    assert not ppl.has_role(person, rls.ED_CODE)
+    assert not ppl.has_role(person, 'Not a good role!')
+
+
+def test_backfill_role_masks(temp_person):
+    dbc.update(ppl.PEOPLE_COLLECT, {ppl.ID: temp_person},
+               {ppl.ROLE_MASK: None})
+    assert ppl.backfill_role_masks() >= 1
+    rec = ppl.read_one(temp_person)
+    assert rec[ppl.ROLE_MASK] == rls.mask_of(rec[ppl.ROLES])
+    assert ppl.backfill_role_masks() == 0
+
+
+def test_build_masthead():
+    people = [
+        {ppl.NAME: 'Ed', ppl.ROLES: [rls.ED_CODE, rls.ME_CODE]},
+        {ppl.NAME: 'Au', ppl.ROLES: [rls.AUTHOR_CODE]},
+        {ppl.NAME: 'Ce', ppl.ROLES: [rls.CE_CODE]},
+    ]
+    mh = ppl.build_masthead(people)
+    assert list(mh) == list(rls.get_masthead_roles().values())
+    assert [rec[ppl.NAME] for rec in mh['Editor']] == ['Ed']
+    assert [rec[ppl.NAME] for rec in mh['Managing Editor']] == ['Ed']
+    assert [rec[ppl.NAME] for rec in mh['Consulting Editor']] == ['Ce']
+
+
 def test_has_role(temp_person):
     person_rec = ppl.read_one(temp_person)
     assert ppl.has_role(person_rec, TEST_CODE)
@@ -248,6 +311,14 @@ def test_add_role(temp_person):
     assert UPDATE_ROLE_CODE in new_roles
 
 
+def test_role_change_bumps_token_version(temp_person):
+    old_version = ppl.read_one(temp_person).get(ppl.TOKEN_VERSION, 0)
+    ppl.add_role(temp_person, UPDATE_ROLE_CODE)
+    assert ppl.read_one(temp_person)[ppl.TOKEN_VERSION] == old_version + 1
+    ppl.delete_role(temp_person, UPDATE_ROLE_CODE)
+    assert ppl.read_one(temp_person)[ppl.TOKEN_VERSION] == old_version + 2
+
+
 def test_add_duplicate_role(temp_person):
     roles = ppl.read_one(temp_person)[ppl.ROLES]
     assert TEST_CODE in roles
@@ -284,3 +355,80 @@ def test_delete_not_existing_role(temp_person):
 def test_delete_role_invalid_email():
     with pytest.raises(ValueError):
         ppl.delete_role("invalid email", UPDATE_ROLE_CODE)
+
+
+def test_read_one_cached(temp_person):
+    ppl.read_one(temp_person)
+    hits = ppl.cache_stats()['hits']
+    assert ppl.read_one(TEMP_EMAIL)[ppl.ID] == temp_person
+    assert ppl.cache_stats()['hits'] == hits + 1
+
+
+def test_cache_returns_copies(temp_person):
+    ppl.read_one(temp_person)[ppl.ROLES].append(UPDATE_ROLE_CODE)
+    assert UPDATE_ROLE_CODE not in ppl.read_one(temp_person)[ppl.ROLES]
+
+
+def test_cache_invalidated_on_update(temp_person):
+    ppl.read_one(TEMP_EMAIL)
+    ppl.update(temp_person, UPDATE_NAME, UPDATE_AFFILIATION)
+    assert ppl.read_one(TEMP_EMAIL)[ppl.NAME] == UPDATE_NAME
+
+
+def test_cache_expires():
+    cache = ppl.PeopleCache(ttl=0)
+    cache.put({ppl.ID: 'some id', ppl.EMAIL: TEMP_EMAIL})
+    assert cache.get('some id') is None
+
+
+def test_cache_bounded():
+    cache = ppl.PeopleCache(max_size=4)
+    for i in range(5):
+        cache.put({ppl.ID: f'id{i}', ppl.EMAIL: f'p{i}@nyu.edu'})
+    stats = cache.stats()
+    assert stats['size'] <= 4
+    assert stats['evictions'] > 0
+    assert cache.get('id0') is None
+    assert cache.get('p4@nyu.edu')[ppl.ID] == 'id4'
+
+
+def test_identifier_filter_email():
+    assert ppl.identifier_filter(TEMP_EMAIL) == {ppl.EMAIL: TEMP_EMAIL}
+
+
+def test_identifier_filter_uuid(temp_person):
+    assert ppl.identifier_filter(temp_person) == {ppl.ID: temp_person}
+
+
+def test_identifier_filter_none(temp_person):
+    assert ppl.identifier_filter(None) == ppl.NO_MATCH
+    assert ppl.read_one(None) is None
+    assert not ppl.exists(None)
+
+
+def test_identifier_filter_other():
+    filt = ppl.identifier_filter('legacy-id')
+    assert '$or' in filt
+
+
+def test_count(temp_person):
+    assert ppl.count() > 0
+
+
+def test_is_empty(temp_person):
+    assert not ppl.is_empty()
+
+
+def test_validate_people():
+    records = [
+        {ppl.NAME: 'Ann', ppl.AFFILIATION: 'NYU', ppl.EMAIL: 'ann@nyu.edu',
+         ppl.ROLES: [rls.ED_CODE]},
+        {ppl.NAME: ' ', ppl.AFFILIATION: 'NYU', ppl.EMAIL: 'bad',
+         ppl.ROLES: ['NOT A ROLE']},
+        {ppl.NAME: 'Ann 2', ppl.AFFILIATION: 'NYU',
+         ppl.EMAIL: 'ANN@nyu.edu'},
+    ]
+    errors = ppl.validate_people(records)
+    assert 0 not in errors
+    assert len(errors[1]) == 3
+    assert errors[2] == ['Duplicate email in batch.']
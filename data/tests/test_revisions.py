@@ -0,0 +1,25 @@
+import data.revisions as rev
+
+OLD = 'line one\nline two\nline three\n'
+NEW = 'line one\nline 2\nline three\nline four\n'
+
+
+def test_round_trip():
+    assert rev.apply_delta(OLD, rev.make_delta(OLD, NEW)) == NEW
+
+
+def test_unchanged_lines_copied():
+    delta = rev.make_delta(OLD, NEW)
+    assert [0, 1] in delta
+    assert 'line one\n' not in delta
+
+
+def test_no_trailing_newline():
+    old = 'a\nb'
+    new = 'a\nc'
+    assert rev.apply_delta(old, rev.make_delta(old, new)) == new
+
+
+def test_empty():
+    assert rev.apply_delta('', rev.make_delta('', NEW)) == NEW
+    assert rev.apply_delta(OLD, rev.make_delta(OLD, '')) == ''
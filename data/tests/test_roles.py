@@ -1,10 +1,20 @@
 
+from collections.abc import Mapping
+
+import pytest
+
 import data.roles as rls
 
 
+def test_read():
+    roles = rls.read()
+    assert isinstance(roles, dict)
+    assert roles == rls.ROLES
+
+
 def test_get_roles():
     roles = rls.get_roles()
-    assert isinstance(roles, dict)
+    assert isinstance(roles, Mapping)
     assert len(roles) > 0
     for code, role in roles.items():
         assert isinstance(code, str)
@@ -17,7 +27,34 @@ def test_is_valid():
 
 def test_get_masthead_roles():
     mh_roles = rls.get_masthead_roles()
-    assert isinstance(mh_roles, dict)
+    assert isinstance(mh_roles, Mapping)
+    assert set(mh_roles) == rls.MH_ROLES
+
+
+def test_roles_frozen():
+    with pytest.raises(TypeError):
+        rls.get_roles()[rls.TEST_CODE] = 'Changed'
+    with pytest.raises(TypeError):
+        rls.get_masthead_roles()[rls.ED_CODE] = 'Changed'
+
+
+def test_role_bits_distinct():
+    bits = list(rls.ROLE_BITS.values())
+    assert len(set(bits)) == len(rls.ROLES)
+    for bit in bits:
+        assert bit & (bit - 1) == 0
+
+
+def test_mask_of():
+    mask = rls.mask_of([rls.ED_CODE, rls.AUTHOR_CODE, 'not a role'])
+    assert mask == rls.ROLE_BITS[rls.ED_CODE] | rls.ROLE_BITS[rls.AUTHOR_CODE]
+    assert rls.mask_of([]) == 0
+
+
+def test_has_any():
+    mask = rls.mask_of([rls.ED_CODE])
+    assert rls.has_any(mask, rls.MH_MASK)
+    assert not rls.has_any(mask, rls.mask_of([rls.AUTHOR_CODE]))
 
 
 def test_get_role_codes():
@@ -1,4 +1,7 @@
+from unittest.mock import patch
+
 import pytest
+import data.db_connect as dbc
 import data.text as txt
 
 TEMP_PAGE = "TempPage"
@@ -110,3 +113,82 @@ def test_update_blank_title(temp_text):
 def test_update_blank_text(temp_text):
     with pytest.raises(ValueError):
         txt.update(temp_text, "Not Care", " ")
+
+
+def test_update_versions(temp_text):
+    assert txt.read_one(temp_text)[txt.VERSION] == 1
+    txt.update(temp_text, TEST_TITLE, TEST_TEXT)
+    assert txt.read_one(temp_text)[txt.VERSION] == 2
+
+
+def test_update_page_write_fails(temp_text):
+    with patch('data.db_connect.update', autospec=True,
+               side_effect=ConnectionError('Lost the DB')):
+        with pytest.raises(ConnectionError):
+            txt.update(temp_text, TEST_TITLE, TEST_TEXT)
+    assert [v[txt.VERSION] for v in txt.history(temp_text)] == [1]
+    txt.update(temp_text, TEST_TITLE, TEST_TEXT)
+    assert txt.read_one(temp_text)[txt.VERSION] == 2
+
+
+def test_update_page_moved_on(temp_text):
+    real_update = dbc.update
+
+    def race(collection, filters, update_dict, **kwargs):
+        # Someone else saves version 2 between our two writes.
+        real_update(collection, {txt.PAGE_NUMBER: temp_text},
+                    {txt.VERSION: 2})
+        return real_update(collection, filters, update_dict, **kwargs)
+
+    with patch('data.db_connect.update', side_effect=race):
+        with pytest.raises(ValueError):
+            txt.update(temp_text, TEST_TITLE, TEST_TEXT)
+    assert [v[txt.VERSION] for v in txt.history(temp_text)] == [1]
+
+
+def test_history(temp_text):
+    txt.update(temp_text, TEST_TITLE, TEST_TEXT)
+    versions = txt.history(temp_text)
+    assert [v[txt.VERSION] for v in versions] == [2, 1]
+    assert versions[0][txt.TITLE] == TEST_TITLE
+
+
+def test_read_version(temp_text):
+    texts = [TEMP_TEXT]
+    for i in range(txt.SNAPSHOT_EVERY + 2):
+        texts.append(f'{TEMP_TEXT}\nedit {i}\n' + 'same line\n' * i)
+        txt.update(temp_text, TEMP_TITLE, texts[-1])
+    for version, text in enumerate(texts, start=1):
+        page = txt.read_version(temp_text, version)
+        assert page[txt.TEXT] == text
+        assert page[txt.VERSION] == version
+
+
+def test_read_version_not_there(temp_text):
+    assert txt.read_version(temp_text, 99) is None
+
+
+def test_update_legacy_page():
+    dbc.create(txt.TEXT_COLLECT, {txt.PAGE_NUMBER: TEST_PAGE,
+                                  txt.TITLE: TEST_TITLE,
+                                  txt.TEXT: TEST_TEXT})
+    try:
+        txt.update(TEST_PAGE, TEMP_TITLE, TEMP_TEXT)
+        assert txt.read_version(TEST_PAGE, 1)[txt.TEXT] == TEST_TEXT
+        assert txt.read_version(TEST_PAGE, 2)[txt.TEXT] == TEMP_TEXT
+    finally:
+        txt.delete(TEST_PAGE)
+
+
+def test_delete_drops_history(temp_text):
+    txt.delete(temp_text)
+    assert txt.history(temp_text) == []
+
+
+def test_read_one_cached(temp_text):
+    txt.read_one(temp_text)
+    dbc.update(txt.TEXT_COLLECT, {txt.PAGE_NUMBER: temp_text},
+               {txt.TITLE: 'Changed behind our back'})
+    assert txt.read_one(temp_text)[txt.TITLE] == TEMP_TITLE
+    txt.clear_cache()
+    assert txt.read_one(temp_text)[txt.TITLE] == 'Changed behind our back'
@@ -0,0 +1,23 @@
+import data.validation as val
+
+
+def test_is_valid_email():
+    assert val.is_valid_email('a.b-c@nyu.edu')
+    assert not val.is_valid_email('a..b@nyu.edu')
+    assert not val.is_valid_email('ab@nyu.edu trailing')
+    assert not val.is_valid_email(None)
+
+
+def test_valid_emails():
+    emails = ['a@nyu.edu', 'bad', 'a@nyu.edu', 'b@nyu.edu']
+    assert val.valid_emails(emails) == {'a@nyu.edu', 'b@nyu.edu'}
+
+
+def test_normalize_title():
+    assert val.normalize_title('  A  Study\tOf ＡＩ ') == 'a study of ai'
+
+
+def test_mark_duplicates():
+    errors = {}
+    val.mark_duplicates(errors, ['x', None, 'y', 'x', None], 'dup')
+    assert errors == {3: ['dup']}
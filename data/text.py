@@ -1,20 +1,93 @@
 """
 This module interfaces to our user data.
+
+Every change to a page is also kept as a revision in
+REVISIONS_COLLECT: a full snapshot every SNAPSHOT_EVERY versions and a
+line delta (see data.revisions) from the previous version otherwise.
+So any version is rebuilt from one snapshot and fewer than
+SNAPSHOT_EVERY deltas, fetched in a single query.
 """
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from pymongo.errors import DuplicateKeyError
 
 import data.db_connect as dbc
+import data.revisions as rev
 
 TEXT_COLLECT = 'texts'
+REVISIONS_COLLECT = 'text_revisions'
 
 # fields
 PAGE_NUMBER = 'pageNumber'
 TITLE = 'title'
 TEXT = 'text'
+VERSION = 'version'
+# revision fields
+DELTA = 'delta'  # absent from snapshots
+CREATED = 'created'
+
+SNAPSHOT_EVERY = 10
+
+# read_one() cache settings:
+CACHE_MAX_SIZE = 256  # pages
+CACHE_TTL = 30  # seconds
 
 client = dbc.connect_db()
 print(f'{client=}')
 
 
+class PageCache:
+    """
+    A bounded, thread-safe LRU cache of the latest version of pages,
+    with a TTL so other workers' edits show up.
+    Callers get copies, so they can't corrupt the cached page.
+    """
+    def __init__(self, max_size: int = CACHE_MAX_SIZE,
+                 ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # page_number -> (expires_at, page)
+        self._lock = threading.Lock()
+
+    def get(self, page_number: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(page_number)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[page_number]
+                return None
+            self._entries.move_to_end(page_number)
+            return deepcopy(entry[1])
+
+    def put(self, page_number: str, page: dict):
+        entry = (time.monotonic() + self.ttl, deepcopy(page))
+        with self._lock:
+            self._entries[page_number] = entry
+            self._entries.move_to_end(page_number)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, page_number: str):
+        with self._lock:
+            self._entries.pop(page_number, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = PageCache()
+
+
+def ensure_indexes():
+    dbc.ensure_index(REVISIONS_COLLECT, [(PAGE_NUMBER, 1), (VERSION, 1)],
+                     unique=True)
+
+
 def read():
     """
     Our contract:
@@ -29,11 +102,16 @@ def read():
 def read_one(page_number: str) -> dict:
     # This should take a page number and return the page dictionary
     # for that page number. Return an empty dictionary of number not found.
-    return dbc.read_one(TEXT_COLLECT, {PAGE_NUMBER: page_number})
+    page = _cache.get(page_number)
+    if page is None:
+        page = dbc.read_one(TEXT_COLLECT, {PAGE_NUMBER: page_number})
+        if page:
+            _cache.put(page_number, page)
+    return page
 
 
 def exists(page_number: str) -> bool:
-    return read_one(page_number) is not None
+    return dbc.exists(TEXT_COLLECT, {PAGE_NUMBER: page_number})
 
 
 def is_valid_text(page_number: str, title: str, text: str):
@@ -48,22 +126,110 @@ def is_valid_text(page_number: str, title: str, text: str):
 
 def delete(page_number: str):
     del_num = dbc.delete(TEXT_COLLECT, {PAGE_NUMBER: page_number})
+    _cache.invalidate(page_number)
+    if del_num == 1:
+        dbc.delete_many(REVISIONS_COLLECT, {PAGE_NUMBER: page_number})
     return page_number if del_num == 1 else None
 
 
+def _save_revision(page_number: str, version: int, title: str, text: str,
+                   prev_text: str = None):
+    """
+    Record a version: a snapshot when it starts a run of SNAPSHOT_EVERY,
+    else a delta from prev_text.
+    Raise ValueError if someone else already saved this version.
+    """
+    ensure_indexes()
+    revision = {PAGE_NUMBER: page_number, VERSION: version, TITLE: title,
+                CREATED: time.time()}
+    if (version - 1) % SNAPSHOT_EVERY == 0:
+        revision[TEXT] = text
+    else:
+        revision[DELTA] = rev.make_delta(prev_text, text)
+    try:
+        dbc.create(REVISIONS_COLLECT, revision)
+    except DuplicateKeyError:
+        raise _changed_concurrently(page_number)
+
+
+def _changed_concurrently(page_number: str) -> ValueError:
+    return ValueError(f'Page {page_number} was changed concurrently; '
+                      'reload it and try again.')
+
+
 def create(page_number: str, title: str, text: str):
     if exists(page_number):
         raise ValueError(f'Adding duplicate {page_number=}')
     if is_valid_text(page_number, title, text):
-        new_text = {PAGE_NUMBER: page_number, TITLE: title, TEXT: text}
+        new_text = {PAGE_NUMBER: page_number, TITLE: title, TEXT: text,
+                    VERSION: 1}
         dbc.create(TEXT_COLLECT, new_text)
+        _cache.invalidate(page_number)
+        _save_revision(page_number, 1, title, text)
         return page_number
 
 
 def update(page_number: str, title: str, text: str):
-    if not exists(page_number):
+    page = dbc.read_one(TEXT_COLLECT, {PAGE_NUMBER: page_number})
+    if not page:
         raise ValueError(f'Updating non-existent page: {page_number=}')
     if is_valid_text(page_number, title, text):
-        dbc.update(TEXT_COLLECT, {PAGE_NUMBER: page_number},
-                   {TITLE: title, TEXT: text})
+        old_version = page.get(VERSION)
+        saved = []
+        if old_version is None:
+            # A page from before revisions: its text becomes version 1.
+            _save_revision(page_number, 1, page[TITLE], page[TEXT])
+            saved.append(1)
+        version = (old_version or 1) + 1
+        _save_revision(page_number, version, title, text, page[TEXT])
+        saved.append(version)
+        # Only move the page on from the version we read; if that fails,
+        # drop our revisions so they don't block every later update.
+        written = False
+        try:
+            written = dbc.update(
+                TEXT_COLLECT,
+                {PAGE_NUMBER: page_number, VERSION: old_version},
+                {TITLE: title, TEXT: text, VERSION: version},
+            ).matched_count == 1
+        finally:
+            if not written:
+                dbc.delete_many(REVISIONS_COLLECT,
+                                {PAGE_NUMBER: page_number,
+                                 VERSION: {'$in': saved}})
+        _cache.invalidate(page_number)
+        if not written:
+            raise _changed_concurrently(page_number)
         return page_number
+
+
+def history(page_number: str) -> list:
+    """
+    The page's versions, newest first: [{version, title, created}].
+    """
+    return dbc.find(REVISIONS_COLLECT, {PAGE_NUMBER: page_number},
+                    projection={VERSION: 1, TITLE: 1, CREATED: 1},
+                    sort=[(VERSION, -1)])
+
+
+def read_version(page_number: str, version: int) -> dict:
+    """
+    Rebuild a version of a page. Return None if there is no such version.
+    """
+    first = version - (version - 1) % SNAPSHOT_EVERY
+    revisions = dbc.find(REVISIONS_COLLECT,
+                         {PAGE_NUMBER: page_number,
+                          VERSION: {'$gte': first, '$lte': version}},
+                         sort=[(VERSION, 1)])
+    if not revisions or revisions[-1][VERSION] != version \
+            or TEXT not in revisions[0]:
+        return None
+    text = revisions[0][TEXT]
+    for revision in revisions[1:]:
+        text = rev.apply_delta(text, revision[DELTA])
+    return {PAGE_NUMBER: page_number, VERSION: version,
+            TITLE: revisions[-1][TITLE], TEXT: text}
+
+
+def clear_cache():
+    _cache.clear()
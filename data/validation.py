@@ -0,0 +1,59 @@
+"""
+Field validation shared by the data modules, with patterns compiled once.
+
+The batch helpers check each distinct value once, so validating a bulk
+import costs one regex match per distinct email rather than per use.
+"""
+import re
+import unicodedata
+
+CHAR_OR_DIGIT = '[A-Za-z0-9]'
+
+EMAIL_RE = re.compile(
+    rf"(?!.*\.\.)"                     # no consecutive '.'
+    rf"{CHAR_OR_DIGIT}[A-Za-z0-9._%+-]*"
+    rf"@{CHAR_OR_DIGIT}[A-Za-z0-9.-]*"
+    r"\.[A-Za-z]{2,10}"
+)
+
+
+def is_valid_email(email: str) -> bool:
+    return isinstance(email, str) and EMAIL_RE.fullmatch(email) is not None
+
+
+def valid_emails(emails) -> set:
+    """
+    The valid ones among emails, checking each distinct one once.
+    """
+    match = EMAIL_RE.fullmatch
+    return {email for email in set(emails)
+            if isinstance(email, str) and match(email)}
+
+
+def is_blank(value) -> bool:
+    return not isinstance(value, str) or not value.strip()
+
+
+def normalize_title(title: str) -> str:
+    """
+    Titles that differ only in case, spacing or Unicode form are the same.
+    """
+    return ' '.join(unicodedata.normalize('NFKC', title).casefold().split())
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().casefold()
+
+
+def mark_duplicates(errors: dict, keys: list, message: str):
+    """
+    Add message to the errors of every row whose key (if not None)
+    repeats an earlier row's.
+    """
+    seen = set()
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        if key in seen:
+            errors.setdefault(i, []).append(message)
+        seen.add(key)
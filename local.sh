@@ -1,6 +1,7 @@
 #!/bin/bash
 
 export FLASK_ENV=development
+export JOURNAL_ENV=development
 export PROJ_DIR=$PWD
 export DEBUG=1
 
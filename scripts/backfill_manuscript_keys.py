@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""
+Migration: give every manuscript its normalized title and author email
+keys and create the unique index on them. Safe to rerun.
+Lists manuscripts left out as duplicates of an earlier one.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.manuscript as ms  # noqa: E402
+
+
+def main():
+    duplicates = ms.backfill_dedup_keys()
+    for manu_id in duplicates:
+        print(f'Duplicate, left unkeyed: {manu_id}')
+    print(f'{len(duplicates)} duplicate manuscripts.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""
+Migration: add a role bitmask (people.ROLE_MASK) to every person record
+that lacks one or has a stale one, and create the people indexes.
+Safe to rerun.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.people as ppl  # noqa: E402
+
+
+def main():
+    ppl.ensure_indexes()
+    print(f'Updated {ppl.backfill_role_masks()} people records.')
+
+
+if __name__ == '__main__':
+    main()
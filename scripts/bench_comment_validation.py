@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark comment validation: the old separate manuscript and editor
+reads against comment.is_valid_comment(), cold (one combined query),
+with the manuscript known, and with the caller's record passed in.
+Also counts the DB reads each makes.
+Needs a running MongoDB (the same one the app uses).
+"""
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.comment as cmt  # noqa: E402
+import data.db_connect as dbc  # noqa: E402
+import data.manuscript as ms  # noqa: E402
+import data.people as ppl  # noqa: E402
+import data.roles as rls  # noqa: E402
+from bench_utils import report, time_calls  # noqa: E402
+
+REPEAT = 500
+EDITOR_EMAIL = 'bench-editor@bench-comments.org'
+TEXT = 'A bench comment.'
+READS = ('read_one', 'exists', 'aggregate', 'find')
+
+
+def legacy_is_valid_comment(manuscript_id, editor_id, text):
+    """
+    comment.is_valid_comment() as it was: read both records in full.
+    """
+    if not text:
+        raise ValueError('Comment text cannot be empty')
+    if not ms.read_one(manuscript_id):
+        raise ValueError(f'Manuscript {manuscript_id} not found')
+    editor = ppl.read_one(editor_id)
+    if not editor:
+        raise ValueError(f'Editor {editor_id} not found')
+    return True
+
+
+def cold():
+    ppl.clear_cache()
+    ms.known_manuscripts.clear()
+
+
+def count_reads(fn) -> int:
+    patches = [patch.object(dbc, name, wraps=getattr(dbc, name))
+               for name in READS]
+    mocks = [p.start() for p in patches]
+    try:
+        fn()
+    finally:
+        for p in patches:
+            p.stop()
+    return sum(mock.call_count for mock in mocks)
+
+
+def main():
+    if not ppl.exists(EDITOR_EMAIL):
+        ppl.create('Bench Editor', 'Bench U', EDITOR_EMAIL, rls.ED_CODE)
+    manu_id = ms.create('Bench comments', 'Bench Author',
+                        'bench-author@bench-comments.org', 'Text',
+                        'Abstract', EDITOR_EMAIL)
+    editor = ppl.read_one(EDITOR_EMAIL)
+    try:
+        cases = [
+            ('old, separate reads',
+             lambda: legacy_is_valid_comment(manu_id, EDITOR_EMAIL, TEXT),
+             cold),
+            ('new, cold',
+             lambda: cmt.is_valid_comment(manu_id, EDITOR_EMAIL, TEXT),
+             cold),
+            ('new, manuscript known',
+             lambda: cmt.is_valid_comment(manu_id, EDITOR_EMAIL, TEXT),
+             ppl.clear_cache),
+            ('new, caller record passed',
+             lambda: cmt.is_valid_comment(manu_id, EDITOR_EMAIL, TEXT,
+                                          editor),
+             None),
+        ]
+        base = None
+        for label, fn, setup in cases:
+            if setup:
+                setup()
+            fn()  # warm the known-manuscript cache where it applies
+            if setup:
+                setup()
+            reads = count_reads(fn)
+            stats = time_calls(fn, REPEAT, setup=setup)
+            report(f'{label} ({reads} reads)', stats, base)
+            base = base or stats
+    finally:
+        ms.delete(manu_id)
+        ppl.delete(EDITOR_EMAIL)
+
+
+if __name__ == '__main__':
+    main()
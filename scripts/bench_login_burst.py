@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Benchmark /auth/login under a burst of concurrent sign-ins: password
+checks on the bounded hash pool against hashing inline on every request
+thread. People lookups are mocked, so no MongoDB is needed.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.people as ppl  # noqa: E402
+import security.auth as auth  # noqa: E402
+import server.endpoints as ep  # noqa: E402
+from bench_utils import summarize  # noqa: E402
+
+BURST = 200
+REQUEST_THREADS = 32  # as many as a threaded WSGI server might run
+EMAIL = 'burst@bench-login.org'
+PASSWORD = 'correct horse battery staple'
+PERSON = {
+    ppl.ID: 'burst-id',
+    ppl.EMAIL: EMAIL,
+    ppl.NAME: 'Burst',
+    ppl.ROLES: [],
+    auth.PASSWORD: auth.hash_password(PASSWORD),
+}
+
+
+def inline_hashing(fn, *args):
+    return fn(*args)
+
+
+def burst() -> tuple:
+    """
+    Send BURST logins at once; return (latencies in ms, status counts).
+    """
+    client = ep.app.test_client()
+    body = {ep.USERNAME: EMAIL, ep.PASSWORD: PASSWORD}
+
+    def login():
+        start = time.perf_counter()
+        status = client.post(f'{ep.AUTH_EP}/login', json=body).status_code
+        return (time.perf_counter() - start) * 1000, status
+
+    with ThreadPoolExecutor(REQUEST_THREADS) as pool:
+        results = list(pool.map(lambda _: login(), range(BURST)))
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return [ms for ms, status in results if status == 200], statuses
+
+
+def show(label: str, latencies: list, statuses: dict):
+    stats = summarize(latencies)
+    print(f'{label:<24} p50 {stats["median"]:8.1f} ms'
+          f'   p99 {stats["p99"]:8.1f} ms   statuses {statuses}')
+
+
+def main():
+    ep.app.logger.disabled = True  # don't log every shed (503) login
+    print(f'{BURST} logins over {REQUEST_THREADS} request threads, '
+          f'{auth.HASH_WORKERS} hash workers, queue {auth.HASH_QUEUE}')
+    with patch('data.people.read_one', return_value=PERSON):
+        with patch('security.auth.run_hashing', inline_hashing):
+            show('inline hashing', *burst())
+        show('hash pool', *burst())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Benchmark people lookups by email: the old sequential id-then-email
+queries against the single classified query in people.read_one(),
+both directly and through a requires_permission-protected route.
+Needs a running MongoDB (the same one the app uses).
+"""
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.db_connect as dbc  # noqa: E402
+import data.people as ppl  # noqa: E402
+import data.roles as rls  # noqa: E402
+import server.endpoints as ep  # noqa: E402
+from bench_utils import report, time_calls  # noqa: E402
+
+NUM_PEOPLE = 2000
+REPEAT = 500
+EMAIL_FMT = 'bench{}@bench-people.org'
+PROTECTED_EP = f'{ep.DEV_EP}/editor_dashboard'
+
+
+def legacy_read_one(identifier: str) -> dict:
+    """
+    people.read_one() as it was: try the id, then the email.
+    """
+    rec = dbc.read_one(ppl.PEOPLE_COLLECT, {ppl.ID: identifier})
+    if rec:
+        return rec
+    return dbc.read_one(ppl.PEOPLE_COLLECT, {ppl.EMAIL: identifier})
+
+
+def seed():
+    for i in range(NUM_PEOPLE):
+        email = EMAIL_FMT.format(i)
+        if not ppl.exists(email):
+            ppl.create(f'Bench {i}', 'Bench U', email, rls.ED_CODE)
+
+
+def cleanup():
+    for i in range(NUM_PEOPLE):
+        ppl.delete(EMAIL_FMT.format(i))
+
+
+def main():
+    seed()
+    email = EMAIL_FMT.format(NUM_PEOPLE // 2)
+    try:
+        old = time_calls(lambda: legacy_read_one(email), REPEAT)
+        report('read by email, id then email', old)
+        new = time_calls(lambda: ppl.read_one(email), REPEAT,
+                         setup=ppl.clear_cache)
+        report('read by email, single query', new, old)
+        cached = time_calls(lambda: ppl.read_one(email), REPEAT)
+        report('read by email, cached', cached, old)
+
+        client = ep.app.test_client()
+        headers = {'X-User-Email': email}
+
+        def call_route():
+            assert client.get(PROTECTED_EP, headers=headers).status_code \
+                == 200
+
+        with patch('data.people.read_one', legacy_read_one):
+            old_route = time_calls(call_route, REPEAT)
+        report(f'GET {PROTECTED_EP}, id then email', old_route)
+        new_route = time_calls(call_route, REPEAT, setup=ppl.clear_cache)
+        report(f'GET {PROTECTED_EP}, single query', new_route, old_route)
+        cached_route = time_calls(call_route, REPEAT)
+        report(f'GET {PROTECTED_EP}, cached', cached_route, old_route)
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
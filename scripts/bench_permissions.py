@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark security.is_permitted(): the old nested-dict walk against the
+compiled (feature, action) table. No DB needed.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import security.security as sec  # noqa: E402
+from bench_utils import report, time_calls  # noqa: E402
+
+REPEAT = 200
+NUMBER = 1000
+LOGIN_KEY = 'any key'
+
+
+def legacy_is_permitted(feature_name: str, action: str,
+                        user_id: str, **kwargs) -> bool:
+    """
+    is_permitted() as it was: walk the records and look up every check
+    by name on each call.
+    """
+    prot = sec.read_feature(feature_name)
+    if prot is None:
+        return True
+    if action not in prot:
+        return True
+    if sec.USER_LIST in prot[action]:
+        if user_id not in prot[action][sec.USER_LIST]:
+            return False
+    if sec.CHECKS not in prot[action]:
+        return True
+    for check in prot[action][sec.CHECKS]:
+        if check not in sec.CHECK_FUNCS:
+            raise ValueError(f'Bad check passed to is_permitted: {check}')
+        if not sec.CHECK_FUNCS[check](user_id, **kwargs):
+            return False
+    return True
+
+
+CASES = [
+    ('permitted', (sec.PEOPLE, sec.CREATE, sec.GOOD_USER_ID)),
+    ('user not listed', (sec.PEOPLE, sec.CREATE, 'someone else')),
+    ('3 checks', (sec.TEXTS, sec.DELETE, sec.GOOD_USER_ID)),
+    ('unprotected feature', ('no such feature', sec.CREATE, 'anyone')),
+]
+
+
+def main():
+    sec.get_compiled()
+    for label, args in CASES:
+        old = time_calls(
+            lambda: legacy_is_permitted(*args, login_key=LOGIN_KEY),
+            REPEAT, number=NUMBER)
+        report(f'{label}, dict walk', old)
+        new = time_calls(
+            lambda: sec.is_permitted(*args, login_key=LOGIN_KEY),
+            REPEAT, number=NUMBER)
+        report(f'{label}, compiled', new, old)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark the role tables: the old deep-copied dicts and list/set role
+checks against the frozen tables and role bitmasks in data.roles.
+People reads are mocked, so no MongoDB is needed.
+"""
+import os
+import sys
+from copy import deepcopy
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.people as ppl  # noqa: E402
+import data.roles as rls  # noqa: E402
+from bench_utils import report, time_calls  # noqa: E402
+
+REPEAT = 200
+NUMBER = 1000
+NUM_PEOPLE = 500
+EDITOR_ROLES = {rls.ED_CODE, rls.ME_CODE, rls.CE_CODE}
+PERSON = {ppl.ROLES: [rls.AUTHOR_CODE, rls.REFREE_CODE, rls.CE_CODE]}
+PEOPLE = {
+    str(i): {
+        ppl.NAME: f'Person {i}',
+        ppl.AFFILIATION: 'NYU',
+        ppl.BIO: '',
+        ppl.ROLES: [rls.ROLE_CODES[i % len(rls.ROLE_CODES)]],
+    }
+    for i in range(NUM_PEOPLE)
+}
+
+
+def legacy_get_roles() -> dict:
+    return deepcopy(dict(rls.ROLES))
+
+
+def legacy_get_masthead_roles() -> dict:
+    mh_roles = legacy_get_roles()
+    del_mh_roles = []
+    for role in mh_roles:
+        if role not in rls.MH_ROLES:
+            del_mh_roles.append(role)
+    for del_role in del_mh_roles:
+        del mh_roles[del_role]
+    return mh_roles
+
+
+def legacy_has_role(person: dict, role: str) -> bool:
+    return role in person.get(ppl.ROLES, [])
+
+
+def legacy_get_masthead() -> dict:
+    masthead = {}
+    mh_roles = legacy_get_masthead_roles()
+    for mh_role, text in mh_roles.items():
+        people_w_role = []
+        people = ppl.read()
+        for _id, person in people.items():
+            if legacy_has_role(person, mh_role):
+                people_w_role.append(ppl.create_mh_rec(person))
+        masthead[text] = people_w_role
+    return masthead
+
+
+def compare(label: str, old_fn, new_fn, number: int = NUMBER):
+    old = time_calls(old_fn, REPEAT, number=number)
+    report(f'{label}, old', old)
+    new = time_calls(new_fn, REPEAT, number=number)
+    report(f'{label}, new', new, old)
+
+
+def main():
+    required = rls.mask_of(EDITOR_ROLES)
+    compare('get_roles', legacy_get_roles, rls.get_roles)
+    compare('get_masthead_roles', legacy_get_masthead_roles,
+            rls.get_masthead_roles)
+    compare('editor check, roles list',
+            lambda: set(PERSON[ppl.ROLES]).intersection(EDITOR_ROLES),
+            lambda: rls.has_any(ppl.role_mask(PERSON), required))
+    token_mask = rls.mask_of(PERSON[ppl.ROLES])  # as carried in a token
+    compare('editor check, token mask',
+            lambda: set(PERSON[ppl.ROLES]).intersection(EDITOR_ROLES),
+            lambda: rls.has_any(token_mask, required))
+    with patch('data.people.read', return_value=PEOPLE) as mock_read:
+        assert legacy_get_masthead() == ppl.get_masthead()
+        compare(f'get_masthead, {NUM_PEOPLE} people', legacy_get_masthead,
+                ppl.get_masthead, number=10)
+        mock_read.reset_mock()
+        legacy_get_masthead()
+        old_reads = mock_read.call_count
+        mock_read.reset_mock()
+        ppl.get_masthead()
+        print(f'get_masthead people reads: old {old_reads}, '
+              f'new {mock_read.call_count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Tiny timing helpers shared by the bench_*.py scripts.
+"""
+import statistics
+import time
+
+
+def time_calls(fn, repeat: int = 1000, setup=None, number: int = 1) -> dict:
+    """
+    Take `repeat` samples of calling fn() `number` times and return
+    per-call latency stats in microseconds.
+    Use number > 1 for calls too fast to time one by one.
+    setup(), if given, runs before every sample and is not timed.
+    """
+    samples = []
+    calls = range(number)
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in calls:
+            fn()
+        samples.append((time.perf_counter() - start) * 1_000_000 / number)
+    return summarize(samples)
+
+
+def summarize(samples: list) -> dict:
+    """
+    Latency stats over a list of samples (in whatever unit they're in).
+    """
+    samples = sorted(samples)
+    return {
+        'median': statistics.median(samples),
+        'p95': samples[int(len(samples) * 0.95) - 1],
+        'p99': samples[int(len(samples) * 0.99) - 1],
+        'mean': statistics.fmean(samples),
+    }
+
+
+def report(label: str, stats: dict, baseline: dict = None):
+    line = (f'{label:<40} median {stats["median"]:10.1f} us'
+            f'   p95 {stats["p95"]:10.1f} us')
+    if baseline:
+        line += f'   speedup x{baseline["median"] / stats["median"]:.1f}'
+    print(line)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Benchmark email and batch validation: the old per-call pattern build and
+re.match against the compiled pattern in data.validation, and
+person-by-person checks against people.validate_people().
+No MongoDB is needed.
+"""
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.people as ppl  # noqa: E402
+import data.roles as rls  # noqa: E402
+import data.validation as val  # noqa: E402
+from bench_utils import report, time_calls  # noqa: E402
+
+REPEAT = 200
+NUMBER = 1000
+BATCH = 5000
+EMAIL = 'some.one-else@cims.nyu.edu'
+RECORDS = [
+    {
+        ppl.NAME: f'Person {i}',
+        ppl.AFFILIATION: 'NYU',
+        ppl.EMAIL: f'person{i}@nyu.edu',
+        ppl.ROLES: [rls.AUTHOR_CODE],
+    }
+    for i in range(BATCH)
+]
+
+
+def legacy_is_valid_email(email: str) -> bool:
+    pattern = (
+        rf"^(?!.*\.\.)"
+        rf"{val.CHAR_OR_DIGIT}[A-Za-z0-9._%+-]*"
+        rf"@{val.CHAR_OR_DIGIT}[A-Za-z0-9.-]*"
+        r"\.[A-Za-z]{2,10}$"
+    )
+    return bool(re.match(pattern, email))
+
+
+def one_by_one():
+    for rec in RECORDS:
+        try:
+            ppl.is_valid_person(rec[ppl.NAME], rec[ppl.AFFILIATION],
+                                rec[ppl.EMAIL], roles=rec[ppl.ROLES])
+        except ValueError:
+            pass
+
+
+def main():
+    base = time_calls(lambda: legacy_is_valid_email(EMAIL), REPEAT,
+                      number=NUMBER)
+    report('email, pattern per call (us)', base)
+    report('email, compiled (us)',
+           time_calls(lambda: val.is_valid_email(EMAIL), REPEAT,
+                      number=NUMBER), base)
+    base = time_calls(one_by_one, 20)
+    report(f'{BATCH} people one by one (us)', base)
+    # validate_people() also finds emails repeated within the batch.
+    report(f'{BATCH} people, validate_people (us)',
+           time_calls(lambda: ppl.validate_people(RECORDS), 20), base)
+
+
+if __name__ == '__main__':
+    main()
@@ -54,8 +54,23 @@ def create_editors():
     """Create sample editors in the database."""
     created_count = 0
     skipped_count = 0
-    
-    for editor in EDITORS:
+
+    # Check the whole batch up front; skip the rows that fail.
+    invalid = ppl.validate_people([
+        {
+            ppl.NAME: editor["name"],
+            ppl.AFFILIATION: editor["affiliation"],
+            ppl.EMAIL: editor["email"],
+            ppl.ROLES: [editor["role"]],
+        }
+        for editor in EDITORS
+    ])
+    for row, errors in invalid.items():
+        print(f"Invalid editor {EDITORS[row]['email']}: {'; '.join(errors)}")
+
+    for row, editor in enumerate(EDITORS):
+        if row in invalid:
+            continue
         try:
             ppl.create(
                 name=editor["name"],
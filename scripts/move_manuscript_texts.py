@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+Migration: turn manuscript texts from before revisions, inline in the
+manuscripts collection or in manuscript_bodies, into first revisions.
+Safe to rerun.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.manuscript as ms  # noqa: E402
+
+
+def main():
+    print(f'Moved {ms.move_texts()} manuscript texts.')
+
+
+if __name__ == '__main__':
+    main()
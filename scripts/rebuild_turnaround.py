@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+"""
+Recompute the turnaround aggregates (data.analytics) from the manuscript
+event log, e.g. after changing how they are bucketed. Safe to rerun.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.analytics as anl  # noqa: E402
+
+
+def main():
+    print(f'Counted {anl.rebuild()} transitions.')
+
+
+if __name__ == '__main__':
+    main()
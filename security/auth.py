@@ -1,8 +1,139 @@
+"""
+Credentials: registration and login.
+
+Passwords are stored as `scrypt$<n>$<r>$<p>$<salt>$<hash>` (salt and hash
+base64). The cost comes from the environment, and a password stored
+with other settings, or in plaintext by older versions, is rehashed on
+the next successful login.
+
+Hashing is deliberately slow, so it runs on a small pool of its own
+(HASH_WORKERS threads; hashlib releases the GIL while hashing) with at
+most HASH_QUEUE requests waiting. When the queue is full we fail fast
+with AuthBusy rather than let logins pile up behind each other.
+The pool bounds how much CPU hashing takes; it doesn't free the request
+thread, which still blocks until its hash is done.
+
+A login for an unknown user hashes against DUMMY_PASSWORD's hash, so it
+takes as long as one with a wrong password and doesn't reveal which
+usernames exist.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import data.people as ppl
 import data.db_connect as dbc
 import data.roles as rls
+import security.tokens as tok
 
 PASSWORD = 'pw'
+TOKEN = 'token'
+
+SCRYPT = 'scrypt'
+SCRYPT_N = int(os.environ.get('JOURNAL_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('JOURNAL_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('JOURNAL_SCRYPT_P', 1))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+HASH_WORKERS = int(os.environ.get('JOURNAL_HASH_WORKERS',
+                                  os.cpu_count() or 1))
+HASH_QUEUE = int(os.environ.get('JOURNAL_HASH_QUEUE', 4 * HASH_WORKERS))
+HASH_WAIT = 1.0  # seconds to wait for a queue slot before giving up
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS,
+                                thread_name_prefix='pwhash')
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+class AuthBusy(Exception):
+    """
+    Too many password hashes in flight; the caller should retry later.
+    """
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=2 * 128 * r * (n + p + 2),
+                          dklen=HASH_BYTES)
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password with the current cost settings.
+    Runs on the calling thread; see run_hashing().
+    """
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return (f'{SCRYPT}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}'
+            f'${_b64encode(salt)}${_b64encode(digest)}')
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(f'{SCRYPT}$')
+
+
+def check_password(password: str, stored: str) -> bool:
+    """
+    Check a password against what we stored for it, hashed or not.
+    Runs on the calling thread; see run_hashing().
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, n, r, p, salt, digest = stored.split('$')
+    actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(actual, base64.b64decode(digest))
+
+
+DUMMY_PASSWORD = 'no such user'
+
+
+@lru_cache(maxsize=1)
+def dummy_hash() -> str:
+    """
+    A hash to check against when there is no stored password, made
+    once with the current settings.
+    """
+    return hash_password(DUMMY_PASSWORD)
+
+
+def needs_rehash(stored: str) -> bool:
+    """
+    True if stored isn't hashed with the current settings.
+    """
+    return not stored.startswith(
+        f'{SCRYPT}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$')
+
+
+def run_hashing(fn, *args):
+    """
+    Run a hashing function on the hash pool and block until its result.
+    Raise AuthBusy if the pool's queue stays full for HASH_WAIT seconds.
+    """
+    if not _hash_slots.acquire(timeout=HASH_WAIT):
+        raise AuthBusy('Too many sign-ins in progress; retry shortly.')
+    try:
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+
+def _store_password(username: str, hashed: str):
+    dbc.update(
+        collection=ppl.PEOPLE_COLLECT,
+        filters={ppl.EMAIL: username},
+        update_dict={PASSWORD: hashed}
+    )
+    ppl.invalidate(username)
 
 
 def register_user(username: str,
@@ -13,10 +144,13 @@ def register_user(username: str,
                   bio: str = "") -> bool:
     """
     Create a new user. Returns True on success, False if user already exists.
+    Raises AuthBusy if the password can't be hashed right now.
     """
     if ppl.read_one(username):
         return False
 
+    # Hash first, so a busy pool doesn't leave a user with no password.
+    hashed = run_hashing(hash_password, password)
     ppl.create(
         name=name,
         affiliation=affiliation,
@@ -24,26 +158,36 @@ def register_user(username: str,
         role=role,
         bio=bio,
     )
-    dbc.update(
-        collection=ppl.PEOPLE_COLLECT,
-        filters={ppl.EMAIL: username},
-        update_dict={PASSWORD: password}
-    )
+    _store_password(username, hashed)
 
     return True
 
 
 def authenticate_user(username: str, password: str) -> dict:
     """
-    Returns a dict {id, email, name, roles} on valid credentials, or None.
+    Returns a dict {id, email, name, roles, token} on valid credentials,
+    or None. The token is a signed session token (see security.tokens).
+    Raises AuthBusy if the password can't be checked right now.
     """
     rec = ppl.read_one(username)
-    if not rec or rec.get(PASSWORD) != password:
+    stored = rec.get(PASSWORD) if rec else None
+    if not stored:
+        # As slow as a wrong password, so the time taken says nothing.
+        run_hashing(check_password, password, dummy_hash())
+        return None
+    if not run_hashing(check_password, password, stored):
         return None
+    if needs_rehash(stored):
+        try:
+            _store_password(rec[ppl.EMAIL],
+                            run_hashing(hash_password, password))
+        except AuthBusy:
+            pass  # the login is good; rehash next time
 
     return {
         ppl.ID:    rec[ppl.ID],
         ppl.EMAIL: rec[ppl.EMAIL],
         ppl.NAME:  rec.get(ppl.NAME, rec[ppl.EMAIL]),
         ppl.ROLES: rec.get(ppl.ROLES, []),
+        TOKEN:     tok.issue_for(rec),
     }
@@ -0,0 +1,220 @@
+"""
+Token-bucket rate limiting for the auth endpoints.
+
+Every key (a client IP or a username) gets a bucket of `burst` tokens
+that refills at `rate` tokens a second; a request takes one token or is
+refused. Buckets live in this process by default. Set
+JOURNAL_RATE_LIMIT_DB to a sqlite file path to share them between the
+workers on a host instead.
+
+The check runs before the view does anything else, so refused requests
+never reach the DB.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+
+# Per client IP: a burst of 20, then one attempt a second.
+IP_RATE = float(os.environ.get('JOURNAL_RATE_LIMIT_IP_RATE', 1))
+IP_BURST = float(os.environ.get('JOURNAL_RATE_LIMIT_IP_BURST', 20))
+# Per username: a burst of 5, then one attempt every 12 seconds.
+USER_RATE = float(os.environ.get('JOURNAL_RATE_LIMIT_USER_RATE', 1 / 12))
+USER_BURST = float(os.environ.get('JOURNAL_RATE_LIMIT_USER_BURST', 5))
+
+MAX_KEYS = 100_000  # per in-memory limiter; least recently used go first
+SHARED_DB = os.environ.get('JOURNAL_RATE_LIMIT_DB')
+# How often each process drops the shared buckets that have been idle
+# long enough to be full again, which are the same as no bucket.
+PRUNE_INTERVAL = 60  # seconds
+
+USERNAME = 'username'
+
+
+def _refill(tokens: float, stamp: float, now: float, rate: float,
+            burst: float) -> float:
+    return min(burst, tokens + (now - stamp) * rate)
+
+
+def _wait(tokens: float, rate: float) -> float:
+    """
+    Seconds until a bucket holding tokens has one to give; 0 if it has.
+    """
+    return 0 if tokens >= 1 else (1 - tokens) / rate
+
+
+def _take(tokens: float, stamp: float, now: float, rate: float,
+          burst: float) -> tuple:
+    """
+    Refill a bucket up to now and try to take a token from it.
+    Return (new tokens, seconds to wait or 0 if a token was taken).
+    """
+    tokens = _refill(tokens, stamp, now, rate, burst)
+    wait = _wait(tokens, rate)
+    return (tokens if wait else tokens - 1), wait
+
+
+class RateLimiter:
+    """
+    Token buckets in a bounded, thread-safe LRU map of
+    key -> (tokens, last refill time).
+    """
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: float = None) -> float:
+        """
+        Take a token for key. Return 0 if allowed, else the number of
+        seconds until a token will be available.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (self.burst, now))
+            tokens, wait = _take(tokens, stamp, now, self.rate, self.burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def peek(self, key: str, now: float = None) -> float:
+        """
+        What hit() would return, without taking a token.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (self.burst, now))
+        return _wait(_refill(tokens, stamp, now, self.rate, self.burst),
+                     self.rate)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteRateLimiter:
+    """
+    Token buckets in a sqlite file, shared by every process using it.
+    Each hit is one short write transaction. Buckets idle long enough
+    to have refilled are pruned every PRUNE_INTERVAL seconds.
+    """
+    def __init__(self, path: str, rate: float, burst: float):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+        self._next_prune = 0
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets ('
+                         'key TEXT PRIMARY KEY, tokens REAL, stamp REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS buckets_stamp '
+                         'ON buckets (stamp)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, now: float = None) -> float:
+        # Wall-clock time, as the buckets are shared between processes.
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, stamp FROM buckets '
+                               'WHERE key = ?', (key,)).fetchone()
+            tokens, stamp = row or (self.burst, now)
+            tokens, wait = _take(tokens, stamp, now, self.rate, self.burst)
+            conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                         (key, tokens, now))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        if now >= self._next_prune:
+            self.prune(now)
+        return wait
+
+    def peek(self, key: str, now: float = None) -> float:
+        """
+        What hit() would return, without taking a token.
+        """
+        now = time.time() if now is None else now
+        row = self._connect().execute('SELECT tokens, stamp FROM buckets '
+                                      'WHERE key = ?', (key,)).fetchone()
+        tokens, stamp = row or (self.burst, now)
+        return _wait(_refill(tokens, stamp, now, self.rate, self.burst),
+                     self.rate)
+
+    def prune(self, now: float = None):
+        """
+        Drop the buckets that are full again, as if never used.
+        """
+        now = time.time() if now is None else now
+        self._next_prune = now + PRUNE_INTERVAL
+        self._connect().execute('DELETE FROM buckets WHERE stamp < ?',
+                                (now - self.burst / self.rate,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM buckets')
+
+
+def make_limiter(rate: float, burst: float, shared_db: str = SHARED_DB):
+    if shared_db:
+        return SqliteRateLimiter(shared_db, rate, burst)
+    return RateLimiter(rate, burst)
+
+
+ip_limiter = make_limiter(IP_RATE, IP_BURST)
+user_limiter = make_limiter(USER_RATE, USER_BURST)
+
+
+def clear():
+    ip_limiter.clear()
+    user_limiter.clear()
+
+
+def hit_all(limits: list, now: float = None) -> float:
+    """
+    Take a token for each (limiter, key), but only if every one of them
+    has a token to give, so a refused request costs no bucket anything.
+    Return 0 if allowed, else the seconds until all would allow it.
+    """
+    wait = max(limiter.peek(key, now) for limiter, key in limits)
+    if wait:
+        return wait
+    # Another request may have spent a token since we looked.
+    return max(limiter.hit(key, now) for limiter, key in limits)
+
+
+def limit_auth(fn):
+    """
+    Rate limit an auth view by client IP and by the `username` in its
+    JSON body; answer 429 with Retry-After when either is over.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        limits = [(ip_limiter, f'ip:{request.remote_addr}')]
+        body = request.get_json(force=True, silent=True)
+        username = body.get(USERNAME) if isinstance(body, dict) else None
+        if isinstance(username, str):
+            limits.append((user_limiter,
+                           f'user:{username.strip().lower()}'))
+        wait = hit_all(limits)
+        if wait:
+            raise TooManyRequests('Too many attempts; slow down.',
+                                  retry_after=int(wait) + 1)
+        return fn(*args, **kwargs)
+    return wrapper
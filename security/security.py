@@ -1,9 +1,16 @@
+import os
+import threading
+from collections import namedtuple
+from copy import deepcopy
 from functools import wraps
-from flask import request
-from werkzeug.exceptions import Forbidden
+from types import MappingProxyType
+from flask import g, request
+from pymongo.errors import PyMongoError
+from werkzeug.exceptions import Forbidden, Unauthorized
+import data.db_connect as dbc
 import data.people as ppl
-
-# import data.db_connect as dbc
+import data.roles as rls
+import security.tokens as tok
 
 """
 Our record format to meet our requirements (see security.md) will be:
@@ -71,7 +78,31 @@ BAD_FEATURE = 'baaaad feature'
 PEOPLE_MISSING_ACTION = READ
 GOOD_USER_ID = 'yw5490@nyu.edu'
 
-security_recs = None
+# All the records live in one doc of COLLECT_NAME:
+#   {_id: SECURITY_ID, VERSION: int, RECS: {feature_name: ...}}
+# Every save bumps VERSION, which is how workers notice a change.
+SECURITY_ID = 'security'
+VERSION = 'version'
+RECS = 'recs'
+
+# seconds between version polls; 0 turns polling off
+RELOAD_INTERVAL = float(os.environ.get('JOURNAL_SECURITY_RELOAD_INTERVAL',
+                                       30))
+
+# An immutable view of the records in force:
+# recs as stored, and compiled by compile_recs().
+# It is only ever replaced whole, so readers never see half a reload.
+Snapshot = namedtuple('Snapshot', ['version', 'recs', 'compiled'])
+snapshot = None
+
+_reloader = None
+_reloader_stop = threading.Event()
+
+# A compiled (feature, action) protection.
+# users is a frozenset, or None if the action has no user list;
+# checks is a tuple of check functions;
+# error is set if the record named a check we don't have.
+Rule = namedtuple('Rule', ['users', 'checks', 'error'])
 
 PEOPLE_CHANGE_PERMISSIONS = {
     USER_LIST: [GOOD_USER_ID],
@@ -80,8 +111,8 @@ PEOPLE_CHANGE_PERMISSIONS = {
     },
 }
 
-# These will come from the DB soon:
-TEST_RECS = {
+# Seeded into the DB when it has no security records yet:
+DEFAULT_RECS = {
     PEOPLE: {
         CREATE: PEOPLE_CHANGE_PERMISSIONS,
         DELETE: PEOPLE_CHANGE_PERMISSIONS,
@@ -103,6 +134,12 @@ TEST_RECS = {
             },
         },
     },
+}
+
+# For tests only: the defaults plus a record naming a check we don't
+# have. Never stored or put in force outside tests.
+TEST_RECS = {
+    **DEFAULT_RECS,
     BAD_FEATURE: {
         CREATE: {
             USER_LIST: [GOOD_USER_ID],
@@ -145,11 +182,141 @@ CHECK_FUNCS = {
 }
 
 
+def compile_recs(recs: dict) -> MappingProxyType:
+    """
+    Flatten security records into a frozen (feature, action) -> Rule map.
+    Check names are resolved to functions, and validated, here once
+    rather than on every permission check.
+    """
+    table = {}
+    for feature, actions in recs.items():
+        for action, prot in actions.items():
+            users = prot.get(USER_LIST)
+            checks = []
+            error = None
+            for check in prot.get(CHECKS, {}):
+                if check not in CHECK_FUNCS:
+                    error = f'Bad check passed to is_permitted: {check}'
+                    print(f'Security record {feature}/{action}: {error}')
+                    break
+                checks.append(CHECK_FUNCS[check])
+            table[(feature, action)] = Rule(
+                None if users is None else frozenset(users),
+                tuple(checks),
+                error,
+            )
+    return MappingProxyType(table)
+
+
+def _install(doc: dict) -> Snapshot:
+    global snapshot
+    recs = doc[RECS]
+    snapshot = Snapshot(doc[VERSION], recs, compile_recs(recs))
+    return snapshot
+
+
+def load() -> Snapshot:
+    """
+    Load the security records from the DB and make them the ones in
+    force. An empty collection is seeded with DEFAULT_RECS.
+    If the DB can't be reached, the records in force stay in force;
+    if none were loaded yet, the PyMongoError is raised, so permission
+    checks fail until the DB is back rather than run on made-up records.
+    """
+    try:
+        dbc.connect_db()
+        doc = dbc.read_one(COLLECT_NAME, {dbc.MONGO_ID: SECURITY_ID})
+        if doc is None:
+            doc = dbc.find_one_and_update(
+                COLLECT_NAME, {dbc.MONGO_ID: SECURITY_ID},
+                {'$setOnInsert': {VERSION: 1, RECS: DEFAULT_RECS}},
+                upsert=True)
+    except PyMongoError as err:
+        if snapshot is None:
+            raise
+        print(f'Could not load security records, keeping version '
+              f'{snapshot.version}: {err}')
+        return snapshot
+    return _install(doc)
+
+
+def get_snapshot() -> Snapshot:
+    """
+    The records in force; loaded on first use.
+    """
+    return snapshot or load()
+
+
 def read() -> dict:
-    global security_recs
-    # dbc.read()
-    security_recs = TEST_RECS
-    return security_recs
+    """
+    A copy of the security records in force.
+    """
+    return deepcopy(get_snapshot().recs)
+
+
+def save(recs: dict) -> int:
+    """
+    Replace the security records and bump their version.
+    Other workers pick the change up on their next reload poll.
+    Returns the new version.
+    """
+    doc = dbc.find_one_and_update(
+        COLLECT_NAME, {dbc.MONGO_ID: SECURITY_ID},
+        {'$set': {RECS: recs}, '$inc': {VERSION: 1}},
+        upsert=True)
+    return _install(doc).version
+
+
+def reload_if_changed() -> bool:
+    """
+    Reload the records if their version in the DB differs from ours.
+    Only the version is fetched when nothing changed.
+    Returns True if we reloaded.
+    """
+    doc = dbc.read_one(COLLECT_NAME, {dbc.MONGO_ID: SECURITY_ID},
+                       projection={VERSION: 1})
+    current = get_snapshot()
+    if doc is None or doc[VERSION] == current.version:
+        return False
+    load()
+    return True
+
+
+def _poll(interval: float):
+    while True:
+        try:
+            # Until the first load succeeds, keep trying it.
+            if snapshot is None:
+                load()
+            else:
+                reload_if_changed()
+        except PyMongoError as err:
+            print(f'Security records reload failed: {err}')
+        if _reloader_stop.wait(interval):
+            return
+
+
+def start_reloader(interval: float = RELOAD_INTERVAL):
+    """
+    Start a daemon thread that polls for new security records,
+    so permission changes apply without restarting workers.
+    Does nothing if one is already running or interval is 0.
+    """
+    global _reloader
+    if interval <= 0 or (_reloader and _reloader.is_alive()):
+        return
+    _reloader_stop.clear()
+    _reloader = threading.Thread(target=_poll, args=(interval,),
+                                 name='security-reloader', daemon=True)
+    _reloader.start()
+
+
+def stop_reloader():
+    global _reloader
+    _reloader_stop.set()
+    if _reloader:
+        _reloader.join()
+        _reloader = None
 
 
 def needs_recs(fn):
@@ -158,74 +325,138 @@ def needs_recs(fn):
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        global security_recs
-        if not security_recs:
-            security_recs = read()
+        get_snapshot()
         return fn(*args, **kwargs)
     return wrapper
 
 
 @needs_recs
 def read_feature(feature_name: str) -> dict:
-    if feature_name in security_recs:
-        return security_recs[feature_name]
+    if feature_name in snapshot.recs:
+        return deepcopy(snapshot.recs[feature_name])
     else:
         return None
 
 
-@needs_recs
+def get_compiled() -> MappingProxyType:
+    """
+    The compiled form of the records in force.
+    """
+    return get_snapshot().compiled
+
+
 def is_permitted(feature_name: str, action: str,
                  user_id: str, **kwargs) -> bool:
-    prot = read_feature(feature_name)
-    if prot is None:
-        return True
-    if action not in prot:
-        return True
-    if USER_LIST in prot[action]:
-        if user_id not in prot[action][USER_LIST]:
-            return False
-    if CHECKS not in prot[action]:
+    # Always served from memory; the DB is only read by load()/reloads.
+    rule = (snapshot or load()).compiled.get((feature_name, action))
+    if rule is None:
         return True
-    for check in prot[action][CHECKS]:
-        if check not in CHECK_FUNCS:
-            raise ValueError(f'Bad check passed to is_permitted: {check}')
-        if not CHECK_FUNCS[check](user_id, **kwargs):
+    if rule.users is not None and user_id not in rule.users:
+        return False
+    if rule.error:
+        raise ValueError(rule.error)
+    for check in rule.checks:
+        if not check(user_id, **kwargs):
             return False
     return True
 
 
-def requires_permission(feature: str, action: str, roles=None):
+BEARER = 'Bearer '
+
+
+def bearer_token() -> str:
     """
-    Enforce that the caller (via header/body/query/path) exists and,
-    if roles are specified, has at least one of them.
+    The token from an `Authorization: Bearer <token>` header, or None.
     """
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            uid = request.headers.get('X-User-Id') \
-                  or request.headers.get('X-User-Email')
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith(BEARER):
+        return auth_header[len(BEARER):].strip()
+    return None
 
-            if not uid:
-                body = request.get_json(force=True, silent=True) or {}
-                uid = body.get('caller_id') or body.get(
-                    ppl.ID) or body.get(ppl.EMAIL)
 
-            if not uid:
-                uid = request.args.get(ppl.ID) or request.args.get(ppl.EMAIL)
+def caller_id() -> str:
+    """
+    Who is making this request, for the record: the subject of a valid
+    bearer token, else the X-User-Id or X-User-Email header, else None.
+    Not a check; use requires_permission to enforce anything.
+    """
+    token = bearer_token()
+    if token:
+        try:
+            return tok.verify(token)[tok.SUB]
+        except ValueError:
+            return None
+    return request.headers.get('X-User-Id') \
+        or request.headers.get('X-User-Email')
+
 
-            if not uid:
-                uid = kwargs.get(ppl.ID)
+def current_caller() -> dict:
+    """
+    The caller requires_permission identified for this request: their
+    person record, or for a token caller the token's id, email and
+    roles. None outside a protected view.
+    """
+    return g.get('caller')
 
-            if not uid:
-                raise Forbidden('Missing caller identity.')
 
-            user = ppl.read_one(uid)
-            if not user:
-                raise Forbidden('User not found.')
+def requires_permission(feature: str, action: str, roles=None):
+    """
+    Enforce that the caller exists and, if roles are specified,
+    has at least one of them.
+    A caller with a bearer token is taken from the token, without a DB
+    lookup. Otherwise the caller is identified via header/body/query/path
+    and looked up. Either way the view can get them from current_caller().
+    """
+    required = rls.mask_of(roles or [])
 
-            if roles and not set(user.get(ppl.ROLES, [])).intersection(roles):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = bearer_token()
+            if token:
+                try:
+                    claims = tok.verify(token)
+                except ValueError as err:
+                    raise Unauthorized(str(err))
+                uid = claims[tok.SUB]
+                mask = claims[tok.ROLE_MASK]
+                user = {ppl.ID: uid, ppl.EMAIL: claims[ppl.EMAIL],
+                        ppl.ROLES: claims[ppl.ROLES], ppl.ROLE_MASK: mask}
+            else:
+                uid, user = _lookup_caller(kwargs)
+                mask = ppl.role_mask(user)
+
+            if roles and not rls.has_any(mask, required):
                 raise Forbidden(f'User {uid} lacks required roles: {roles}')
 
+            g.caller = user
             return fn(*args, **kwargs)
         return wrapper
     return decorator
+
+
+def _lookup_caller(view_kwargs: dict):
+    """
+    Identify a caller without a token, and return (uid, person record).
+    """
+    uid = request.headers.get('X-User-Id') \
+        or request.headers.get('X-User-Email')
+
+    if not uid:
+        body = request.get_json(force=True, silent=True) or {}
+        uid = body.get('caller_id') or body.get(
+            ppl.ID) or body.get(ppl.EMAIL)
+
+    if not uid:
+        uid = request.args.get(ppl.ID) or request.args.get(ppl.EMAIL)
+
+    if not uid:
+        uid = view_kwargs.get(ppl.ID)
+
+    if not uid:
+        raise Forbidden('Missing caller identity.')
+
+    user = ppl.read_one(uid)
+    if not user:
+        raise Forbidden('User not found.')
+    return uid, user
@@ -1,7 +1,11 @@
 import pytest
 import data.db_connect as dbc
 import data.people as ppl
-from security.auth import register_user, authenticate_user
+from unittest.mock import patch
+
+import security.auth as auth
+from security.auth import register_user, authenticate_user, TOKEN
+import security.tokens as tok
 
 TEST_USER = "test_user@example.com"
 TEST_PASSWORD = "mypassword"
@@ -76,3 +80,57 @@ def test_authenticate_non_existent_user():
     """
     result = authenticate_user(INVALID_USER, INVALID_PASSWORD)
     assert result is None, "Expected None for non-existent user"
+
+
+def test_authenticate_non_existent_user_hashes():
+    """
+    An unknown user costs a hash too, so timing doesn't give it away.
+    """
+    with patch('security.auth.check_password',
+               wraps=auth.check_password) as mock_check:
+        assert authenticate_user(INVALID_USER, INVALID_PASSWORD) is None
+    mock_check.assert_called_once_with(INVALID_PASSWORD, auth.dummy_hash())
+
+
+def test_authenticate_user_issues_token(temp_user):
+    result = authenticate_user(TEST_USER, TEST_PASSWORD)
+    claims = tok.verify(result[TOKEN])
+    assert claims[tok.SUB] == result[ppl.ID]
+
+
+def test_password_stored_hashed(temp_user):
+    stored = ppl.read_one(temp_user)[auth.PASSWORD]
+    assert stored != TEST_PASSWORD
+    assert auth.is_hashed(stored)
+    assert not auth.needs_rehash(stored)
+
+
+def test_check_password():
+    stored = auth.hash_password(TEST_PASSWORD)
+    assert auth.check_password(TEST_PASSWORD, stored)
+    assert not auth.check_password(INVALID_PASSWORD, stored)
+
+
+def test_plaintext_password_rehashed_on_login(temp_user):
+    dbc.update(ppl.PEOPLE_COLLECT, {ppl.EMAIL: temp_user},
+               {auth.PASSWORD: TEST_PASSWORD})
+    ppl.invalidate(temp_user)
+    assert authenticate_user(temp_user, TEST_PASSWORD)
+    stored = ppl.read_one(temp_user)[auth.PASSWORD]
+    assert auth.is_hashed(stored)
+    assert authenticate_user(temp_user, TEST_PASSWORD)
+
+
+def test_cost_change_rehashed_on_login(temp_user):
+    old = ppl.read_one(temp_user)[auth.PASSWORD]
+    with patch('security.auth.SCRYPT_N', 2 ** 10):
+        assert auth.needs_rehash(old)
+        assert authenticate_user(temp_user, TEST_PASSWORD)
+    assert ppl.read_one(temp_user)[auth.PASSWORD].startswith('scrypt$1024$')
+
+
+def test_busy():
+    slots = auth._hash_slots
+    with patch.object(slots, 'acquire', return_value=False):
+        with pytest.raises(auth.AuthBusy):
+            auth.run_hashing(auth.hash_password, TEST_PASSWORD)
@@ -0,0 +1,94 @@
+import pytest
+
+import security.rate_limit as rl
+
+KEY = 'ip:10.0.0.1'
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def limiter(request, tmp_path):
+    if request.param == 'sqlite':
+        return rl.make_limiter(1, 3, shared_db=str(tmp_path / 'rl.db'))
+    return rl.make_limiter(1, 3, shared_db=None)
+
+
+def test_burst_then_refused(limiter):
+    assert [limiter.hit(KEY, now=100) for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit(KEY, now=100) == pytest.approx(1)
+
+
+def test_refill(limiter):
+    for _ in range(3):
+        limiter.hit(KEY, now=100)
+    assert limiter.hit(KEY, now=100.5) == pytest.approx(0.5)
+    assert limiter.hit(KEY, now=101.1) == 0
+
+
+def test_refill_capped_at_burst(limiter):
+    limiter.hit(KEY, now=100)
+    assert [limiter.hit(KEY, now=1000) for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit(KEY, now=1000) > 0
+
+
+def test_keys_independent(limiter):
+    for _ in range(4):
+        limiter.hit(KEY, now=100)
+    assert limiter.hit('ip:10.0.0.2', now=100) == 0
+
+
+def test_sqlite_shared(tmp_path):
+    path = str(tmp_path / 'rl.db')
+    first = rl.SqliteRateLimiter(path, 1, 2)
+    second = rl.SqliteRateLimiter(path, 1, 2)
+    assert first.hit(KEY, now=100) == 0
+    assert second.hit(KEY, now=100) == 0
+    assert first.hit(KEY, now=100) > 0
+
+
+def test_memory_bounded():
+    limiter = rl.RateLimiter(1, 3, max_keys=2)
+    for i in range(5):
+        limiter.hit(f'ip:{i}', now=100)
+    assert len(limiter._buckets) == 2
+
+
+def test_peek_takes_nothing(limiter):
+    for _ in range(3):
+        assert limiter.peek(KEY, now=100) == 0
+    assert limiter.hit(KEY, now=100) == 0
+
+
+def test_hit_all_refused_costs_nothing():
+    ip_limiter = rl.RateLimiter(1, 3)
+    user_limiter = rl.RateLimiter(1, 1)
+    limits = [(ip_limiter, KEY), (user_limiter, 'user:someone')]
+    assert rl.hit_all(limits, now=100) == 0
+    for _ in range(5):
+        assert rl.hit_all(limits, now=100) > 0
+    # Only the allowed request was charged to the IP.
+    assert ip_limiter.peek(KEY, now=100) == 0
+    assert [ip_limiter.hit(KEY, now=100) for _ in range(2)] == [0, 0]
+
+
+def test_sqlite_rolls_back_on_error(tmp_path, monkeypatch):
+    limiter = rl.SqliteRateLimiter(str(tmp_path / 'rl.db'), 1, 3)
+    limiter.hit(KEY, now=100)
+
+    def broken(*args):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(rl, '_take', broken)
+    with pytest.raises(RuntimeError):
+        limiter.hit(KEY, now=100)
+    monkeypatch.undo()
+    # No transaction was left open, and nothing was spent.
+    assert [limiter.hit(KEY, now=100) for _ in range(2)] == [0, 0]
+    assert limiter.hit(KEY, now=100) > 0
+
+
+def test_sqlite_prunes_idle_buckets(tmp_path):
+    limiter = rl.SqliteRateLimiter(str(tmp_path / 'rl.db'), 1, 3)
+    limiter.hit('ip:idle', now=100)
+    limiter.hit(KEY, now=100 + rl.PRUNE_INTERVAL + 10)
+    keys = [row[0] for row in limiter._connect().execute(
+        'SELECT key FROM buckets')]
+    assert keys == [KEY]
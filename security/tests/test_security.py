@@ -1,8 +1,21 @@
+from unittest.mock import patch
+
 import pytest
+from pymongo.errors import PyMongoError
 
+import data.db_connect as dbc
 import security.security as sec
 
 
+@pytest.fixture
+def test_recs(monkeypatch):
+    """
+    Put TEST_RECS in force, in memory only.
+    """
+    monkeypatch.setattr(sec, 'snapshot', sec.Snapshot(
+        0, sec.TEST_RECS, sec.compile_recs(sec.TEST_RECS)))
+
+
 def test_check_login_good():
     assert sec.check_login(sec.GOOD_USER_ID,
                            login_key='any key will do for now')
@@ -37,11 +50,90 @@ def test_is_permitted_bad_user():
     assert not sec.is_permitted(sec.PEOPLE, sec.CREATE, 'non-existent user')
 
 
-def test_is_permitted_bad_check():
+def test_is_permitted_bad_check(test_recs):
     with pytest.raises(ValueError):
         sec.is_permitted(sec.BAD_FEATURE, sec.CREATE, sec.GOOD_USER_ID)
 
 
 def test_is_permitted_all_good():
     assert sec.is_permitted(sec.PEOPLE, sec.CREATE, sec.GOOD_USER_ID,
-                            login_key='any key for now')
\ No newline at end of file
+                            login_key='any key for now')
+
+def test_compile_recs():
+    compiled = sec.compile_recs(sec.TEST_RECS)
+    rule = compiled[(sec.PEOPLE, sec.CREATE)]
+    assert sec.GOOD_USER_ID in rule.users
+    assert rule.checks == (sec.check_login,)
+    assert rule.error is None
+
+
+def test_compile_recs_bad_check():
+    compiled = sec.compile_recs(sec.TEST_RECS)
+    assert compiled[(sec.BAD_FEATURE, sec.CREATE)].error
+
+
+def test_compiled_recs_frozen():
+    compiled = sec.compile_recs(sec.TEST_RECS)
+    with pytest.raises(TypeError):
+        compiled[(sec.PEOPLE, sec.CREATE)] = None
+
+
+def test_get_compiled_cached():
+    assert sec.get_compiled() is sec.get_compiled()
+
+
+def test_load_seeds_db():
+    snap = sec.load()
+    assert snap.version >= 1
+    assert sec.PEOPLE in snap.recs
+    assert sec.read() == snap.recs
+
+
+def test_load_seeds_defaults(monkeypatch):
+    old = sec.load()
+    monkeypatch.setattr(sec, 'snapshot', None)
+    dbc.delete(sec.COLLECT_NAME, {dbc.MONGO_ID: sec.SECURITY_ID})
+    try:
+        snap = sec.load()
+        assert snap.recs == sec.DEFAULT_RECS
+        assert sec.BAD_FEATURE not in snap.recs
+    finally:
+        sec.save(old.recs)
+
+
+def test_load_db_down_keeps_snapshot():
+    old = sec.load()
+    with patch.object(dbc, 'read_one', side_effect=PyMongoError('down')):
+        assert sec.load() is old
+    assert sec.get_snapshot() is old
+
+
+def test_load_db_down_first_time(monkeypatch):
+    monkeypatch.setattr(sec, 'snapshot', None)
+    with patch.object(dbc, 'read_one', side_effect=PyMongoError('down')):
+        with pytest.raises(PyMongoError):
+            sec.load()
+    assert sec.snapshot is None
+
+
+def test_read_returns_copy():
+    recs = sec.read()
+    recs[sec.PEOPLE] = {}
+    assert sec.read()[sec.PEOPLE]
+
+
+def test_save_and_reload():
+    old = sec.load()
+    recs = sec.read()
+    recs[sec.PEOPLE][sec.CREATE][sec.USER_LIST] = ['someone@nyu.edu']
+    try:
+        new_version = sec.save(recs)
+        assert new_version == old.version + 1
+        assert sec.is_permitted(sec.PEOPLE, sec.CREATE, 'someone@nyu.edu',
+                                login_key='any key for now')
+        assert not sec.reload_if_changed()
+        sec.snapshot = old  # as if another worker had saved
+        assert sec.reload_if_changed()
+        assert sec.get_snapshot().version == new_version
+    finally:
+        sec.save(old.recs)
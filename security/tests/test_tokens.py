@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+import pytest
+
+import data.people as ppl
+import security.tokens as tok
+
+USER_ID = 'some-user-id'
+EMAIL = 'tok@nyu.edu'
+ROLES = ['ED']
+PERSON = {ppl.ID: USER_ID, ppl.EMAIL: EMAIL, ppl.ROLES: ROLES,
+          ppl.TOKEN_VERSION: 3}
+
+
+def test_issue_verify():
+    claims = tok.verify(tok.issue(USER_ID, EMAIL, ROLES, 3))
+    assert claims[tok.SUB] == USER_ID
+    assert claims[ppl.EMAIL] == EMAIL
+    assert claims[ppl.ROLES] == ROLES
+    assert claims[tok.VER] == 3
+
+
+def test_verify_tampered():
+    token = tok.issue(USER_ID, EMAIL, ROLES)
+    payload, signature = token.split('.')
+    forged = tok.issue(USER_ID, EMAIL, ['ED', 'ME']).split('.')[0]
+    with pytest.raises(ValueError):
+        tok.verify(f'{forged}.{signature}')
+
+
+def test_verify_malformed():
+    with pytest.raises(ValueError):
+        tok.verify('not a token')
+
+
+def test_verify_non_ascii_signature():
+    payload = tok.issue(USER_ID, EMAIL, ROLES).split('.')[0]
+    with pytest.raises(ValueError):
+        tok.verify(f'{payload}.\u00e9\u4e2d')
+
+
+def test_verify_expired():
+    with pytest.raises(ValueError):
+        tok.verify(tok.issue(USER_ID, EMAIL, ROLES, ttl=-1))
+
+
+@patch('data.people.read_one', autospec=True,
+       return_value=dict(PERSON, roles=['ED', 'ME']))
+def test_refresh(mock_read_one):
+    old = tok.issue(USER_ID, EMAIL, ROLES, 3, ttl=-1)
+    claims = tok.verify(tok.refresh(old))
+    assert claims[ppl.ROLES] == ['ED', 'ME']
+    mock_read_one.assert_called_once_with(USER_ID)
+
+
+@patch('data.people.read_one', autospec=True, return_value=PERSON)
+def test_refresh_revoked(mock_read_one):
+    with pytest.raises(ValueError):
+        tok.refresh(tok.issue(USER_ID, EMAIL, ROLES, 2))
+
+
+@patch('data.people.read_one', autospec=True, return_value=None)
+def test_refresh_no_user(mock_read_one):
+    with pytest.raises(ValueError):
+        tok.refresh(tok.issue(USER_ID, EMAIL, ROLES, 3))
+
+
+def test_load_secret_from_env():
+    assert tok.load_secret({'JOURNAL_TOKEN_SECRET': 'shh'}) == b'shh'
+
+
+def test_load_secret_required_in_production():
+    with pytest.raises(ValueError):
+        tok.load_secret({})
+    with pytest.raises(ValueError):
+        tok.load_secret({'JOURNAL_ENV': tok.PRODUCTION})
+
+
+def test_load_secret_random_in_dev():
+    first = tok.load_secret({'JOURNAL_ENV': 'test'})
+    assert len(first) == 32
+    assert first != tok.load_secret({'JOURNAL_ENV': 'development'})
@@ -0,0 +1,151 @@
+"""
+Signed session tokens.
+
+A token is `<payload>.<signature>`, both base64url without padding.
+The payload is JSON claims:
+    sub: the user's id
+    email, roles: copied from the person record at issue time
+    rm: the roles as a bitmask (see data.roles.ROLE_BITS)
+    ver: the person's token version at issue time
+    iat, exp: issue and expiry times (epoch seconds)
+and the signature is HMAC-SHA256 of the payload with TOKEN_SECRET.
+
+verify() needs no DB access, so a token is trusted until it expires:
+revoking one (a role change bumps the person's token version) does not
+stop it working before then. Tokens are kept short-lived instead, at
+most TOKEN_TTL; refresh() re-reads the person and refuses tokens whose
+version is stale, so a revocation takes effect by the next refresh.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+import data.people as ppl
+import data.roles as rls
+
+SUB = 'sub'
+ROLE_MASK = 'rm'
+VER = 'ver'
+IAT = 'iat'
+EXP = 'exp'
+
+TOKEN_TTL = int(os.environ.get('JOURNAL_TOKEN_TTL', 15 * 60))  # seconds
+# How long after issue an (expired) token may still be refreshed:
+REFRESH_WINDOW = int(os.environ.get('JOURNAL_TOKEN_REFRESH_WINDOW',
+                                    7 * 24 * 60 * 60))
+
+PRODUCTION = 'production'
+# Where a random per-process secret is good enough.
+DEV_ENVS = ('development', 'test')
+
+
+def load_secret(environ=os.environ) -> bytes:
+    """
+    The signing secret, from JOURNAL_TOKEN_SECRET. It must be set unless
+    JOURNAL_ENV (default production) is one of DEV_ENVS, as a random
+    secret would make tokens fail across workers and restarts.
+    """
+    secret = environ.get('JOURNAL_TOKEN_SECRET', '').encode()
+    if secret:
+        return secret
+    if environ.get('JOURNAL_ENV', PRODUCTION) not in DEV_ENVS:
+        raise ValueError('You must set JOURNAL_TOKEN_SECRET, the same on '
+                         'every worker, to issue session tokens.')
+    print('JOURNAL_TOKEN_SECRET is not set: using a random secret. '
+          'Tokens will not be valid across workers or restarts.')
+    return secrets.token_bytes(32)
+
+
+TOKEN_SECRET = load_secret()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(TOKEN_SECRET, payload.encode(),
+                               hashlib.sha256).digest())
+
+
+def issue(user_id: str, email: str, roles: list, version: int = 0,
+          ttl: int = None) -> str:
+    now = int(time.time())
+    claims = {
+        SUB: user_id,
+        ppl.EMAIL: email,
+        ppl.ROLES: list(roles),
+        ROLE_MASK: rls.mask_of(roles),
+        VER: version,
+        IAT: now,
+        EXP: now + (TOKEN_TTL if ttl is None else ttl),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':'))
+                         .encode())
+    return f'{payload}.{_sign(payload)}'
+
+
+def issue_for(person: dict) -> str:
+    """
+    Issue a token for a person record.
+    """
+    return issue(person[ppl.ID], person[ppl.EMAIL],
+                 person.get(ppl.ROLES, []),
+                 person.get(ppl.TOKEN_VERSION, 0))
+
+
+def decode(token: str) -> dict:
+    """
+    Check the signature and return the claims, expired or not.
+    Raise ValueError if the token is malformed or was tampered with.
+    """
+    try:
+        payload, signature = token.split('.')
+    except (AttributeError, ValueError):
+        raise ValueError('Malformed token.')
+    # compare_digest() only takes ASCII strs; headers may be latin-1.
+    if not hmac.compare_digest(signature.encode('latin-1', 'replace'),
+                               _sign(payload).encode()):
+        raise ValueError('Bad token signature.')
+    try:
+        return json.loads(_b64decode(payload))
+    except ValueError:
+        raise ValueError('Malformed token.')
+
+
+def verify(token: str) -> dict:
+    """
+    Return the claims of a valid, unexpired token; raise ValueError if
+    it isn't one. No DB access, so a revoked token passes until it
+    expires; see refresh().
+    """
+    claims = decode(token)
+    if claims[EXP] < time.time():
+        raise ValueError('Token expired.')
+    return claims
+
+
+def refresh(token: str) -> str:
+    """
+    Swap a token, expired or not, for a fresh one carrying the person's
+    current roles. Raise ValueError if the token is past the refresh
+    window, its person is gone, or their token version moved on
+    (e.g. a role was added or removed).
+    """
+    claims = decode(token)
+    if claims[IAT] + REFRESH_WINDOW < time.time():
+        raise ValueError('Token too old to refresh.')
+    person = ppl.read_one(claims[SUB])
+    if not person:
+        raise ValueError('No such user.')
+    if person.get(ppl.TOKEN_VERSION, 0) != claims[VER]:
+        raise ValueError('Token revoked.')
+    return issue_for(person)
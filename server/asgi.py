@@ -0,0 +1,296 @@
+"""
+ASGI serving mode for the journal API.
+
+Run it with an ASGI server, e.g.:
+    uvicorn server.asgi:app --workers 2
+
+Requests are routed with the Flask app's own URL map, so both modes
+expose exactly the same routes. Hot read-only routes (NATIVE_HANDLERS)
+are served on the async Mongo driver and don't hold a thread while
+waiting on Mongo. Every other request is handed to the Flask app on a
+bounded thread pool. A native handler that finds nothing raises the
+same werkzeug error as the Flask view; that error is rendered by the
+Flask app's own error handling, without running the view (and its
+query) again, so error payloads stay identical.
+"""
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import werkzeug.exceptions as wz
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_accept_header
+from werkzeug.routing import RequestRedirect
+
+import data.aio.comment as acmt
+import data.aio.manuscript as ams
+import data.aio.people as appl
+import data.aio.text as atxt
+import data.db_connect_async as adbc
+import server.compression as cpr
+import server.endpoints as ep
+
+WSGI_THREADS = 16
+JSON_CONTENT_TYPE = b'application/json'
+
+_wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS,
+                                thread_name_prefix='wsgi')
+_url_adapter = ep.app.url_map.bind('localhost')
+
+
+async def _people_list(query):
+    return await appl.read()
+
+
+async def _people_get_all(query):
+    return await appl.get_all_people()
+
+
+async def _person_detail(query, user_id):
+    person = await appl.read_one(user_id)
+    if not person:
+        raise wz.NotFound(f'No such person: {user_id}')
+    return person
+
+
+async def _person(query, email):
+    person = await appl.read_one(email)
+    if not person:
+        raise wz.NotFound(f'No such record: {email}')
+    return person
+
+
+async def _masthead(query):
+    return {ep.MASTHEAD: await appl.get_masthead()}
+
+
+async def _texts(query):
+    return await atxt.read()
+
+
+async def _text(query, page_number):
+    text = await atxt.read_one(page_number)
+    if not text:
+        raise wz.NotFound(f'No such page: {page_number}')
+    return text
+
+
+async def _manuscripts(query):
+    title = query.get('title')
+    if title:
+        return await ams.search_by_title(title)
+    return await ams.read()
+
+
+async def _manuscript(query, manu_id):
+    manu = await ams.read_one_json(manu_id)
+    if not manu:
+        raise wz.NotFound(f'No such manuscript with _id: {manu_id}')
+    return manu
+
+
+async def _comments(query):
+    return await acmt.read_all()
+
+
+async def _comment(query, comment_id):
+    comment = await acmt.read_one_json(comment_id)
+    if not comment:
+        raise wz.NotFound(f'No such comment with ID: {comment_id}')
+    return comment
+
+
+async def _comments_by_manuscript(query, manuscript_id):
+    return await acmt.read_by_manuscript(manuscript_id)
+
+
+async def _comments_by_editor(query, editor_id):
+    return await acmt.read_by_editor(editor_id)
+
+
+# (resource class, method) -> async handler.
+# A handler returns the payload (a JSON string is sent as is),
+# or raises the werkzeug error its Flask view would raise.
+NATIVE_HANDLERS = {
+    (ep.PeopleList, 'GET'): _people_list,
+    (ep.PeopleGetAll, 'GET'): _people_get_all,
+    (ep.PersonDetail, 'GET'): _person_detail,
+    (ep.Person, 'GET'): _person,
+    (ep.Masthead, 'GET'): _masthead,
+    (ep.Texts, 'GET'): _texts,
+    (ep.Text, 'GET'): _text,
+    (ep.Manuscripts, 'GET'): _manuscripts,
+    (ep.Manuscript, 'GET'): _manuscript,
+    (ep.Comments, 'GET'): _comments,
+    (ep.CommentDetail, 'GET'): _comment,
+    (ep.CommentsByManuscript, 'GET'): _comments_by_manuscript,
+    (ep.CommentsByEditor, 'GET'): _comments_by_editor,
+}
+
+
+def match_native(method: str, path: str):
+    """
+    Return (handler, view_args) for a natively served route,
+    or (None, None) if the Flask app should handle the request.
+    """
+    try:
+        endpoint, view_args = _url_adapter.match(path, method)
+    except (HTTPException, RequestRedirect):
+        return None, None
+    view_class = getattr(ep.app.view_functions[endpoint], 'view_class',
+                         None)
+    handler = NATIVE_HANDLERS.get((view_class, method))
+    if handler is None:
+        return None, None
+    return handler, view_args
+
+
+def _headers_dict(scope) -> dict:
+    return {name.decode('latin1'): value.decode('latin1')
+            for name, value in scope['headers']}
+
+
+def _encode(payload, headers: dict):
+    """
+    Encode a payload the way the Flask app would, compression included.
+    Return (body, response header list).
+    """
+    if isinstance(payload, str):
+        body = payload.encode()
+    else:
+        body = (json.dumps(payload) + '\n').encode()
+    out_headers = [(b'content-type', JSON_CONTENT_TYPE),
+                   (b'vary', b'Accept-Encoding')]
+    if 'origin' in headers:
+        out_headers.append((b'access-control-allow-origin', b'*'))
+    config = ep.app.config
+    encoding = parse_accept_header(headers.get('accept-encoding')) \
+        .best_match(cpr.supported_encodings())
+    if encoding and len(body) >= config[cpr.MIN_SIZE]:
+        level = cpr.level_for(config, encoding, len(body))
+        body = cpr.get_cache(ep.app).get_or_compress(body, encoding, level)
+        out_headers.append((b'content-encoding', encoding.encode()))
+    out_headers.append((b'content-length', str(len(body)).encode()))
+    return body, out_headers
+
+
+def _wsgi_environ(scope, body: bytes) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in _headers_dict(scope).items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    # The body is already buffered, so its length is known even when
+    # the client sent it chunked.
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def _error_app(error: HTTPException):
+    """
+    A WSGI app answering with the Flask app's response to error,
+    as if its view had raised it.
+    """
+    def wsgi(environ, start_response):
+        with ep.app.request_context(environ):
+            response = ep.app.finalize_request(
+                ep.app.handle_user_exception(error))
+        return response(environ, start_response)
+    return wsgi
+
+
+def _run_wsgi(environ: dict, wsgi_app=ep.app):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    status, headers = started
+    return int(status.split()[0]), headers, body
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send(send, status: int, headers: list, body: bytes):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _call_wsgi(scope, body: bytes, send, wsgi_app=ep.app):
+    loop = asyncio.get_running_loop()
+    status, headers, out = await loop.run_in_executor(
+        _wsgi_pool, _run_wsgi, _wsgi_environ(scope, body), wsgi_app)
+    await _send(send, status,
+                [(name.lower().encode('latin1'), value.encode('latin1'))
+                 for name, value in headers],
+                out)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            adbc.connect_db()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await adbc.close_db()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    body = await _read_body(receive)
+    handler, view_args = match_native(scope['method'], scope['path'])
+    if handler is not None:
+        query = {key: vals[0] for key, vals in parse_qs(
+            scope.get('query_string', b'').decode()).items()}
+        adbc.connect_db()
+        try:
+            payload = await handler(query, **view_args)
+        except HTTPException as err:
+            return await _call_wsgi(scope, body, send, _error_app(err))
+        out, headers = _encode(payload, _headers_dict(scope))
+        return await _send(send, HTTPStatus.OK, headers, out)
+    await _call_wsgi(scope, body, send)
@@ -0,0 +1,242 @@
+"""
+Response compression for the journal API.
+
+Negotiates `Accept-Encoding` and compresses response bodies with brotli
+(when the optional `brotli` package is installed) or gzip.
+Small bodies are sent as is, streamed responses are compressed chunk by
+chunk, and compressed bodies are kept in an LRU cache bounded in bytes
+so that hot payloads (e.g. the manuscript listing, up to
+COMPRESS_CACHE_MAX_BODY) are only compressed once. Bodies over
+COMPRESS_LARGE_SIZE are compressed at a faster, lower level.
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+# app.config keys:
+LEVEL = 'COMPRESS_LEVEL'
+BR_QUALITY = 'COMPRESS_BR_QUALITY'
+MIN_SIZE = 'COMPRESS_MIN_SIZE'
+CACHE_BYTES = 'COMPRESS_CACHE_BYTES'  # total compressed bytes kept
+CACHE_MAX_BODY = 'COMPRESS_CACHE_MAX_BODY'  # bigger bodies aren't cached
+LARGE_SIZE = 'COMPRESS_LARGE_SIZE'  # bigger bodies use the LARGE_ levels
+LARGE_LEVEL = 'COMPRESS_LARGE_LEVEL'
+LARGE_BR_QUALITY = 'COMPRESS_LARGE_BR_QUALITY'
+MIMETYPES = 'COMPRESS_MIMETYPES'
+
+DEFAULTS = {
+    LEVEL: 6,
+    BR_QUALITY: 5,
+    MIN_SIZE: 1024,
+    CACHE_BYTES: 32 * 1024 * 1024,
+    CACHE_MAX_BODY: 16 * 1024 * 1024,
+    LARGE_SIZE: 1024 * 1024,
+    LARGE_LEVEL: 1,
+    LARGE_BR_QUALITY: 1,
+    MIMETYPES: frozenset([
+        'application/json',
+        'text/html',
+        'text/plain',
+        'text/css',
+        'application/javascript',
+    ]),
+}
+
+# e.g. JOURNAL_COMPRESS_LEVEL=9 overrides COMPRESS_LEVEL; see load_env().
+ENV_PREFIX = 'JOURNAL_'
+EXTENSION_NAME = 'compression'
+GZIP_WBITS = 31  # makes zlib write a gzip header and trailer
+NO_BODY_STATUSES = (204, 304)
+
+
+def supported_encodings() -> list:
+    """
+    Encodings we can produce, in order of preference.
+    """
+    return [BROTLI, GZIP] if brotli else [GZIP]
+
+
+def level_for(config, encoding: str, size: int = None) -> int:
+    """
+    The compression level for a body of size bytes (None if unknown,
+    e.g. when streaming).
+    """
+    large = size is not None and size > config[LARGE_SIZE]
+    if encoding == BROTLI:
+        return config[LARGE_BR_QUALITY] if large else config[BR_QUALITY]
+    return config[LARGE_LEVEL] if large else config[LEVEL]
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_stream(chunks, encoding: str, level: int):
+    """
+    Compress an iterable of byte chunks incrementally.
+    Every chunk is flushed so the client can decode it on arrival.
+    """
+    if encoding == BROTLI:
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+        for chunk in chunks:
+            out = compressor.compress(chunk) \
+                + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+class CompressionCache:
+    """
+    A thread-safe LRU cache of compressed bodies keyed by
+    (encoding, level, digest of the uncompressed body), holding at most
+    max_bytes of compressed data. Bodies over max_body bytes are
+    compressed without being hashed or kept.
+    """
+    def __init__(self, max_bytes: int, max_body: int):
+        self.max_bytes = max_bytes
+        self.max_body = max_body
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, body: bytes, encoding: str,
+                        level: int) -> bytes:
+        if self.max_bytes <= 0 or len(body) > self.max_body:
+            return compress(body, encoding, level)
+        key = (encoding, level, hashlib.blake2b(body).digest())
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        compressed = compress(body, encoding, level)
+        if len(compressed) > self.max_bytes:
+            return compressed
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = compressed
+            self._bytes += len(compressed)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+def _choose_encoding():
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def _is_compressible(response, config) -> bool:
+    return (
+        200 <= response.status_code
+        and response.status_code not in NO_BODY_STATUSES
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype in config[MIMETYPES]
+    )
+
+
+def compress_response(response):
+    """
+    `after_request` hook: compress the response if the client accepts it.
+    """
+    config = current_app.config
+    if not _is_compressible(response, config):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(),
+                                            encoding,
+                                            level_for(config, encoding))
+        response.headers.remove('Content-Length')
+    else:
+        body = response.get_data()
+        if len(body) < config[MIN_SIZE]:
+            return response
+        cache = current_app.extensions[EXTENSION_NAME]
+        response.set_data(cache.get_or_compress(
+            body, encoding, level_for(config, encoding, len(body))))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def load_env(config, environ=os.environ):
+    """
+    Set the compression settings (the DEFAULTS keys, and no others)
+    from JOURNAL_-prefixed environment variables. Values are parsed as
+    JSON where they can be, as Flask's from_prefixed_env() does.
+    """
+    for key in DEFAULTS:
+        value = environ.get(ENV_PREFIX + key)
+        if value is None:
+            continue
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+
+
+def init_app(app):
+    """
+    Install response compression on a Flask app.
+    Settings are read from `app.config`; see DEFAULTS and load_env().
+    """
+    for key, val in DEFAULTS.items():
+        app.config.setdefault(key, val)
+    app.extensions[EXTENSION_NAME] = CompressionCache(
+        app.config[CACHE_BYTES], app.config[CACHE_MAX_BODY])
+    app.after_request(compress_response)
+    return app
+
+
+def get_cache(app) -> CompressionCache:
+    return app.extensions[EXTENSION_NAME]
@@ -2,21 +2,29 @@
 This is the file containing all of the endpoints for our flask app.
 The endpoint called `endpoints` will return all available endpoints.
 """
+import hashlib
+import json
 from http import HTTPStatus
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_restx import Resource, Api, fields  # Namespace, fields
 from flask_cors import CORS
 
 import werkzeug.exceptions as wz
 
+import data.analytics as anl
 import data.people as ppl
 import data.roles as rls
 import data.text as txt
 import data.manuscript as ms
+import data.manuscript_events as mev
+import data.manuscript_revisions as mrev
 import security.auth as auth
+import security.rate_limit as rl
 import security.security as sec
+import security.tokens as tok
 import data.comment as cmt
+import server.compression as cpr
 
 from datetime import datetime
 import platform
@@ -31,6 +39,12 @@ CONFIG = {
 
 app = Flask(__name__)
 CORS(app)
+cpr.load_env(app.config)
+cpr.init_app(app)
+# Load security records off the request path and keep them fresh.
+sec.start_reloader()
+# Once here, rather than on every people read.
+ppl.ensure_indexes()
 
 ENDPOINT_EP = '/endpoints'
 ENDPOINT_RESP = 'Available endpoints'
@@ -50,6 +64,8 @@ EDITOR_RESP = 'Editor'
 PUBLISHER = 'MisteryForceFromEast'
 PUBLISHER_RESP = 'Publisher'
 
+JSON_MIMETYPE = 'application/json'
+
 MESSAGE = 'message'
 RETURN = 'return'
 ERROR = 'error'
@@ -65,6 +81,12 @@ MANUSCRIPT_EP = '/manuscript'
 ACTION = 'action'
 REFEREE = 'referee'
 
+# paging and time range query args
+LIMIT = 'limit'
+CURSOR = 'cursor'
+START = 'start'
+END = 'end'
+
 AUTH_EP = '/auth'
 
 USERNAME = 'username'
@@ -72,6 +94,8 @@ PASSWORD = 'password'
 
 DEV_EP = '/dev'
 
+ANALYTICS_EP = '/analytics'
+
 COMMENT_EP = '/comment'
 
 authorizations = {
@@ -80,7 +104,13 @@ authorizations = {
         'in': 'header',
         'name': 'X-User-Id',
         'description': 'Your user UUID or email (must have ED/ME roles)'
-    }
+    },
+    'BearerToken': {
+        'type': 'apiKey',
+        'in': 'header',
+        'name': 'Authorization',
+        'description': "'Bearer <token>', with the token from /auth/login"
+    },
 }
 
 api = Api(
@@ -89,7 +119,7 @@ api = Api(
     title='My Journal API',
     description='API for journal management',
     authorizations=authorizations,
-    security='ApiKeyHeader'
+    security=['ApiKeyHeader', 'BearerToken']
 )
 
 
@@ -262,12 +292,13 @@ PEOPLE_CREATE_FLDS = api.model('AddNewPeopleEntry', {
 class PersonCreate(Resource):
     @api.expect(PEOPLE_CREATE_FLDS)
     def post(self):
-        all_people = ppl.read()
-        if all_people:
+        # Anyone may create the first person (seeding);
+        # after that only editors may add people.
+        if not ppl.is_empty():
             caller = request.headers.get('X-User-Id')
             user = ppl.read_one(caller) if caller else None
-            if not user or not set(
-                    user.get('roles', [])).intersection({'ED', 'ME', 'CE'}):
+            if not user or not rls.has_any(ppl.role_mask(user),
+                                           rls.MH_MASK):
                 raise wz.Forbidden(
                     'Only ED/ME may add new people once seeded')
         return ppl.create(
@@ -396,6 +427,40 @@ class Text(Resource):
             raise wz.NotFound(f'No such text: {page_number}')
 
 
+@api.route(f'{TEXT_EP}/<page_number>/history')
+class TextHistory(Resource):
+    """
+    This class handles listing the versions of a text page.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such page.')
+    def get(self, page_number):
+        """
+        List a page's versions, newest first.
+        """
+        versions = txt.history(page_number)
+        if not versions:
+            raise wz.NotFound(f'No such page: {page_number}')
+        return versions
+
+
+@api.route(f'{TEXT_EP}/<page_number>/history/<int:version>')
+class TextVersion(Resource):
+    """
+    This class handles reading an old version of a text page.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such version.')
+    def get(self, page_number, version):
+        """
+        Retrieve one version of a page.
+        """
+        page = txt.read_version(page_number, version)
+        if not page:
+            raise wz.NotFound(f'No version {version} of page {page_number}')
+        return page
+
+
 @api.route(f'{TEXT_EP}/update')
 class TextUpdate(Resource):
     """
@@ -464,9 +529,9 @@ class Manuscript(Resource):
         """
         Retrieve a single manuscript by _id.
         """
-        manu = ms.read_one(manu_id)
+        manu = ms.read_one_json(manu_id)
         if manu:
-            return manu
+            return Response(manu, mimetype=JSON_MIMETYPE)
         else:
             raise wz.NotFound(f'No such manuscript with _id: {manu_id}')
 
@@ -493,6 +558,154 @@ MANUSCRIPT_FLDS = api.model('ManuscriptEntry', {
 })
 
 
+@api.route(f'{MANUSCRIPT_EP}/<manu_id>/revisions')
+class ManuscriptRevisions(Resource):
+    """
+    This class handles listing the revisions of a manuscript.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript.')
+    def get(self, manu_id):
+        """
+        List a manuscript's revisions, newest first.
+        """
+        revisions = mrev.list_revisions(manu_id)
+        if not revisions:
+            raise wz.NotFound(f'No revisions of manuscript: {manu_id}')
+        return revisions
+
+
+@api.route(f'{MANUSCRIPT_EP}/<manu_id>/revisions/<int:revision>')
+class ManuscriptRevision(Resource):
+    """
+    This class handles reading one revision of a manuscript.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such revision.')
+    def get(self, manu_id, revision):
+        """
+        Retrieve one revision of a manuscript, with its text.
+        """
+        rec = mrev.read(manu_id, revision)
+        if not rec:
+            raise wz.NotFound(f'No revision {revision} of {manu_id}')
+        return rec
+
+
+@api.route(f'{MANUSCRIPT_EP}/<manu_id>/diff/<int:old>/<int:new>')
+class ManuscriptDiff(Resource):
+    """
+    This class handles comparing two revisions of a manuscript.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such revision.')
+    def get(self, manu_id, old, new):
+        """
+        What changed from revision `old` to revision `new`,
+        paragraph by paragraph.
+        """
+        changes = mrev.diff(manu_id, old, new)
+        if not changes:
+            raise wz.NotFound(f'No revisions {old} and {new} of {manu_id}')
+        return changes
+
+
+def page_args(default_limit: int = mev.PAGE_SIZE) -> tuple:
+    """
+    The (limit, cursor) query args of a paged endpoint.
+    """
+    try:
+        limit = int(request.args.get(LIMIT, default_limit))
+    except ValueError:
+        raise wz.BadRequest(f'{LIMIT} must be an integer.')
+    return limit, request.args.get(CURSOR)
+
+
+def time_arg(name: str) -> float:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise wz.BadRequest(f'{name} must be a time in epoch seconds.')
+
+
+@api.route(f'{MANUSCRIPT_EP}/<manu_id>/events')
+class ManuscriptEvents(Resource):
+    """
+    This class handles the state transitions of one manuscript.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.BAD_REQUEST, 'Bad limit or cursor.')
+    @api.doc(params={LIMIT: 'Events per page.',
+                     CURSOR: 'The `next` of the previous page.'})
+    def get(self, manu_id):
+        """
+        A page of a manuscript's state transitions, oldest first.
+        """
+        limit, cursor = page_args()
+        try:
+            return mev.for_manuscript(manu_id, limit, cursor)
+        except ValueError as err:
+            raise wz.BadRequest(str(err))
+
+
+@api.route(f'{MANUSCRIPT_EP}/events')
+class AllManuscriptEvents(Resource):
+    """
+    This class handles the state transitions of all manuscripts.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.BAD_REQUEST, 'Bad time range, limit or cursor.')
+    @api.doc(params={START: 'From this time (epoch seconds).',
+                     END: 'Until before this time (epoch seconds).',
+                     LIMIT: 'Events per page.',
+                     CURSOR: 'The `next` of the previous page.'})
+    def get(self):
+        """
+        A page of all state transitions in a time range, oldest first.
+        """
+        start, end = time_arg(START), time_arg(END)
+        limit, cursor = page_args()
+        try:
+            return mev.in_range(start, end, limit, cursor)
+        except ValueError as err:
+            raise wz.BadRequest(str(err))
+
+
+@api.route(f'{MANUSCRIPT_EP}/<manu_id>/time_in_state')
+class ManuscriptTimeInState(Resource):
+    """
+    This class handles how long a manuscript has spent in each state.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No events for this manuscript.')
+    def get(self, manu_id):
+        """
+        Seconds spent in each state, from the manuscript's events.
+        """
+        totals = mev.time_in_states(manu_id)
+        if not totals:
+            raise wz.NotFound(f'No events for manuscript: {manu_id}')
+        return totals
+
+
+@api.route(f'{ANALYTICS_EP}/turnaround')
+class Turnaround(Resource):
+    """
+    This class handles how long manuscripts take in each state.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    def get(self):
+        """
+        Time spent in each state, in seconds: count, mean, min, max and
+        p50/p90/p99, per (from, to) pair of states and per from-state
+        (to is "*").
+        """
+        return anl.turnaround()
+
+
 @api.route(f'{MANUSCRIPT_EP}/create')
 class ManuscriptCreate(Resource):
     """
@@ -596,10 +809,11 @@ class ManuscriptUpdateState(Resource):
             manu_id = request.json.get(ms.MANU_ID)
             action = request.json.get(ACTION)
             ref = request.json.get(REFEREE)
+            actor = sec.caller_id()
             if action == ms.ASSIGN_REF or action == ms.DELETE_REF:
-                ret = ms.update_state(manu_id, action, ref=ref)
+                ret = ms.update_state(manu_id, action, actor, ref=ref)
             else:
-                ret = ms.update_state(manu_id, action)
+                ret = ms.update_state(manu_id, action, actor)
         except Exception as err:
             raise wz.NotAcceptable(
                 f'Could not update manuscript state: {err=}')
@@ -609,6 +823,57 @@ class ManuscriptUpdateState(Resource):
         }
 
 
+MANU_IDS = 'manu_ids'
+RESULTS = 'results'
+UPDATED = 'updated'
+
+MANUSCRIPT_BULK_STATE_FLDS = api.model('ManuscriptBulkStateEntry', {
+    MANU_IDS: fields.List(fields.String, required=True),
+    ACTION: fields.String(required=True),
+})
+
+
+@api.route(f'{MANUSCRIPT_EP}/bulk_update_state')
+class ManuscriptBulkUpdateState(Resource):
+    """
+    This class handles applying one action to many manuscripts.
+    """
+    @api.response(HTTPStatus.OK, 'Success; see each result.')
+    @api.response(HTTPStatus.NOT_ACCEPTABLE, 'Not acceptable.')
+    @api.expect(MANUSCRIPT_BULK_STATE_FLDS)
+    @sec.requires_permission('manuscript', 'bulk_update_state',
+                             roles=['ED', 'ME', 'CE'])
+    def put(self):
+        """
+        Perform an action, such as reject or withdraw, on many
+        manuscripts. Each one succeeds or fails on its own.
+        """
+        payload = request.get_json(force=True)
+        manu_ids = payload.get(MANU_IDS)
+        if not isinstance(manu_ids, list):
+            raise wz.NotAcceptable(f'{MANU_IDS} must be a list.')
+        try:
+            results = ms.bulk_update_state(manu_ids, payload.get(ACTION),
+                                           sec.caller_id())
+        except ValueError as err:
+            raise wz.NotAcceptable(
+                f'Could not update manuscript states: {err}')
+        return {
+            RESULTS: results,
+            UPDATED: sum(1 for res in results.values() if res[ms.OK]),
+        }
+
+
+AUTH_RETRY_AFTER = 1  # seconds
+
+
+def busy(err) -> wz.ServiceUnavailable:
+    """
+    The 503 for a login or registration we're too busy to hash for.
+    """
+    return wz.ServiceUnavailable(str(err), retry_after=AUTH_RETRY_AFTER)
+
+
 AUTH_FIELDS = api.model('AuthFields', {
     USERNAME: fields.String(required=True),
     PASSWORD: fields.String(required=True),
@@ -622,7 +887,9 @@ AUTH_FIELDS = api.model('AuthFields', {
 class Register(Resource):
     @api.response(HTTPStatus.CREATED, 'User registered successfully.')
     @api.response(HTTPStatus.CONFLICT, 'Username already exists.')
+    @api.response(HTTPStatus.TOO_MANY_REQUESTS, 'Too many attempts.')
     @api.expect(AUTH_FIELDS)
+    @rl.limit_auth
     def post(self):
         try:
             data = request.get_json()
@@ -655,6 +922,8 @@ class Register(Resource):
                     ERROR: 'Username already exists'
                 }, HTTPStatus.CONFLICT
 
+        except auth.AuthBusy as e:
+            raise busy(e)
         except Exception as e:
             print(f'Error in registration: {e}')
             raise wz.InternalServerError(str(e))
@@ -673,19 +942,92 @@ class Login(Resource):
     """
     @api.response(HTTPStatus.OK, 'Login successful.')
     @api.response(HTTPStatus.UNAUTHORIZED, 'Invalid credentials.')
+    @api.response(HTTPStatus.SERVICE_UNAVAILABLE, 'Too busy; retry later.')
+    @api.response(HTTPStatus.TOO_MANY_REQUESTS, 'Too many attempts.')
     @api.expect(LOGIN_FIELDS)
+    @rl.limit_auth
     def post(self):
         """
         Authenticate a user.
         """
         data = request.get_json()
-        user = auth.authenticate_user(data[USERNAME], data[PASSWORD])
+        try:
+            user = auth.authenticate_user(data[USERNAME], data[PASSWORD])
+        except auth.AuthBusy as e:
+            raise busy(e)
         if user:
             return user, HTTPStatus.OK
         else:
             return {ERROR: 'Invalid credentials'}, HTTPStatus.UNAUTHORIZED
 
 
+REFRESH_FIELDS = api.model('RefreshFields', {
+    auth.TOKEN: fields.String(required=False),
+})
+
+
+@api.route(f'{AUTH_EP}/refresh')
+class RefreshToken(Resource):
+    """
+    Swap a session token for a fresh one.
+    """
+    @api.response(HTTPStatus.OK, 'Token refreshed.')
+    @api.response(HTTPStatus.UNAUTHORIZED, 'Token invalid or revoked.')
+    @api.expect(REFRESH_FIELDS)
+    def post(self):
+        """
+        Refresh the token sent as `Authorization: Bearer <token>`
+        or in the body. The new token carries the user's current roles.
+        """
+        body = request.get_json(force=True, silent=True) or {}
+        token = sec.bearer_token() or body.get(auth.TOKEN)
+        if not token:
+            raise wz.Unauthorized('No token to refresh.')
+        try:
+            return {auth.TOKEN: tok.refresh(token)}
+        except ValueError as err:
+            raise wz.Unauthorized(str(err))
+
+
+STATIC_MAX_AGE = 3600  # seconds clients may cache state machine answers
+
+
+class StaticJson:
+    """
+    A JSON body encoded once, served with an ETag and Cache-Control so
+    clients can cache it and revalidate with a 304.
+    """
+    def __init__(self, payload):
+        self.body = json.dumps(payload, sort_keys=True)
+        self.etag = hashlib.sha1(self.body.encode()).hexdigest()
+
+    def response(self) -> Response:
+        resp = Response(self.body, mimetype=JSON_MIMETYPE)
+        resp.set_etag(self.etag)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = STATIC_MAX_AGE
+        return resp.make_conditional(request)
+
+
+EDITOR_ACTIONS = StaticJson(
+    {"editor_actions": sorted(ms.ROLE_ACTIONS[rls.ED_CODE])})
+REFEREE_ACTIONS = StaticJson(
+    {"referee_actions": sorted(ms.ROLE_ACTIONS[rls.REFREE_CODE])})
+STATE_GRAPH = StaticJson({
+    'transitions': {state: {action: list(trans.next_states)
+                            for action, trans in by_action.items()}
+                    for state, by_action in ms.TRANSITIONS.items()},
+    'predecessors': {state: sorted(prev)
+                     for state, prev in ms.PREDECESSORS.items()},
+    'reachable': {state: sorted(reach)
+                  for state, reach in ms.REACHABLE.items()},
+})
+# Per state, its actions in table order.
+VALID_ACTIONS = {
+    state: StaticJson({"valid_actions": list(by_action)})
+    for state, by_action in ms.TRANSITIONS.items()}
+
+
 @api.route(f'{MANUSCRIPT_EP}/valid_actions/<state>')
 class ManuscriptValidActions(Resource):
     """
@@ -695,13 +1037,10 @@ class ManuscriptValidActions(Resource):
         """
         Get valid actions for a given manuscript state.
         """
-        try:
-            valid_actions = ms.get_valid_actions_by_state(state)
-            return {"valid_actions": list(valid_actions)}
-        except KeyError:
+        valid_actions = VALID_ACTIONS.get(state)
+        if valid_actions is None:
             raise wz.NotFound(f'Invalid state: {state}')
-        except Exception as err:
-            raise wz.NotAcceptable(f'Could not get valid actions: {err=}')
+        return valid_actions.response()
 
 
 @api.route(f'{MANUSCRIPT_EP}/editor_actions')
@@ -713,11 +1052,7 @@ class ManuscriptEditorActions(Resource):
         """
         Get all possible editor actions.
         """
-        # Editor actions: can be taken in SUBMITTED and EDITOR_REV states
-        editor_actions = set()
-        editor_actions.update(ms.get_valid_actions_by_state(ms.SUBMITTED))
-        editor_actions.update(ms.get_valid_actions_by_state(ms.EDITOR_REV))
-        return {"editor_actions": list(editor_actions)}
+        return EDITOR_ACTIONS.response()
 
 
 @api.route(f'{MANUSCRIPT_EP}/referee_actions')
@@ -729,9 +1064,20 @@ class ManuscriptRefereeActions(Resource):
         """
         Get all possible referee actions.
         """
-        # Referee actions are those that can be taken in IN_REF_REV state
-        referee_actions = set(ms.get_valid_actions_by_state(ms.IN_REF_REV))
-        return {"referee_actions": list(referee_actions)}
+        return REFEREE_ACTIONS.response()
+
+
+@api.route(f'{MANUSCRIPT_EP}/state_graph')
+class ManuscriptStateGraph(Resource):
+    """
+    This class handles the manuscript state machine as a graph.
+    """
+    def get(self):
+        """
+        The state machine: each state's actions and where they lead,
+        the states that lead to each state, and what each can reach.
+        """
+        return STATE_GRAPH.response()
 
 
 @api.route(f'{DEV_EP}/editor_dashboard')
@@ -748,9 +1094,13 @@ class ClearDatabase(Resource):
     WARNING: Development-only endpoint. Drops the entire journal database.
     """
     def delete(self):
-        from data.db_connect import connect_db, JOURNAL_DB
-        client = connect_db()
-        client.drop_database(JOURNAL_DB)
+        from data.db_connect import connect_db, drop_db, JOURNAL_DB
+        connect_db()
+        drop_db(JOURNAL_DB)
+        ppl.ensure_indexes()
+        ppl.clear_cache()
+        txt.clear_cache()
+        ms.known_manuscripts.clear()
         return {'message': f"Database '{JOURNAL_DB}' dropped."}, HTTPStatus.OK
 
 
@@ -765,6 +1115,11 @@ COMMENT_UPDATE_FLDS = api.model('CommentUpdateEntry', {
     cmt.TEXT: fields.String(required=True),
 })
 
+COMMENT_REPLY_FLDS = api.model('CommentReplyEntry', {
+    cmt.EDITOR_ID: fields.String(required=True),
+    cmt.TEXT: fields.String(required=True),
+})
+
 
 @api.route(COMMENT_EP)
 class Comments(Resource):
@@ -787,9 +1142,9 @@ class CommentDetail(Resource):
         """
         Retrieve a single comment by ID.
         """
-        comment = cmt.read_one(comment_id)
+        comment = cmt.read_one_json(comment_id)
         if comment:
-            return comment
+            return Response(comment, mimetype=JSON_MIMETYPE)
         else:
             raise wz.NotFound(f'No such comment with ID: {comment_id}')
 
@@ -826,7 +1181,9 @@ class CommentCreate(Resource):
             manuscript_id = request.json.get(cmt.MANUSCRIPT_ID)
             editor_id = request.json.get(cmt.EDITOR_ID)
             text = request.json.get(cmt.TEXT)
-            ret = cmt.create(manuscript_id, editor_id, text)
+            # Saves a lookup when the caller comments as themselves.
+            ret = cmt.create(manuscript_id, editor_id, text,
+                             sec.current_caller())
         except Exception as err:
             raise wz.NotAcceptable(f'Could not add comment: {err=}')
         return {
@@ -835,6 +1192,58 @@ class CommentCreate(Resource):
         }
 
 
+@api.route(f'{COMMENT_EP}/<comment_id>/reply')
+class CommentReply(Resource):
+    """
+    Reply to a comment.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.NOT_ACCEPTABLE, 'Not acceptable.')
+    @api.expect(COMMENT_REPLY_FLDS)
+    @sec.requires_permission('comment', 'create',
+                             roles=['ED', 'ME', 'RE', 'CE'])
+    def put(self, comment_id):
+        """
+        Add a reply to a comment, in its thread.
+        """
+        try:
+            editor_id = request.json.get(cmt.EDITOR_ID)
+            text = request.json.get(cmt.TEXT)
+            ret = cmt.reply(comment_id, editor_id, text,
+                            sec.current_caller())
+        except Exception as err:
+            raise wz.NotAcceptable(f'Could not add reply: {err=}')
+        return {
+            MESSAGE: 'Reply added!',
+            RETURN: ret,
+        }
+
+
+@api.route(f'{COMMENT_EP}/thread/<thread_id>')
+class CommentThread(Resource):
+    """
+    This class handles reading a comment thread.
+    """
+    @api.response(HTTPStatus.OK, 'Success.')
+    @api.response(HTTPStatus.BAD_REQUEST, 'Bad limit or cursor.')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such thread.')
+    @api.doc(params={LIMIT: 'Comments per page.',
+                     CURSOR: 'The `next` of the previous page.'})
+    def get(self, thread_id):
+        """
+        A page of a thread, each reply right after the comment it
+        answers. A thread's id is its first comment's id.
+        """
+        limit, cursor = page_args(cmt.PAGE_SIZE)
+        try:
+            page = cmt.read_thread(thread_id, limit, cursor)
+        except ValueError as err:
+            raise wz.BadRequest(str(err))
+        if not page[cmt.COMMENTS] and not cursor:
+            raise wz.NotFound(f'No such comment thread: {thread_id}')
+        return page
+
+
 @api.route(f'{COMMENT_EP}/update')
 class CommentUpdate(Resource):
     """
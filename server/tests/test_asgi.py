@@ -0,0 +1,273 @@
+"""
+Run the same requests against the Flask (WSGI) app and the ASGI app and
+check that both modes give the same status and payload.
+"""
+import asyncio
+import gzip
+import json
+from http import HTTPStatus
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from bson import ObjectId
+
+import server.asgi as asgi
+import server.endpoints as ep
+import data.comment as cmt
+import data.db_connect_async as adbc
+import data.manuscript as ms
+import data.people as ppl
+import data.text as txt
+from data.people import NAME, EMAIL, ROLES
+
+TEST_CLIENT = ep.app.test_client()
+
+TEST_EMAIL = 'testEmail@gmail.com'
+PERSON = {NAME: 'Joe Schmoe', EMAIL: TEST_EMAIL, ROLES: ['ED']}
+PEOPLE = {'some-id': PERSON}
+MANUSCRIPT = {ms.TITLE: 'Test Title', ms.TEXT: 'Some text. ' * 300}
+
+
+def asgi_request(method, path, body=b'', headers=None):
+    """
+    Drive the ASGI app through one request.
+    Return (status, header dict, body).
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in (headers or {}).items()],
+        'client': ('127.0.0.1', 5000),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await asgi.app(scope, receive, send)
+        # Each request gets its own event loop, which the async client
+        # can't outlive.
+        await adbc.close_db()
+
+    asyncio.run(run())
+    start, body_msg = sent
+    out_headers = {name.decode(): value.decode()
+                   for name, value in start['headers']}
+    return start['status'], out_headers, body_msg['body']
+
+
+def assert_same(method, path, **kwargs):
+    wsgi_resp = TEST_CLIENT.open(path, method=method,
+                                 data=kwargs.get('body', b''),
+                                 headers=kwargs.get('headers'))
+    status, headers, body = asgi_request(method, path, **kwargs)
+    assert status == wsgi_resp.status_code
+    assert json.loads(body) == wsgi_resp.get_json()
+    return status
+
+
+@patch('data.aio.people.read', new_callable=AsyncMock, return_value=PEOPLE)
+@patch('data.people.read', autospec=True, return_value=PEOPLE)
+def test_people_list(mock_read, mock_aread):
+    assert assert_same('GET', ep.PEOPLE_EP) == HTTPStatus.OK
+    mock_aread.assert_awaited_once()
+
+
+@patch('data.aio.people.read_one', new_callable=AsyncMock,
+       return_value=PERSON)
+@patch('data.people.read_one', autospec=True, return_value=PERSON)
+def test_person(mock_read_one, mock_aread_one):
+    assert assert_same('GET', f'{ep.PEOPLE_EP}/{TEST_EMAIL}') \
+        == HTTPStatus.OK
+    mock_aread_one.assert_awaited_once_with(TEST_EMAIL)
+
+
+@patch('data.aio.people.read_one', new_callable=AsyncMock,
+       return_value=None)
+@patch('data.people.read_one', autospec=True, return_value=None)
+def test_person_not_found(mock_read_one, mock_aread_one):
+    assert assert_same('GET', f'{ep.PEOPLE_EP}/no-such-id') \
+        == HTTPStatus.NOT_FOUND
+    # once by the WSGI request; the ASGI miss doesn't query again
+    mock_read_one.assert_called_once()
+    mock_aread_one.assert_awaited_once()
+
+
+@patch('data.aio.manuscript.read_one_json', new_callable=AsyncMock,
+       return_value=None)
+@patch('data.manuscript.read_one_json', autospec=True, return_value=None)
+def test_manuscript_not_found(mock_read, mock_aread):
+    wsgi_resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/no-such-id')
+    status, headers, body = asgi_request('GET',
+                                         f'{ep.MANUSCRIPT_EP}/no-such-id')
+    assert status == wsgi_resp.status_code == HTTPStatus.NOT_FOUND
+    assert body == wsgi_resp.data
+    mock_read.assert_called_once()
+
+
+@patch('data.aio.people.read_by_roles', new_callable=AsyncMock,
+       return_value=PEOPLE)
+@patch('data.people.read_by_roles', autospec=True, return_value=PEOPLE)
+def test_masthead(mock_read, mock_aread):
+    assert assert_same('GET', f'{ep.PEOPLE_EP}/masthead') == HTTPStatus.OK
+
+
+@patch('data.aio.manuscript.read', new_callable=AsyncMock,
+       return_value={MANUSCRIPT[ms.TITLE]: MANUSCRIPT})
+@patch('data.manuscript.read', autospec=True,
+       return_value={MANUSCRIPT[ms.TITLE]: MANUSCRIPT})
+def test_manuscripts(mock_read, mock_aread):
+    assert assert_same('GET', ep.MANUSCRIPT_EP) == HTTPStatus.OK
+
+
+@patch('data.aio.manuscript.search_by_title', new_callable=AsyncMock,
+       return_value={})
+@patch('data.manuscript.search_by_title', autospec=True, return_value={})
+def test_manuscripts_search(mock_search, mock_asearch):
+    assert assert_same('GET', f'{ep.MANUSCRIPT_EP}?title=Nothing') \
+        == HTTPStatus.OK
+    mock_asearch.assert_awaited_once_with('Nothing')
+
+
+@patch('data.aio.manuscript.read_one_json', new_callable=AsyncMock,
+       return_value=json.dumps(MANUSCRIPT))
+@patch('data.manuscript.read_one_json', autospec=True,
+       return_value=json.dumps(MANUSCRIPT))
+def test_manuscript(mock_read, mock_aread):
+    assert assert_same('GET', f'{ep.MANUSCRIPT_EP}/some_id') \
+        == HTTPStatus.OK
+
+
+@patch('data.aio.manuscript.read_one_json', new_callable=AsyncMock,
+       return_value=json.dumps(MANUSCRIPT))
+def test_native_response_compressed(mock_aread):
+    status, headers, body = asgi_request(
+        'GET', f'{ep.MANUSCRIPT_EP}/some_id',
+        headers={'Accept-Encoding': 'gzip'})
+    assert headers['content-encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(body)) == MANUSCRIPT
+
+
+@patch('data.aio.text.read_one', new_callable=AsyncMock,
+       return_value={'title': 'T', 'text': 'X'})
+@patch('data.text.read_one', autospec=True,
+       return_value={'title': 'T', 'text': 'X'})
+def test_text(mock_read_one, mock_aread_one):
+    assert assert_same('GET', f'{ep.TEXT_EP}/1') == HTTPStatus.OK
+
+
+@patch('data.aio.comment.read_by_manuscript', new_callable=AsyncMock,
+       return_value=[{'text': 'Nice'}])
+@patch('data.comment.read_by_manuscript', autospec=True,
+       return_value=[{'text': 'Nice'}])
+def test_comments_by_manuscript(mock_read, mock_aread):
+    assert assert_same('GET', f'{ep.COMMENT_EP}/manuscript/some_id') \
+        == HTTPStatus.OK
+
+
+def test_hello_falls_back():
+    assert assert_same('GET', ep.HELLO_EP) == HTTPStatus.OK
+
+
+def test_match_native():
+    handler, view_args = asgi.match_native('GET', f'{ep.TEXT_EP}/7')
+    assert handler is not None
+    assert view_args == {'page_number': '7'}
+    assert asgi.match_native('GET', ep.HELLO_EP) == (None, None)
+    assert asgi.match_native('DELETE', f'{ep.TEXT_EP}/7') == (None, None)
+
+
+@patch('data.text.create', autospec=True, return_value='1')
+def test_write_falls_back(mock_create):
+    body = json.dumps({'pageNumber': '1', 'title': 'T', 'text': 'X'})
+    status, headers, out = asgi_request(
+        'PUT', f'{ep.TEXT_EP}/create', body=body.encode(),
+        headers={'Content-Type': 'application/json'})
+    assert status == HTTPStatus.OK
+    assert json.loads(out)[ep.RETURN] == '1'
+    mock_create.assert_called_once_with('1', 'T', 'X')
+
+
+DB_EDITOR_EMAIL = 'asgi-editor@nyu.edu'
+DB_TITLE = 'ASGI Test Title'
+DB_PAGE = 'AsgiTestPage'
+
+
+@pytest.fixture(scope='function')
+def db_records():
+    """
+    An editor, a manuscript with a comment, and a text page, in the db.
+    """
+    editor_id = ppl.create('Ed Itor', 'NYU', DB_EDITOR_EMAIL, 'ED')
+    manu_id = ms.create(DB_TITLE, 'Au Thor', 'asgi-author@nyu.edu',
+                        'Some text. ' * 300, 'An abstract.', DB_EDITOR_EMAIL)
+    comment_id = cmt.create(manu_id, editor_id, 'Looks good.')
+    txt.create(DB_PAGE, 'A Page', 'Page text.')
+    yield {'editor_id': editor_id, 'email': DB_EDITOR_EMAIL,
+           'manu_id': manu_id, 'comment_id': comment_id, 'page': DB_PAGE,
+           'title': DB_TITLE, 'missing_id': str(ObjectId())}
+    cmt.delete(comment_id)
+    ms.delete(manu_id)
+    txt.delete(DB_PAGE)
+    ppl.delete(editor_id)
+
+
+# The natively served routes, with the data layer unpatched: the ASGI
+# app reads through data.aio and db_connect_async.
+@pytest.mark.parametrize('path, status', [
+    (ep.PEOPLE_EP, HTTPStatus.OK),
+    (f'{ep.PEOPLE_EP}/get_all_people', HTTPStatus.OK),
+    (f'{ep.PEOPLE_EP}/masthead', HTTPStatus.OK),
+    (f'{ep.PEOPLE_EP}/{{editor_id}}', HTTPStatus.OK),
+    (f'{ep.PEOPLE_EP}/{{email}}', HTTPStatus.OK),
+    (f'{ep.PEOPLE_EP}/no-such-person', HTTPStatus.NOT_FOUND),
+    (ep.TEXT_EP, HTTPStatus.OK),
+    (f'{ep.TEXT_EP}/{{page}}', HTTPStatus.OK),
+    (f'{ep.TEXT_EP}/no-such-page', HTTPStatus.NOT_FOUND),
+    (ep.MANUSCRIPT_EP, HTTPStatus.OK),
+    (f'{ep.MANUSCRIPT_EP}?title={{title}}', HTTPStatus.OK),
+    (f'{ep.MANUSCRIPT_EP}/{{manu_id}}', HTTPStatus.OK),
+    (f'{ep.MANUSCRIPT_EP}/{{missing_id}}', HTTPStatus.NOT_FOUND),
+    (ep.COMMENT_EP, HTTPStatus.OK),
+    (f'{ep.COMMENT_EP}/{{comment_id}}', HTTPStatus.OK),
+    (f'{ep.COMMENT_EP}/{{missing_id}}', HTTPStatus.NOT_FOUND),
+    (f'{ep.COMMENT_EP}/manuscript/{{manu_id}}', HTTPStatus.OK),
+    (f'{ep.COMMENT_EP}/editor/{{editor_id}}', HTTPStatus.OK),
+])
+def test_native_route_from_db(db_records, path, status):
+    path = path.format(**db_records)
+    assert asgi.match_native('GET', path.partition('?')[0])[0] is not None
+    # Caches shared with the sync modules would hide the async reads.
+    ppl.clear_cache()
+    txt.clear_cache()
+    asgi_status, headers, body = asgi_request('GET', path)
+    wsgi_resp = TEST_CLIENT.get(path)
+    assert asgi_status == wsgi_resp.status_code == status
+    if status == HTTPStatus.OK:
+        assert json.loads(body) == wsgi_resp.get_json()
+
+
+def test_manuscript_text_from_db(db_records):
+    status, headers, body = asgi_request(
+        'GET', f"{ep.MANUSCRIPT_EP}/{db_records['manu_id']}")
+    manu = json.loads(body)
+    assert manu[ms.TEXT] == 'Some text. ' * 300
+    assert manu[ms.TITLE] == DB_TITLE
+    for field in ms.INTERNAL_FIELDS:
+        assert field not in manu
+
+
+def test_masthead_from_db(db_records):
+    status, headers, body = asgi_request('GET', f'{ep.PEOPLE_EP}/masthead')
+    masthead = json.loads(body)[ep.MASTHEAD]
+    assert any(person[NAME] == 'Ed Itor'
+               for people in masthead.values() for person in people)
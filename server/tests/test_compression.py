@@ -0,0 +1,141 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import server.compression as cpr
+
+BIG_PAYLOAD = {'text': 'All work and no play makes Jack a dull boy. ' * 200}
+# About the size of a large manuscript listing.
+LISTING_PAYLOAD = {f'Title {i}': {'title': f'Title {i}',
+                                  'abstract': 'Ab. ' * 100}
+                   for i in range(5000)}
+SMALL_PAYLOAD = {'text': 'tiny'}
+STREAM_CHUNKS = [b'chunk %d ' % i * 100 for i in range(5)]
+
+GZIP_HEADERS = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture(scope='function')
+def client():
+    app = Flask(__name__)
+    cpr.init_app(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify(BIG_PAYLOAD)
+
+    @app.route('/listing')
+    def listing():
+        return jsonify(LISTING_PAYLOAD)
+
+    @app.route('/small')
+    def small():
+        return jsonify(SMALL_PAYLOAD)
+
+    @app.route('/stream')
+    def stream():
+        return Response(iter(STREAM_CHUNKS), mimetype='text/plain')
+
+    return app.test_client()
+
+
+def test_compress_gzip_round_trip():
+    body = b'abc' * 1000
+    assert gzip.decompress(cpr.compress(body, cpr.GZIP, 6)) == body
+
+
+def test_compress_stream_round_trip():
+    out = b''.join(cpr.compress_stream(iter(STREAM_CHUNKS), cpr.GZIP, 6))
+    assert gzip.decompress(out) == b''.join(STREAM_CHUNKS)
+
+
+def test_big_body_is_compressed(client):
+    resp = client.get('/big', headers=GZIP_HEADERS)
+    assert resp.headers['Content-Encoding'] == cpr.GZIP
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    body = gzip.decompress(resp.get_data())
+    assert len(body) > len(resp.get_data())
+
+
+def test_small_body_not_compressed(client):
+    resp = client.get('/small', headers=GZIP_HEADERS)
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_json() == SMALL_PAYLOAD
+
+
+def test_no_accept_encoding(client):
+    resp = client.get('/big')
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_json() == BIG_PAYLOAD
+
+
+def test_refused_encoding(client):
+    resp = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in resp.headers
+
+
+def test_streamed_response_compressed(client):
+    resp = client.get('/stream', headers=GZIP_HEADERS)
+    assert resp.headers['Content-Encoding'] == cpr.GZIP
+    assert 'Content-Length' not in resp.headers
+    decomp = zlib.decompressobj(cpr.GZIP_WBITS)
+    assert decomp.decompress(resp.get_data()) == b''.join(STREAM_CHUNKS)
+
+
+def test_hot_payload_compressed_once(client):
+    cache = cpr.get_cache(client.application)
+    first = client.get('/big', headers=GZIP_HEADERS).get_data()
+    second = client.get('/big', headers=GZIP_HEADERS).get_data()
+    assert first == second
+    stats = cache.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+
+
+def test_listing_compressed_once(client):
+    cache = cpr.get_cache(client.application)
+    first = client.get('/listing', headers=GZIP_HEADERS)
+    assert len(gzip.decompress(first.get_data())) \
+        > client.application.config[cpr.LARGE_SIZE]
+    second = client.get('/listing', headers=GZIP_HEADERS)
+    assert first.get_data() == second.get_data()
+    assert cache.stats()['hits'] == 1
+
+
+def test_level_for():
+    config = dict(cpr.DEFAULTS)
+    large = config[cpr.LARGE_SIZE] + 1
+    assert cpr.level_for(config, cpr.GZIP, 10) == config[cpr.LEVEL]
+    assert cpr.level_for(config, cpr.GZIP, large) == config[cpr.LARGE_LEVEL]
+    assert cpr.level_for(config, cpr.GZIP) == config[cpr.LEVEL]
+    assert cpr.level_for(config, cpr.BROTLI, large) \
+        == config[cpr.LARGE_BR_QUALITY]
+
+
+def test_load_env():
+    config = {}
+    cpr.load_env(config, {'JOURNAL_COMPRESS_LEVEL': '9',
+                          'JOURNAL_TOKEN_SECRET': 'not for the config',
+                          'JOURNAL_COMPRESS_OTHER': '1'})
+    assert config == {cpr.LEVEL: 9}
+
+
+def test_cache_is_bounded():
+    one = len(cpr.compress(b'body 0', cpr.GZIP, 6))
+    cache = cpr.CompressionCache(2 * one, 1024)
+    for i in range(5):
+        cache.get_or_compress(b'body %d' % i, cpr.GZIP, 6)
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert stats['bytes'] <= stats['max_bytes']
+
+
+def test_big_body_not_cached():
+    cache = cpr.CompressionCache(1024 * 1024, 100)
+    body = b'x' * 101
+    assert gzip.decompress(cache.get_or_compress(body, cpr.GZIP, 6)) == body
+    stats = cache.stats()
+    assert stats['size'] == 0
+    assert stats['misses'] == 0
@@ -10,17 +10,32 @@ from http.client import (
 
 from unittest.mock import patch
 
+import asyncio
+import inspect
+
 import pytest, json
+from werkzeug.test import Client
 
-from data.people import ID, NAME, AFFILIATION, EMAIL, ROLES, BIO
+from data.people import ID, NAME, AFFILIATION, EMAIL, ROLES, BIO, TOKEN_VERSION
+import server.asgi as asgi
 import server.endpoints as ep
-
-TEST_CLIENT = ep.app.test_client()
-
+import security.auth as auth
+import security.rate_limit as rl
+import security.tokens as tok
+
+import data.aio.comment as acmt
+import data.aio.manuscript as ams
+import data.aio.people as appl
+import data.aio.text as atxt
+import data.db_connect_async as adbc
+import data.analytics as anl
+import data.people as ppl
 import data.text as txt
 import data.roles as rls
 from data.text import *
 import data.manuscript as ms
+import data.manuscript_events as mev
+import data.manuscript_revisions as mrev
 import data.comment as cmt
 
 from unittest.mock import patch
@@ -31,24 +46,105 @@ TEST_MANU_ID = "test_manu_id"
 TEST_EMAIL = "testEmail@gmail.com"
 TEST_TITLE = "Test Manuscript Title"
 TEST_PAGE_NUMBER = "TestPageNumber"
-TEST_CLIENT = ep.app.test_client()
 GOOD_USER_RECORD = {'email': TEST_EMAIL, 'roles': ['ME', 'RE', 'ED']}
 AUTH_HEADERS = {'X-User-Id': GOOD_USER_RECORD['email']}
 
+# Each async data module the ASGI app serves hot routes from, and the
+# sync module it mirrors.
+AIO_TWINS = [(acmt, cmt), (ams, ms), (appl, ppl), (atxt, txt)]
+
+
+def asgi_as_wsgi(environ, start_response):
+    """
+    Drive the ASGI app through one WSGI request,
+    so that werkzeug's test client can talk to it.
+    """
+    headers = [(name[5:].replace('_', '-').lower(), value)
+               for name, value in environ.items()
+               if name.startswith('HTTP_')]
+    if environ.get('CONTENT_TYPE'):
+        headers.append(('content-type', environ['CONTENT_TYPE']))
+    scope = {
+        'type': 'http',
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'].encode('latin1').decode(),
+        'query_string': environ['QUERY_STRING'].encode('latin1'),
+        'headers': [(name.encode('latin1'), value.encode('latin1'))
+                    for name, value in headers],
+        'client': (environ.get('REMOTE_ADDR', '127.0.0.1'), 5000),
+    }
+    messages = [{'type': 'http.request', 'more_body': False,
+                 'body': environ['wsgi.input'].read()}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await asgi.app(scope, receive, send)
+        # A new event loop per request, which the async client can't
+        # outlive.
+        await adbc.close_db()
+
+    asyncio.run(run())
+    start, body_msg = sent
+    start_response(f"{start['status']} {HTTPStatus(start['status']).phrase}",
+                   [(name.decode('latin1'), value.decode('latin1'))
+                    for name, value in start['headers']])
+    return [body_msg['body']]
+
+
+def patchable(aio_func, sync_mod, name):
+    """
+    Run aio_func against the db, unless the test patched its sync twin:
+    then answer with that patch.
+    """
+    sync_func = getattr(sync_mod, name)
+
+    async def func(*args, **kwargs):
+        patched = getattr(sync_mod, name)
+        if patched is not sync_func:
+            return patched(*args, **kwargs)
+        return await aio_func(*args, **kwargs)
+    return func
+
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def client(request, monkeypatch):
+    """
+    A test client for the Flask (WSGI) app, then for the ASGI app.
+    Under the ASGI app the async data functions read the db, except
+    where a test patched the sync function they mirror.
+    Both runs of a test start with fresh rate limits.
+    """
+    rl.clear()
+    if request.param == 'wsgi':
+        return ep.app.test_client()
+    for aio_mod, sync_mod in AIO_TWINS:
+        for name, func in vars(aio_mod).items():
+            if inspect.iscoroutinefunction(func):
+                monkeypatch.setattr(aio_mod, name,
+                                    patchable(func, sync_mod, name))
+    return Client(asgi_as_wsgi, ep.app.response_class)
+
+
 ADD_DELETE_ROLE_DATA = {
     ID: TEST_MANU_ID,
     ep.ROLE: rls.TEST_CODE
 }
 
-def test_hello():
-    resp = TEST_CLIENT.get(ep.HELLO_EP)
+def test_hello(client):
+    resp = client.get(ep.HELLO_EP)
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
     assert ep.HELLO_RESP in resp_json
 
 
-def test_title():
-    resp = TEST_CLIENT.get(ep.TITLE_EP)
+def test_title(client):
+    resp = client.get(ep.TITLE_EP)
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
     assert ep.TITLE_RESP in resp_json
@@ -58,8 +154,8 @@ def test_title():
 
 @patch('data.roles.read', autospec=True,
         return_value={'ED': 'Editor'})
-def test_read_roles(mock_read):
-    resp = TEST_CLIENT.get(ep.ROLES_EP)
+def test_read_roles(mock_read, client):
+    resp = client.get(ep.ROLES_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -72,8 +168,8 @@ def test_read_roles(mock_read):
 
 @patch('data.people.read', autospec=True,
         return_value={'id': {NAME: 'Joe Schmoe'}})
-def test_read_people(mock_read):
-    resp = TEST_CLIENT.get(ep.PEOPLE_EP)
+def test_read_people(mock_read, client):
+    resp = client.get(ep.PEOPLE_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -85,8 +181,8 @@ def test_read_people(mock_read):
 
 @patch('data.people.get_all_people', autospec=True,
         return_value=["Name (email)"])
-def test_get_all_people(mock_get_all_people):
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/get_all_people')
+def test_get_all_people(mock_get_all_people, client):
+    resp = client.get(f'{ep.PEOPLE_EP}/get_all_people')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, list)
@@ -96,21 +192,21 @@ def test_get_all_people(mock_get_all_people):
 
 @patch('data.people.read_one', autospec=True,
        return_value={NAME: 'Joe Schmoe'})
-def test_read_one_person(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/mock_id')
+def test_read_one_person(mock_read, client):
+    resp = client.get(f'{ep.PEOPLE_EP}/mock_id')
     assert resp.status_code == OK
 
 
 @patch('data.people.read_one', autospec=True, return_value=None)
-def test_read_one_person_not_found(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/mock_id')
+def test_read_one_person_not_found(mock_read, client):
+    resp = client.get(f'{ep.PEOPLE_EP}/mock_id')
     assert resp.status_code == NOT_FOUND
 
 
 @patch('data.people.read_one', return_value=GOOD_USER_RECORD)
 @patch('data.people.delete', return_value='test@example.com')
-def test_delete_people(mock_delete, mock_read_one):
-    resp = TEST_CLIENT.delete(
+def test_delete_people(mock_delete, mock_read_one, client):
+    resp = client.delete(
         f'{ep.PEOPLE_EP}/mock_email?email=yw5490@nyu.edu',
         headers=AUTH_HEADERS
     )
@@ -119,8 +215,8 @@ def test_delete_people(mock_delete, mock_read_one):
 
 @patch('data.people.read_one', return_value=GOOD_USER_RECORD)
 @patch('data.people.delete', return_value=None)
-def test_delete_people_not_found(mock_delete, mock_read_one):
-    resp = TEST_CLIENT.delete(
+def test_delete_people_not_found(mock_delete, mock_read_one, client):
+    resp = client.delete(
         f'{ep.PEOPLE_EP}/mock_email?email=yw5490@nyu.edu',
         headers=AUTH_HEADERS
     )
@@ -134,11 +230,11 @@ CREATE_TEST_DATA = {
     ROLES: rls.TEST_CODE
 }
 
-# ensure read() comes back empty so the "first user" branch skips ED/ME check
-@patch('data.people.read', autospec=True, return_value=[])
+# an empty collection means the "first user" branch skips the ED/ME check
+@patch('data.people.is_empty', autospec=True, return_value=True)
 @patch('data.people.create', autospec=True, return_value=TEST_EMAIL)
-def test_create_people(mock_create, mock_read):
-    resp = TEST_CLIENT.post(
+def test_create_people(mock_create, mock_is_empty, client):
+    resp = client.post(
         f'{ep.PEOPLE_EP}/create',
         data=json.dumps(CREATE_TEST_DATA),
         content_type='application/json'
@@ -146,10 +242,36 @@ def test_create_people(mock_create, mock_read):
     assert resp.status_code == HTTPStatus.CREATED
 
 
-@patch('data.people.read', autospec=True, return_value=[])
+@patch('data.people.is_empty', autospec=True, return_value=False)
+@patch('data.people.read_one', autospec=True, return_value=GOOD_USER_RECORD)
+@patch('data.people.create', autospec=True, return_value=TEST_EMAIL)
+def test_create_people_seeded(mock_create, mock_read_one, mock_is_empty,
+                              client):
+    resp = client.post(
+        f'{ep.PEOPLE_EP}/create',
+        data=json.dumps(CREATE_TEST_DATA),
+        content_type='application/json',
+        headers=AUTH_HEADERS
+    )
+    assert resp.status_code == HTTPStatus.CREATED
+
+
+@patch('data.people.is_empty', autospec=True, return_value=False)
+@patch('data.people.create', autospec=True, return_value=TEST_EMAIL)
+def test_create_people_seeded_no_caller(mock_create, mock_is_empty, client):
+    resp = client.post(
+        f'{ep.PEOPLE_EP}/create',
+        data=json.dumps(CREATE_TEST_DATA),
+        content_type='application/json'
+    )
+    assert resp.status_code == HTTPStatus.FORBIDDEN
+    mock_create.assert_not_called()
+
+
+@patch('data.people.is_empty', autospec=True, return_value=True)
 @patch('data.people.create', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_create_people_failed(mock_create, mock_read):
-    resp = TEST_CLIENT.post(
+def test_create_people_failed(mock_create, mock_is_empty, client):
+    resp = client.post(
         f'{ep.PEOPLE_EP}/create',
         data=json.dumps(CREATE_TEST_DATA),
         content_type='application/json'
@@ -166,8 +288,8 @@ UPDATE_PEOPLE_DATA = {
 
 @patch('data.people.read_one', return_value=GOOD_USER_RECORD)
 @patch('data.people.update', autospec=True, return_value=TEST_EMAIL)
-def test_update_people(mock_update, mock_read_one):
-    resp = TEST_CLIENT.put(
+def test_update_people(mock_update, mock_read_one, client):
+    resp = client.put(
         f'{ep.PEOPLE_EP}/update',
         data=json.dumps(UPDATE_PEOPLE_DATA),
         content_type='application/json',
@@ -179,8 +301,8 @@ def test_update_people(mock_update, mock_read_one):
 
 @patch('data.people.read_one', return_value=GOOD_USER_RECORD)
 @patch('data.people.update', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_update_people_failed(mock_update, mock_read_one):
-    resp = TEST_CLIENT.put(
+def test_update_people_failed(mock_update, mock_read_one, client):
+    resp = client.put(
         f'{ep.PEOPLE_EP}/update',
         data=json.dumps(UPDATE_PEOPLE_DATA),
         content_type='application/json',
@@ -191,9 +313,9 @@ def test_update_people_failed(mock_update, mock_read_one):
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_MANU_ID, "roles": ["ME"]})
 @patch("data.people.add_role", autospec=True, return_value=TEST_MANU_ID)
-def test_add_role_success(mock_add, mock_read_one):
+def test_add_role_success(mock_add, mock_read_one, client):
     """PUT /people/add_role → 200 + {message, return} when add_role succeeds"""
-    resp = TEST_CLIENT.put(
+    resp = client.put(
         f"{ep.PEOPLE_EP}/add_role",
         headers=AUTH_HEADERS,
         data=json.dumps(ADD_DELETE_ROLE_DATA),
@@ -209,9 +331,9 @@ def test_add_role_success(mock_add, mock_read_one):
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_MANU_ID, "roles": ["ME"]})
 @patch("data.people.add_role", autospec=True, side_effect=ValueError("mock failure"))
-def test_add_role_failure(mock_add, mock_read_one):
+def test_add_role_failure(mock_add, mock_read_one, client):
     """PUT /people/add_role → 406 when add_role() raises"""
-    resp = TEST_CLIENT.put(
+    resp = client.put(
         f"{ep.PEOPLE_EP}/add_role",
         headers=AUTH_HEADERS,
         data=json.dumps(ADD_DELETE_ROLE_DATA),
@@ -222,9 +344,9 @@ def test_add_role_failure(mock_add, mock_read_one):
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_MANU_ID, "roles": ["ED"]})
 @patch("data.people.delete_role", autospec=True, return_value=TEST_MANU_ID)
-def test_delete_role_success(mock_delete, mock_read_one):
+def test_delete_role_success(mock_delete, mock_read_one, client):
     """DELETE /people/delete_role → 200 + {message, return} when delete_role succeeds"""
-    resp = TEST_CLIENT.delete(
+    resp = client.delete(
         f"{ep.PEOPLE_EP}/delete_role",
         headers=AUTH_HEADERS,
         data=json.dumps(ADD_DELETE_ROLE_DATA),
@@ -240,9 +362,9 @@ def test_delete_role_success(mock_delete, mock_read_one):
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_MANU_ID, "roles": ["ED"]})
 @patch("data.people.delete_role", autospec=True, side_effect=ValueError("mock failure"))
-def test_delete_role_failure(mock_delete, mock_read_one):
+def test_delete_role_failure(mock_delete, mock_read_one, client):
     """DELETE /people/delete_role → 406 when delete_role() raises"""
-    resp = TEST_CLIENT.delete(
+    resp = client.delete(
         f"{ep.PEOPLE_EP}/delete_role",
         headers=AUTH_HEADERS,
         data=json.dumps(ADD_DELETE_ROLE_DATA),
@@ -253,8 +375,8 @@ def test_delete_role_failure(mock_delete, mock_read_one):
 
 @patch('data.text.read', autospec=True,
        return_value={'page_number': {TITLE: 'Test Title', TEXT: 'Test Text'}})
-def test_read_text(mock_read):
-    resp = TEST_CLIENT.get(ep.TEXT_EP)
+def test_read_text(mock_read, client):
+    resp = client.get(ep.TEXT_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -267,14 +389,14 @@ def test_read_text(mock_read):
 
 @patch('data.text.read_one', autospec=True,
        return_value={TITLE: 'Test Title', TEXT: 'Test Text'})
-def test_read_one_text(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.TEXT_EP}/mock_page_number')
+def test_read_one_text(mock_read, client):
+    resp = client.get(f'{ep.TEXT_EP}/mock_page_number')
     assert resp.status_code == OK
 
 
 @patch('data.text.read_one', autospec=True, return_value=None)
-def test_read_one_text_not_found(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.TEXT_EP}/mock_page_number')
+def test_read_one_text_not_found(mock_read, client):
+    resp = client.get(f'{ep.TEXT_EP}/mock_page_number')
     assert resp.status_code == NOT_FOUND
 
 
@@ -286,8 +408,8 @@ TEXT_TEST_DATA = {
 
 
 @patch('data.text.create', autospec=True, return_value=TEST_PAGE_NUMBER)
-def test_create_text(mock_create):
-    resp = TEST_CLIENT.put(
+def test_create_text(mock_create, client):
+    resp = client.put(
         f'{ep.TEXT_EP}/create',
         data=json.dumps(TEXT_TEST_DATA),
         content_type='application/json'
@@ -300,8 +422,8 @@ def test_create_text(mock_create):
 
 
 @patch('data.text.create', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_create_text_failed(mock_create):
-    resp = TEST_CLIENT.put(
+def test_create_text_failed(mock_create, client):
+    resp = client.put(
         f'{ep.TEXT_EP}/create',
         data=json.dumps(TEXT_TEST_DATA),
         content_type='application/json'
@@ -310,8 +432,8 @@ def test_create_text_failed(mock_create):
 
 
 @patch('data.text.delete', autospec=True, return_value=TEST_PAGE_NUMBER)
-def test_delete_text(mock_delete):
-    resp = TEST_CLIENT.delete(f'{ep.TEXT_EP}/mock_page_number')
+def test_delete_text(mock_delete, client):
+    resp = client.delete(f'{ep.TEXT_EP}/mock_page_number')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -319,15 +441,15 @@ def test_delete_text(mock_delete):
 
 
 @patch('data.text.delete', autospec=True, return_value=None)
-def test_delete_text_not_found(mock_delete):
-    resp = TEST_CLIENT.delete(f'{ep.TEXT_EP}/mock_page_number')
+def test_delete_text_not_found(mock_delete, client):
+    resp = client.delete(f'{ep.TEXT_EP}/mock_page_number')
     assert resp.status_code == NOT_FOUND
 
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_PAGE_NUMBER, "roles": ["ED"]})
 @patch('data.text.update', autospec=True, return_value=TEST_PAGE_NUMBER)
-def test_update_text(mock_update, mock_read_one):
-    resp = TEST_CLIENT.put(
+def test_update_text(mock_update, mock_read_one, client):
+    resp = client.put(
         f'{ep.TEXT_EP}/update',
         headers=AUTH_HEADERS,
         data=json.dumps(TEXT_TEST_DATA),
@@ -342,8 +464,8 @@ def test_update_text(mock_update, mock_read_one):
 
 @patch("data.people.read_one", autospec=True, return_value={"id": TEST_PAGE_NUMBER, "roles": ["ED"]})
 @patch('data.text.update', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_update_text_failed(mock_update, mock_read_one):
-    resp = TEST_CLIENT.put(
+def test_update_text_failed(mock_update, mock_read_one, client):
+    resp = client.put(
         f'{ep.TEXT_EP}/update',
         headers=AUTH_HEADERS,
         data=json.dumps(TEXT_TEST_DATA),
@@ -353,8 +475,8 @@ def test_update_text_failed(mock_update, mock_read_one):
 
 
 @patch('data.people.get_masthead', autospec=True, return_value={})
-def test_get_masthead(mock_get_masthead):
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/masthead')
+def test_get_masthead(mock_get_masthead, client):
+    resp = client.get(f'{ep.PEOPLE_EP}/masthead')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -373,8 +495,8 @@ MANUSCRIPT_DATA = {
 
 @patch('data.manuscript.read', autospec=True,
        return_value={'title': {ms.TITLE: 'Test Title'}})
-def test_read_manuscripts(mock_read):
-    resp = TEST_CLIENT.get(ep.MANUSCRIPT_EP)
+def test_read_manuscripts(mock_read, client):
+    resp = client.get(ep.MANUSCRIPT_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -384,22 +506,23 @@ def test_read_manuscripts(mock_read):
         assert ms.TITLE in manu
 
 
-@patch('data.manuscript.read_one', autospec=True,
-       return_value={ms.TITLE: 'Test Title'})
-def test_read_one_manuscript(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
+@patch('data.manuscript.read_one_json', autospec=True,
+       return_value=json.dumps({ms.TITLE: 'Test Title'}))
+def test_read_one_manuscript(mock_read, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
     assert resp.status_code == OK
+    assert resp.get_json() == {ms.TITLE: 'Test Title'}
 
 
-@patch('data.manuscript.read_one', autospec=True, return_value=None)
-def test_read_one_manuscript_not_found(mock_read):
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
+@patch('data.manuscript.read_one_json', autospec=True, return_value=None)
+def test_read_one_manuscript_not_found(mock_read, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
     assert resp.status_code == NOT_FOUND
 
 
 @patch('data.manuscript.delete', autospec=True, return_value=TEST_MANU_ID)
-def test_delete_manuscript(mock_delete):
-    resp = TEST_CLIENT.delete(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
+def test_delete_manuscript(mock_delete, client):
+    resp = client.delete(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -407,14 +530,14 @@ def test_delete_manuscript(mock_delete):
 
 
 @patch('data.manuscript.delete', autospec=True, return_value=None)
-def test_delete_manuscript_not_found(mock_delete):
-    resp = TEST_CLIENT.delete(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
+def test_delete_manuscript_not_found(mock_delete, client):
+    resp = client.delete(f'{ep.MANUSCRIPT_EP}/mock_manu_id')
     assert resp.status_code == NOT_FOUND
 
 
 @patch('data.manuscript.create', autospec=True, return_value=TEST_MANU_ID)
-def test_create_manuscript(mock_create):
-    resp = TEST_CLIENT.put(
+def test_create_manuscript(mock_create, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/create',
         data=json.dumps(MANUSCRIPT_DATA),
         content_type='application/json'
@@ -427,8 +550,8 @@ def test_create_manuscript(mock_create):
 
 
 @patch('data.manuscript.create', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_create_manuscript_failed(mock_create):
-    resp = TEST_CLIENT.put(
+def test_create_manuscript_failed(mock_create, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/create',
         data=json.dumps(MANUSCRIPT_DATA),
         content_type='application/json'
@@ -437,8 +560,8 @@ def test_create_manuscript_failed(mock_create):
 
 
 @patch('data.manuscript.update', autospec=True, return_value=TEST_MANU_ID)
-def test_update_manuscript(mock_update):
-    resp = TEST_CLIENT.put(
+def test_update_manuscript(mock_update, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/update',
         data=json.dumps(MANUSCRIPT_DATA),
         content_type='application/json'
@@ -451,8 +574,8 @@ def test_update_manuscript(mock_update):
 
 
 @patch('data.manuscript.update', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_update_manuscript_failed(mock_update):
-    resp = TEST_CLIENT.put(
+def test_update_manuscript_failed(mock_update, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/update',
         data=json.dumps(MANUSCRIPT_DATA),
         content_type='application/json'
@@ -467,8 +590,8 @@ STATE_TEST_DATA = {
 
 
 @patch('data.manuscript.update_state', autospec=True, return_value=TEST_MANU_ID)
-def test_update_state(mock_update_state):
-    resp = TEST_CLIENT.put(
+def test_update_state(mock_update_state, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/update_state',
         data=json.dumps(STATE_TEST_DATA),
         content_type='application/json'
@@ -488,8 +611,8 @@ STATE_TEST_DATA_WITH_REFEREE = {
 
 
 @patch('data.manuscript.update_state', autospec=True, return_value=TEST_MANU_ID)
-def test_update_state_with_referee(mock_update_state):
-    resp = TEST_CLIENT.put(
+def test_update_state_with_referee(mock_update_state, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/update_state',
         data=json.dumps(STATE_TEST_DATA_WITH_REFEREE),
         content_type='application/json'
@@ -502,8 +625,8 @@ def test_update_state_with_referee(mock_update_state):
 
 
 @patch('data.manuscript.update_state', autospec=True, side_effect=ValueError("Mocked Exception"))
-def test_update_state_invalid_action(mock_update_state):
-    resp = TEST_CLIENT.put(
+def test_update_state_invalid_action(mock_update_state, client):
+    resp = client.put(
         f'{ep.MANUSCRIPT_EP}/update_state',
         data=json.dumps(STATE_TEST_DATA),
         content_type='application/json'
@@ -511,6 +634,70 @@ def test_update_state_invalid_action(mock_update_state):
     assert resp.status_code == NOT_ACCEPTABLE
 
 
+BULK_STATE_TEST_DATA = {
+    ep.MANU_IDS: [TEST_MANU_ID, 'other_id'],
+    ep.ACTION: ms.REJECT,
+}
+
+
+@patch('data.people.read_one', return_value=GOOD_USER_RECORD)
+@patch('data.manuscript.bulk_update_state', autospec=True,
+       return_value={TEST_MANU_ID: {ms.OK: True, ms.STATE: ms.REJECTED},
+                     'other_id': {ms.OK: False, ms.ERROR: 'No such one.'}})
+def test_bulk_update_state(mock_bulk, mock_read_user, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                           json=BULK_STATE_TEST_DATA, headers=AUTH_HEADERS)
+    assert resp.status_code == OK
+    resp_json = resp.get_json()
+    assert resp_json[ep.UPDATED] == 1
+    assert not resp_json[ep.RESULTS]['other_id'][ms.OK]
+
+
+@patch('data.people.read_one', return_value=GOOD_USER_RECORD)
+@patch('data.manuscript.bulk_update_state', autospec=True,
+       side_effect=ValueError('Mocked Exception'))
+def test_bulk_update_state_bad_action(mock_bulk, mock_read_user, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                           json=BULK_STATE_TEST_DATA, headers=AUTH_HEADERS)
+    assert resp.status_code == NOT_ACCEPTABLE
+
+
+@patch('data.people.read_one', return_value=GOOD_USER_RECORD)
+def test_bulk_update_state_not_a_list(mock_read_user, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                           json={ep.MANU_IDS: TEST_MANU_ID,
+                                 ep.ACTION: ms.REJECT},
+                           headers=AUTH_HEADERS)
+    assert resp.status_code == NOT_ACCEPTABLE
+
+
+@patch('data.people.read_one', return_value=GOOD_USER_RECORD)
+def test_bulk_update_state_ids_not_strings(mock_read_user, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                      json={ep.MANU_IDS: [[TEST_MANU_ID], {'a': 1}],
+                            ep.ACTION: ms.REJECT},
+                      headers=AUTH_HEADERS)
+    assert resp.status_code == NOT_ACCEPTABLE
+
+
+@patch('data.manuscript.bulk_update_state', autospec=True)
+def test_bulk_update_state_needs_permission(mock_bulk, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                           json=BULK_STATE_TEST_DATA)
+    assert resp.status_code == HTTPStatus.FORBIDDEN
+    mock_bulk.assert_not_called()
+
+
+@patch('data.people.read_one',
+       return_value={'email': TEST_EMAIL, 'roles': ['AU']})
+@patch('data.manuscript.bulk_update_state', autospec=True)
+def test_bulk_update_state_needs_editor(mock_bulk, mock_read_user, client):
+    resp = client.put(f'{ep.MANUSCRIPT_EP}/bulk_update_state',
+                           json=BULK_STATE_TEST_DATA, headers=AUTH_HEADERS)
+    assert resp.status_code == HTTPStatus.FORBIDDEN
+    mock_bulk.assert_not_called()
+
+
 # Test data for authentication
 AUTH_TEST_DATA = {
     ep.USERNAME: TEST_EMAIL,
@@ -519,9 +706,9 @@ AUTH_TEST_DATA = {
 }
 
 @patch('security.auth.register_user', autospec=True, return_value=True)
-def test_register_user(mock_register):
+def test_register_user(mock_register, client):
     """Test successful user registration"""
-    resp = TEST_CLIENT.post(
+    resp = client.post(
         f'{ep.AUTH_EP}/register',
         data=json.dumps(AUTH_TEST_DATA),
         content_type='application/json'
@@ -535,9 +722,9 @@ def test_register_user(mock_register):
 
 
 @patch('security.auth.register_user', autospec=True, return_value=False)
-def test_register_user_already_exists(mock_register):
+def test_register_user_already_exists(mock_register, client):
     """Test registration with existing username"""
-    resp = TEST_CLIENT.post(
+    resp = client.post(
         f'{ep.AUTH_EP}/register',
         data=json.dumps(AUTH_TEST_DATA),
         content_type='application/json'
@@ -556,9 +743,9 @@ LOGIN_TEST_DATA = {
 
 @patch('security.auth.authenticate_user', autospec=True, 
        return_value={ep.USERNAME: LOGIN_TEST_DATA[ep.USERNAME]})
-def test_login_user(mock_authenticate):
+def test_login_user(mock_authenticate, client):
     """Test successful user login"""
-    resp = TEST_CLIENT.post(
+    resp = client.post(
         f'{ep.AUTH_EP}/login',
         data=json.dumps(LOGIN_TEST_DATA),
         content_type='application/json'
@@ -568,10 +755,29 @@ def test_login_user(mock_authenticate):
     assert isinstance(resp_json, dict)
 
 
+@patch('security.auth.authenticate_user', autospec=True,
+       side_effect=auth.AuthBusy('busy'))
+def test_login_user_busy(mock_authenticate, client):
+    resp = client.post(f'{ep.AUTH_EP}/login', json=LOGIN_TEST_DATA)
+    assert resp.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert resp.headers['Retry-After'] == str(ep.AUTH_RETRY_AFTER)
+
+
 @patch('security.auth.authenticate_user', autospec=True, return_value=None)
-def test_login_user_invalid_credentials(mock_authenticate):
+def test_login_rate_limited(mock_authenticate, client):
+    rl.clear()
+    body = {ep.USERNAME: 'stuffed@example.com', ep.PASSWORD: 'guess'}
+    statuses = [client.post(f'{ep.AUTH_EP}/login', json=body)
+                .status_code for _ in range(int(rl.USER_BURST) + 1)]
+    rl.clear()
+    assert statuses[-1] == HTTPStatus.TOO_MANY_REQUESTS
+    assert mock_authenticate.call_count == int(rl.USER_BURST)
+
+
+@patch('security.auth.authenticate_user', autospec=True, return_value=None)
+def test_login_user_invalid_credentials(mock_authenticate, client):
     """Test login with invalid credentials"""
-    resp = TEST_CLIENT.post(
+    resp = client.post(
         f'{ep.AUTH_EP}/login',
         data=json.dumps(LOGIN_TEST_DATA),
         content_type='application/json'
@@ -582,54 +788,41 @@ def test_login_user_invalid_credentials(mock_authenticate):
     assert ep.ERROR in resp_json
 
 
-@patch('data.manuscript.get_valid_actions_by_state', autospec=True,
-       return_value={ms.ASSIGN_REF, ms.REJECT})
-def test_get_valid_actions(mock_get_actions):
+def test_get_valid_actions(client):
     """
-    Test getting valid actions for a given state.
+    Test getting valid actions for a given state, in table order.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/valid_actions/{ms.SUBMITTED}')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/valid_actions/{ms.SUBMITTED}')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
-    assert "valid_actions" in resp_json
-    assert isinstance(resp_json["valid_actions"], list)
-    assert len(resp_json["valid_actions"]) > 0
-    assert all(isinstance(action, str) for action in resp_json["valid_actions"])
+    assert resp_json["valid_actions"] == list(
+        ms.get_valid_actions_by_state(ms.SUBMITTED))
 
 
-@patch('data.manuscript.get_valid_actions_by_state', autospec=True,
-       side_effect=KeyError("Invalid state"))
-def test_get_valid_actions_invalid_state(mock_get_actions):
+def test_get_valid_actions_invalid_state(client):
     """
     Test getting valid actions for an invalid state.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/valid_actions/invalid_state')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/valid_actions/invalid_state')
     assert resp.status_code == NOT_FOUND
 
 
-@patch('data.manuscript.get_valid_actions_by_state', autospec=True,
-       side_effect=ValueError("Mocked Exception"))
-def test_get_valid_actions_error(mock_get_actions):
+def test_get_valid_actions_not_modified(client):
     """
-    Test getting valid actions when an error occurs.
+    The body is built once per state, so its ETag revalidates.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/valid_actions/{ms.SUBMITTED}')
-    assert resp.status_code == NOT_ACCEPTABLE
+    url = f'{ep.MANUSCRIPT_EP}/valid_actions/{ms.SUBMITTED}'
+    etag = client.get(url).headers['ETag']
+    resp = client.get(url, headers={'If-None-Match': etag})
+    assert resp.status_code == HTTPStatus.NOT_MODIFIED
 
 
-@patch('data.manuscript.get_valid_actions_by_state', autospec=True)
-def test_get_editor_actions(mock_get_actions):
+def test_get_editor_actions(client):
     """
     Test getting all possible editor actions.
     """
-    # Mock the return values for both states
-    mock_get_actions.side_effect = [
-        {ms.ASSIGN_REF, ms.REJECT},  # SUBMITTED state
-        {ms.ACCEPT}  # EDITOR_REV state
-    ]
-    
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/editor_actions')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/editor_actions')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -642,13 +835,11 @@ def test_get_editor_actions(mock_get_actions):
     assert ms.ACCEPT in resp_json["editor_actions"]
 
 
-@patch('data.manuscript.get_valid_actions_by_state', autospec=True,
-       return_value={ms.ACCEPT, ms.REJECT, ms.ACCEPT_WITH_REVISIONS})
-def test_get_referee_actions(mock_get_actions):
+def test_get_referee_actions(client):
     """
     Test getting all possible referee actions.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}/referee_actions')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/referee_actions')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -662,13 +853,31 @@ def test_get_referee_actions(mock_get_actions):
     assert ms.ACCEPT_WITH_REVISIONS in resp_json["referee_actions"]
 
 
+def test_editor_actions_cacheable(client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/editor_actions')
+    assert resp.cache_control.max_age == ep.STATIC_MAX_AGE
+    etag = resp.headers['ETag']
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/editor_actions',
+                           headers={'If-None-Match': etag})
+    assert resp.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_state_graph(client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/state_graph')
+    assert resp.status_code == OK
+    graph = resp.get_json()
+    assert graph['transitions'][ms.SUBMITTED][ms.REJECT] == [ms.REJECTED]
+    assert ms.IN_REF_REV in graph['predecessors'][ms.COPY_EDIT]
+    assert ms.PUBLISHED in graph['reachable'][ms.SUBMITTED]
+
+
 @patch('data.manuscript.search_by_title', autospec=True,
        return_value={'Test Manuscript': {'title': 'Test Manuscript'}})
-def test_search_manuscripts_by_title(mock_search):
+def test_search_manuscripts_by_title(mock_search, client):
     """
     Test searching manuscripts by title.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}?title=Test')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}?title=Test')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -678,11 +887,11 @@ def test_search_manuscripts_by_title(mock_search):
 
 @patch('data.manuscript.search_by_title', autospec=True,
        return_value={})
-def test_search_manuscripts_no_results(mock_search):
+def test_search_manuscripts_no_results(mock_search, client):
     """
     Test searching manuscripts when no results are found.
     """
-    resp = TEST_CLIENT.get(f'{ep.MANUSCRIPT_EP}?title=Nonexistent')
+    resp = client.get(f'{ep.MANUSCRIPT_EP}?title=Nonexistent')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -691,11 +900,11 @@ def test_search_manuscripts_no_results(mock_search):
 
 @patch('data.manuscript.read', autospec=True,
        return_value={'All Manuscripts': {'title': 'All Manuscripts'}})
-def test_get_all_manuscripts_no_search(mock_read):
+def test_get_all_manuscripts_no_search(mock_read, client):
     """
     Test getting all manuscripts when no search term is provided.
     """
-    resp = TEST_CLIENT.get(ep.MANUSCRIPT_EP)
+    resp = client.get(ep.MANUSCRIPT_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -703,8 +912,8 @@ def test_get_all_manuscripts_no_search(mock_read):
     assert resp_json['All Manuscripts']['title'] == 'All Manuscripts'
 
 
-def test_dev_status():
-    resp = TEST_CLIENT.get('/dev/status')
+def test_dev_status(client):
+    resp = client.get('/dev/status')
     assert resp.status_code == HTTPStatus.OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -714,8 +923,8 @@ def test_dev_status():
     assert resp_json['version'] == '1.0.0'
 
 
-def test_dev_config():
-    resp = TEST_CLIENT.get('/dev/config')
+def test_dev_config(client):
+    resp = client.get('/dev/config')
     assert resp.status_code == HTTPStatus.OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -732,9 +941,9 @@ def test_dev_config():
     ROLES: ['ED'],
     BIO: 'Curious Adventurer'
 })
-def test_person_detail_get_success(mock_read_one):
+def test_person_detail_get_success(mock_read_one, client):
     """GET /people/<user_id> returns the person when found"""
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/alice-id')
+    resp = client.get(f'{ep.PEOPLE_EP}/alice-id')
     assert resp.status_code == HTTPStatus.OK
     data = resp.get_json()
     assert isinstance(data, dict)
@@ -746,22 +955,22 @@ def test_person_detail_get_success(mock_read_one):
 
 
 @patch('data.people.read_one', autospec=True, return_value=None)
-def test_person_detail_get_not_found(mock_read_one):
+def test_person_detail_get_not_found(mock_read_one, client):
     """GET /people/<user_id> returns 404 when not found"""
-    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/no-such-id')
+    resp = client.get(f'{ep.PEOPLE_EP}/no-such-id')
     assert resp.status_code == HTTPStatus.NOT_FOUND
 
 
 @patch('data.people.read_one', autospec=True, return_value=GOOD_USER_RECORD)
 @patch('data.people.update', autospec=True, return_value='yw5490@nyu.edu')
-def test_person_detail_put_success(mock_update, mock_read_one):
+def test_person_detail_put_success(mock_update, mock_read_one, client):
     """PUT /people/<user_id> updates and returns the updated email"""
     payload = {
         NAME: 'Bob',
         AFFILIATION: 'Builder Inc.',
         BIO: 'Can we fix it? Yes we can!'
     }
-    resp = TEST_CLIENT.put(
+    resp = client.put(
         f'{ep.PEOPLE_EP}/yw5490@nyu.edu',
         data=json.dumps(payload),
         content_type='application/json',
@@ -773,9 +982,9 @@ def test_person_detail_put_success(mock_update, mock_read_one):
 
 @patch('data.people.read_one', autospec=True, return_value=GOOD_USER_RECORD)
 @patch('data.people.delete', autospec=True, return_value='yw5490@nyu.edu')
-def test_person_detail_delete_success(mock_delete, mock_read_one):
+def test_person_detail_delete_success(mock_delete, mock_read_one, client):
     """DELETE /people/<user_id> removes the person and returns the email"""
-    resp = TEST_CLIENT.delete(
+    resp = client.delete(
         f'{ep.PEOPLE_EP}/yw5490@nyu.edu',
         headers=AUTH_HEADERS
     )
@@ -785,15 +994,219 @@ def test_person_detail_delete_success(mock_delete, mock_read_one):
 
 @patch('data.people.read_one', autospec=True, return_value=GOOD_USER_RECORD)
 @patch('data.people.delete', autospec=True, return_value=None)
-def test_person_detail_delete_not_found(mock_delete, mock_read_one):
+def test_person_detail_delete_not_found(mock_delete, mock_read_one, client):
     """DELETE /people/<user_id> returns 404 when the person does not exist"""
-    resp = TEST_CLIENT.delete(
+    resp = client.delete(
         f'{ep.PEOPLE_EP}/no-such-id',
         headers=AUTH_HEADERS
     )
     assert resp.status_code == HTTPStatus.NOT_FOUND
 
 
+@patch('data.people.read_one', autospec=True)
+@patch('data.people.delete_role', autospec=True, return_value=TEST_MANU_ID)
+def test_bearer_token_skips_lookup(mock_delete, mock_read_one, client):
+    token = tok.issue(TEST_MANU_ID, TEST_EMAIL, ['ED'])
+    resp = client.delete(
+        f'{ep.PEOPLE_EP}/delete_role',
+        headers={'Authorization': f'Bearer {token}'},
+        data=json.dumps(ADD_DELETE_ROLE_DATA),
+        content_type='application/json',
+    )
+    assert resp.status_code == HTTPStatus.OK
+    mock_read_one.assert_not_called()
+
+
+@patch('data.people.delete_role', autospec=True, return_value=TEST_MANU_ID)
+def test_bearer_token_lacks_role(mock_delete, client):
+    token = tok.issue(TEST_MANU_ID, TEST_EMAIL, ['AU'])
+    resp = client.delete(
+        f'{ep.PEOPLE_EP}/delete_role',
+        headers={'Authorization': f'Bearer {token}'},
+        data=json.dumps(ADD_DELETE_ROLE_DATA),
+        content_type='application/json',
+    )
+    assert resp.status_code == HTTPStatus.FORBIDDEN
+    mock_delete.assert_not_called()
+
+
+def test_bearer_token_invalid(client):
+    resp = client.delete(
+        f'{ep.PEOPLE_EP}/delete_role',
+        headers={'Authorization': 'Bearer forged.token'},
+        data=json.dumps(ADD_DELETE_ROLE_DATA),
+        content_type='application/json',
+    )
+    assert resp.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_bearer_token_non_ascii(client):
+    resp = client.delete(
+        f'{ep.PEOPLE_EP}/delete_role',
+        headers={'Authorization': 'Bearer x.\u00e9'},
+        data=json.dumps(ADD_DELETE_ROLE_DATA),
+        content_type='application/json',
+    )
+    assert resp.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@patch('data.people.read_one', autospec=True,
+       return_value={ID: TEST_MANU_ID, EMAIL: TEST_EMAIL, ROLES: ['ED']})
+def test_refresh_token(mock_read_one, client):
+    token = tok.issue(TEST_MANU_ID, TEST_EMAIL, [])
+    resp = client.post(f'{ep.AUTH_EP}/refresh',
+                            headers={'Authorization': f'Bearer {token}'})
+    assert resp.status_code == HTTPStatus.OK
+    new_token = resp.get_json()[auth.TOKEN]
+    assert tok.verify(new_token)[ROLES] == ['ED']
+
+
+@patch('data.people.read_one', autospec=True,
+       return_value={ID: TEST_MANU_ID, EMAIL: TEST_EMAIL, ROLES: ['ED'],
+                     TOKEN_VERSION: 1})
+def test_refresh_token_revoked(mock_read_one, client):
+    token = tok.issue(TEST_MANU_ID, TEST_EMAIL, [], 0)
+    resp = client.post(f'{ep.AUTH_EP}/refresh',
+                            json={auth.TOKEN: token})
+    assert resp.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@patch('data.text.history', autospec=True,
+       return_value=[{txt.VERSION: 2, txt.TITLE: 'T', txt.CREATED: 1.0}])
+def test_text_history(mock_history, client):
+    resp = client.get(f'{ep.TEXT_EP}/{TEST_PAGE_NUMBER}/history')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json()[0][txt.VERSION] == 2
+
+
+@patch('data.text.history', autospec=True, return_value=[])
+def test_text_history_not_found(mock_history, client):
+    resp = client.get(f'{ep.TEXT_EP}/{TEST_PAGE_NUMBER}/history')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.text.read_version', autospec=True,
+       return_value={txt.VERSION: 1, txt.TEXT: 'old'})
+def test_text_version(mock_read_version, client):
+    resp = client.get(f'{ep.TEXT_EP}/{TEST_PAGE_NUMBER}/history/1')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json()[txt.TEXT] == 'old'
+    mock_read_version.assert_called_once_with(TEST_PAGE_NUMBER, 1)
+
+
+@patch('data.text.read_version', autospec=True, return_value=None)
+def test_text_version_not_found(mock_read_version, client):
+    resp = client.get(f'{ep.TEXT_EP}/{TEST_PAGE_NUMBER}/history/9')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.manuscript_revisions.list_revisions', autospec=True,
+       return_value=[{mrev.REVISION: 2}, {mrev.REVISION: 1}])
+def test_manuscript_revisions(mock_list, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/revisions')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json()[0][mrev.REVISION] == 2
+
+
+@patch('data.manuscript_revisions.list_revisions', autospec=True,
+       return_value=[])
+def test_manuscript_revisions_not_found(mock_list, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/revisions')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.manuscript_revisions.read', autospec=True,
+       return_value={mrev.REVISION: 1, mrev.TEXT: 'old'})
+def test_manuscript_revision(mock_read, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/revisions/1')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json()[mrev.TEXT] == 'old'
+    mock_read.assert_called_once_with(TEST_MANU_ID, 1)
+
+
+@patch('data.manuscript_revisions.read', autospec=True, return_value=None)
+def test_manuscript_revision_not_found(mock_read, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/revisions/9')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.manuscript_revisions.diff', autospec=True,
+       return_value={mrev.FROM: 1, mrev.TO: 2, mrev.TEXT: []})
+def test_manuscript_diff(mock_diff, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/diff/1/2')
+    assert resp.status_code == HTTPStatus.OK
+    mock_diff.assert_called_once_with(TEST_MANU_ID, 1, 2)
+
+
+@patch('data.manuscript_revisions.diff', autospec=True, return_value=None)
+def test_manuscript_diff_not_found(mock_diff, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/diff/1/9')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.manuscript_events.for_manuscript', autospec=True,
+       return_value={mev.EVENTS: [], mev.NEXT: None})
+def test_manuscript_events(mock_events, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/events'
+                           f'?{ep.LIMIT}=10&{ep.CURSOR}=abc')
+    assert resp.status_code == HTTPStatus.OK
+    mock_events.assert_called_once_with(TEST_MANU_ID, 10, 'abc')
+
+
+@patch('data.manuscript_events.for_manuscript', autospec=True,
+       side_effect=ValueError('Bad cursor'))
+def test_manuscript_events_bad_cursor(mock_events, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/events'
+                           f'?{ep.CURSOR}=abc')
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_manuscript_events_bad_limit(client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/events'
+                           f'?{ep.LIMIT}=many')
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+
+@patch('data.manuscript_events.in_range', autospec=True,
+       return_value={mev.EVENTS: [], mev.NEXT: None})
+def test_all_manuscript_events(mock_in_range, client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/events'
+                           f'?{ep.START}=100&{ep.END}=200.5')
+    assert resp.status_code == HTTPStatus.OK
+    mock_in_range.assert_called_once_with(100.0, 200.5, mev.PAGE_SIZE, None)
+
+
+def test_all_manuscript_events_bad_time(client):
+    resp = client.get(f'{ep.MANUSCRIPT_EP}/events?{ep.START}=today')
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+
+@patch('data.manuscript_events.time_in_states', autospec=True,
+       return_value={ms.SUBMITTED: 10.0})
+def test_time_in_state(mock_totals, client):
+    resp = client.get(
+        f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/time_in_state')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json() == {ms.SUBMITTED: 10.0}
+
+
+@patch('data.manuscript_events.time_in_states', autospec=True,
+       return_value={})
+def test_time_in_state_not_found(mock_totals, client):
+    resp = client.get(
+        f'{ep.MANUSCRIPT_EP}/{TEST_MANU_ID}/time_in_state')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.analytics.turnaround', autospec=True,
+       return_value=[{anl.FROM_STATE: ms.SUBMITTED,
+                      anl.TO_STATE: ms.IN_REF_REV, anl.COUNT: 3}])
+def test_turnaround(mock_turnaround, client):
+    resp = client.get(f'{ep.ANALYTICS_EP}/turnaround')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.get_json()[0][anl.COUNT] == 3
+
+
 TEST_COMMENT_ID = "112233xxyy"
 TEST_COMMENT_TEXT = "This is a test comment for Referee revisions."
 
@@ -811,9 +1224,9 @@ COMMENT_UPDATE_TEST_DATA = {
 @patch('security.security.requires_permission', lambda *args, **kwargs: lambda f: f)
 @patch('data.comment.read_all', autospec=True,
        return_value=[{cmt.COMMENT_ID: TEST_COMMENT_ID, cmt.TEXT: TEST_COMMENT_TEXT}])
-def test_read_comments(mock_read_all):
+def test_read_comments(mock_read_all, client):
     """Test reading all comments."""
-    resp = TEST_CLIENT.get(ep.COMMENT_EP)
+    resp = client.get(ep.COMMENT_EP)
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, list)
@@ -822,11 +1235,12 @@ def test_read_comments(mock_read_all):
     assert resp_json[0][cmt.TEXT] == TEST_COMMENT_TEXT
 
 @patch('security.security.requires_permission', lambda *args, **kwargs: lambda f: f)
-@patch('data.comment.read_one', autospec=True,
-       return_value={cmt.COMMENT_ID: TEST_COMMENT_ID, cmt.TEXT: TEST_COMMENT_TEXT})
-def test_read_one_comment(mock_read_one):
+@patch('data.comment.read_one_json', autospec=True,
+       return_value=json.dumps({cmt.COMMENT_ID: TEST_COMMENT_ID,
+                                cmt.TEXT: TEST_COMMENT_TEXT}))
+def test_read_one_comment(mock_read_one, client):
     """Test reading a single comment by ID."""
-    resp = TEST_CLIENT.get(f'{ep.COMMENT_EP}/{TEST_COMMENT_ID}')
+    resp = client.get(f'{ep.COMMENT_EP}/{TEST_COMMENT_ID}')
     assert resp.status_code == OK
     resp_json = resp.get_json()
     assert isinstance(resp_json, dict)
@@ -834,10 +1248,10 @@ def test_read_one_comment(mock_read_one):
     assert resp_json[cmt.TEXT] == TEST_COMMENT_TEXT
 
 @patch('security.security.requires_permission', lambda *args, **kwargs: lambda f: f)
-@patch('data.comment.read_one', autospec=True, return_value=None)
-def test_read_one_comment_not_found(mock_read_one):
+@patch('data.comment.read_one_json', autospec=True, return_value=None)
+def test_read_one_comment_not_found(mock_read_one, client):
     """Test reading a non-existent comment."""
-    resp = TEST_CLIENT.get(f'{ep.COMMENT_EP}/nonexistent')
+    resp = client.get(f'{ep.COMMENT_EP}/nonexistent')
     assert resp.status_code == NOT_FOUND
 
 
@@ -851,7 +1265,7 @@ GOOD_EDITOR_USER = {
 @patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
 @patch('data.comment.read_one')
 @patch('data.comment.delete')
-def test_delete_comment(mock_delete, mock_read_one, mock_read_user):
+def test_delete_comment(mock_delete, mock_read_one, mock_read_user, client):
     """Test deleting a comment."""
     mock_read_one.side_effect = [
         {cmt.COMMENT_ID: TEST_COMMENT_ID, cmt.TEXT: "Exists"},
@@ -859,14 +1273,14 @@ def test_delete_comment(mock_delete, mock_read_one, mock_read_user):
     ]
     mock_delete.return_value = TEST_COMMENT_ID
 
-    resp = TEST_CLIENT.delete(f"{ep.COMMENT_EP}/{TEST_COMMENT_ID}", headers=AUTH_HEADERS)
+    resp = client.delete(f"{ep.COMMENT_EP}/{TEST_COMMENT_ID}", headers=AUTH_HEADERS)
     assert resp.status_code == OK
     mock_delete.assert_called_once_with(TEST_COMMENT_ID)
 
 @patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
 @patch('data.comment.create')
 @patch('data.comment.read_one')
-def test_create_comment(mock_read_one, mock_create, mock_read_user):
+def test_create_comment(mock_read_one, mock_create, mock_read_user, client):
     """Test creating a comment."""
     new_comment_id = "new_comment_123"
     mock_create.return_value = new_comment_id
@@ -883,16 +1297,18 @@ def test_create_comment(mock_read_one, mock_create, mock_read_user):
         cmt.EDITOR_ID: TEST_EMAIL,
         cmt.TEXT: "This is a new test comment.",
     }
-    resp = TEST_CLIENT.put(f"{ep.COMMENT_EP}/create", json=comment_data, headers=AUTH_HEADERS)
+    resp = client.put(f"{ep.COMMENT_EP}/create", json=comment_data, headers=AUTH_HEADERS)
 
     assert resp.status_code == OK
     data = resp.get_json()
     assert data[ep.RETURN] == new_comment_id
 
+    # The caller's record from the permission check is passed along.
     mock_create.assert_called_once_with(
         comment_data[cmt.MANUSCRIPT_ID],
         comment_data[cmt.EDITOR_ID],
-        comment_data[cmt.TEXT]
+        comment_data[cmt.TEXT],
+        GOOD_EDITOR_USER,
     )
     comment = cmt.read_one(new_comment_id)
     assert comment is not None
@@ -900,20 +1316,20 @@ def test_create_comment(mock_read_one, mock_create, mock_read_user):
 
 @patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
 @patch('data.comment.create', side_effect=ValueError("Invalid manuscript ID"))
-def test_create_comment_failed(mock_create, mock_read_user):
+def test_create_comment_failed(mock_create, mock_read_user, client):
     """Test creating a comment with invalid data (non-existent manuscript)."""
     comment_data = {
         cmt.MANUSCRIPT_ID: "invalid_manuscript_id",
         cmt.EDITOR_ID: TEST_EMAIL,
         cmt.TEXT: "This comment should fail.",
     }
-    resp = TEST_CLIENT.put(f"{ep.COMMENT_EP}/create", json=comment_data, headers=AUTH_HEADERS)
+    resp = client.put(f"{ep.COMMENT_EP}/create", json=comment_data, headers=AUTH_HEADERS)
     assert resp.status_code == NOT_ACCEPTABLE
 
 @patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
 @patch('data.comment.update')
 @patch('data.comment.read_one')
-def test_update_comment(mock_read_one, mock_update, mock_read_user):
+def test_update_comment(mock_read_one, mock_update, mock_read_user, client):
     """Test updating a comment."""
     mock_update.return_value = TEST_COMMENT_ID
     updated_content = "Updated comment content."
@@ -927,7 +1343,7 @@ def test_update_comment(mock_read_one, mock_update, mock_read_user):
         cmt.COMMENT_ID: TEST_COMMENT_ID,
         cmt.TEXT: updated_content
     }
-    resp = TEST_CLIENT.put(f"{ep.COMMENT_EP}/update", json=update_data, headers=AUTH_HEADERS)
+    resp = client.put(f"{ep.COMMENT_EP}/update", json=update_data, headers=AUTH_HEADERS)
     assert resp.status_code == OK
     data = resp.get_json()
     assert data[ep.RETURN] == TEST_COMMENT_ID
@@ -939,11 +1355,58 @@ def test_update_comment(mock_read_one, mock_update, mock_read_user):
 
 @patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
 @patch('data.comment.update', side_effect=ValueError("Cannot update non-text fields"))
-def test_update_comment_failed(mock_update, mock_read_user):
+def test_update_comment_failed(mock_update, mock_read_user, client):
     """Test updating a comment with invalid data."""
     update_data = {
         cmt.COMMENT_ID: TEST_COMMENT_ID,
         cmt.TEXT: "Trying to fail update",
     }
-    resp = TEST_CLIENT.put(f"{ep.COMMENT_EP}/update", json=update_data, headers=AUTH_HEADERS)
-    assert resp.status_code == NOT_ACCEPTABLE
\ No newline at end of file
+    resp = client.put(f"{ep.COMMENT_EP}/update", json=update_data, headers=AUTH_HEADERS)
+    assert resp.status_code == NOT_ACCEPTABLE
+
+@patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
+@patch('data.comment.reply', autospec=True, return_value='reply_123')
+def test_reply_comment(mock_reply, mock_read_user, client):
+    reply_data = {cmt.EDITOR_ID: TEST_EMAIL, cmt.TEXT: 'A reply.'}
+    resp = client.put(f'{ep.COMMENT_EP}/{TEST_COMMENT_ID}/reply',
+                           json=reply_data, headers=AUTH_HEADERS)
+    assert resp.status_code == OK
+    assert resp.get_json()[ep.RETURN] == 'reply_123'
+    mock_reply.assert_called_once_with(TEST_COMMENT_ID, TEST_EMAIL,
+                                       'A reply.', GOOD_EDITOR_USER)
+
+
+@patch('data.people.read_one', return_value=GOOD_EDITOR_USER)
+@patch('data.comment.reply', autospec=True,
+       side_effect=ValueError('Comment not found'))
+def test_reply_comment_failed(mock_reply, mock_read_user, client):
+    reply_data = {cmt.EDITOR_ID: TEST_EMAIL, cmt.TEXT: 'A reply.'}
+    resp = client.put(f'{ep.COMMENT_EP}/{TEST_COMMENT_ID}/reply',
+                           json=reply_data, headers=AUTH_HEADERS)
+    assert resp.status_code == NOT_ACCEPTABLE
+
+
+@patch('data.comment.read_thread', autospec=True,
+       return_value={cmt.COMMENTS: [{cmt.COMMENT_ID: TEST_COMMENT_ID}],
+                     cmt.NEXT: None})
+def test_comment_thread(mock_thread, client):
+    resp = client.get(f'{ep.COMMENT_EP}/thread/{TEST_COMMENT_ID}'
+                           f'?{ep.LIMIT}=10&{ep.CURSOR}=abc')
+    assert resp.status_code == OK
+    assert resp.get_json()[cmt.COMMENTS][0][cmt.COMMENT_ID] == TEST_COMMENT_ID
+    mock_thread.assert_called_once_with(TEST_COMMENT_ID, 10, 'abc')
+
+
+@patch('data.comment.read_thread', autospec=True,
+       return_value={cmt.COMMENTS: [], cmt.NEXT: None})
+def test_comment_thread_not_found(mock_thread, client):
+    resp = client.get(f'{ep.COMMENT_EP}/thread/{TEST_COMMENT_ID}')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+
+
+@patch('data.comment.read_thread', autospec=True,
+       side_effect=ValueError('Bad cursor'))
+def test_comment_thread_bad_cursor(mock_thread, client):
+    resp = client.get(f'{ep.COMMENT_EP}/thread/{TEST_COMMENT_ID}'
+                           f'?{ep.CURSOR}=abc')
+    assert resp.status_code == HTTPStatus.BAD_REQUEST